@@ -0,0 +1,91 @@
+from collections import namedtuple
+from decimal import Decimal
+from functools import lru_cache
+import numpy as np
+from sqlalchemy import BigInteger, String, func, select, type_coerce
+from deposits import months_between
+from models import db, Loan
+
+SCHEDULE_CACHE_SIZE = 4096
+CHUNK_SIZE = 100000  # Loans per batch in portfolio_exposure
+
+# Per-installment arrays; month is 1-based
+Schedule = namedtuple('Schedule', 'emi month payment interest principal balance')
+
+def _money(value):
+    return Decimal(str(round(float(value), 2))).quantize(Decimal('0.01'))
+
+def _monthly_rate(annual_rate):
+    return float(annual_rate) / 1200
+
+def emi(principal, annual_rate, term_months):
+    """Equated monthly instalment; works elementwise on NumPy arrays too."""
+    r = np.asarray(annual_rate, dtype=np.float64) / 1200
+    principal = np.asarray(principal, dtype=np.float64)
+    growth = (1 + r) ** term_months
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(r == 0, principal / term_months, principal * r * growth / (growth - 1))
+
+def outstanding(principal, annual_rate, term_months, months_paid):
+    # Closed form balance after months_paid instalments: P(1+r)^k - EMI((1+r)^k - 1)/r
+    r = np.asarray(annual_rate, dtype=np.float64) / 1200
+    principal = np.asarray(principal, dtype=np.float64)
+    months_paid = np.clip(months_paid, 0, term_months)
+    payment = emi(principal, annual_rate, term_months)
+    growth = (1 + r) ** months_paid
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = np.where(r == 0, principal - payment * months_paid, principal * growth - payment * (growth - 1) / r)
+    return np.maximum(balance, 0)
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def schedule(amount, annual_rate, term_months):
+    """Full amortization schedule for a loan, memoized by its terms.
+
+    The arrays are shared between callers and marked read-only.
+    """
+    month = np.arange(1, term_months + 1)
+    balance = outstanding(float(amount), annual_rate, term_months, month)
+    opening = np.concatenate(([float(amount)], balance[:-1]))
+    interest = opening * _monthly_rate(annual_rate)
+    principal = opening - balance
+    payment = interest + principal
+    arrays = [np.round(a, 2) for a in (payment, interest, principal, balance)]
+    for a in (month, *arrays):
+        a.flags.writeable = False
+    return Schedule(_money(emi(float(amount), annual_rate, term_months)), month, *arrays)
+
+def months_paid(start, as_of, term_months):
+    # Instalments fall due monthly from one month after start
+    return int(np.clip(months_between(np.datetime64(start, 'D'), np.datetime64(as_of, 'D')), 0, term_months))
+
+def outstanding_as_of(amount, annual_rate, term_months, start, as_of):
+    balance = outstanding(float(amount), annual_rate, term_months, months_paid(start, as_of, term_months))
+    return _money(balance)
+
+def portfolio_exposure(as_of, session=None, chunk_size=CHUNK_SIZE):
+    """Outstanding principal and monthly EMI across every approved loan."""
+    session = session or db.session
+    totals = dict(loans=0, principal=0.0, outstanding=0.0, monthly_emi=0.0)
+    last_id = 0
+    as_of = np.datetime64(as_of, 'D')
+    while True:
+        rows = session.execute(
+            select(Loan.id, type_coerce(Loan.amount, BigInteger), Loan.interest_rate, Loan.term_months,
+                   func.date(Loan.created_at, type_=String))
+            .where(Loan.status == 'approved', Loan.id > last_id)
+            .order_by(Loan.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        ids, amounts, rates, terms, created = zip(*rows)
+        last_id = ids[-1]
+        principal = np.array(amounts, dtype=np.float64) / 100
+        rates, terms = np.array(rates, dtype=np.float64), np.array(terms, dtype=np.int64)
+        paid = np.clip(months_between(np.array(created, dtype='datetime64[D]'), as_of), 0, terms)
+        balance = outstanding(principal, rates, terms, paid)
+        totals['loans'] += len(ids)
+        totals['principal'] += principal.sum()
+        totals['outstanding'] += balance.sum()
+        totals['monthly_emi'] += emi(principal, rates, terms)[paid < terms].sum()
+    return {key: value if key == 'loans' else _money(value) for key, value in totals.items()}
@@ -1,107 +1,141 @@
-from flask import Flask, render_template, redirect, url_for, flash, request, session, send_file
-from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, FloatField, IntegerField, SubmitField, FileField, DateField, SelectField
-from wtforms.validators import DataRequired, Email, Length
-from models import db, User, Account, Transaction, Loan, CreditCard, Notification, FixedDeposit, RecurringDeposit, BillPayment, Insurance, Investment, Cheque, AccountStatement
-from flask_migrate import Migrate
-from flask_mail import Mail, Message
-from twilio.rest import Client
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from flask import Blueprint, Flask, Response, current_app, jsonify, render_template, redirect, url_for, flash, request, session, send_file, stream_with_context
+from forms import RegistrationForm, LoginForm, TransactionForm, TransferForm, BulkTransferForm, UploadImageForm, LoanForm, CreditCardForm, ChangePasswordForm, FixedDepositForm, RecurringDepositForm, BillPaymentForm, InsuranceForm, InvestmentForm, ChequeRequestForm, AccountStatementForm
+from models import db, User, Account, Loan, CreditCard, NotificationCounter, FixedDeposit, RecurringDeposit, BillPayment, Insurance, Investment, Cheque, AccountStatement, BulkTransferJob
+from sqlalchemy import insert, inspect, select
+from database import configure_engine, engine_options
+from history import filter_criteria, page_size, decode_cursor, transaction_page
+from export import FORMATS, export_stream
+import search as search_index
+import archive as transaction_archive
+from posting import PostingError, post_deposit, post_withdrawal, post_transfer, use_group_commit
+import group_commit
+import card_auth
+from card_auth import AuthorizerUnavailable, CardAuthorizer, Declined, RemoteAuthorizer, parse_address, to_paise
+from bulk_transfers import affected_user_ids, detect_format, iter_report, run_job, start_job
+from snapshots import catch_up
+import sequences
+from inbox import archive, create_broadcast, inbox_page, mark_read, run_broadcast, unread_count
+from statements import ensure_rendered, statement_path
+from outbox import dispatch_once, enqueue, run_dispatcher
+import cache
+from cache import VersionedCache, build_backend, build_summary
+import hashing
+from hashing import HashingBusy, hash_password, verify_password
+from auth import account_owner, admin_required, current_user, forget_accounts, identity, login_required, owns_account
+import click
 import random
 import os
+import signal
 import time
 import uuid
+from werkzeug.local import LocalProxy
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
-from io import BytesIO
-
-app = Flask(__name__, template_folder='templates')
-app.config['SECRET_KEY'] = 'your_secret_key_here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///banking.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'static/images'
-app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
-db.init_app(app)
-migrate = Migrate(app, db)
-
-class RegistrationForm(FlaskForm):
-    username = StringField('Username', validators=[DataRequired(), Length(min=4, max=150)])
-    email = StringField('Email', validators=[DataRequired(), Email()])
-    password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
-
-class LoginForm(FlaskForm):
-    username = StringField('Username', validators=[DataRequired()])
-    password = PasswordField('Password', validators=[DataRequired()])
-
-class TransactionForm(FlaskForm):
-    account_id = IntegerField('Account ID', validators=[DataRequired()])
-    amount = FloatField('Amount', validators=[DataRequired()])
-
-class TransferForm(FlaskForm):
-    from_account_id = IntegerField('From Account ID', validators=[DataRequired()])
-    to_account_id = IntegerField('To Account ID', validators=[DataRequired()])
-    amount = FloatField('Amount', validators=[DataRequired()])
-
-class UploadImageForm(FlaskForm):
-    image = FileField('Profile Image', validators=[DataRequired()])
-    submit = SubmitField('Upload')
-
-class LoanForm(FlaskForm):
-    amount = FloatField('Loan Amount', validators=[DataRequired()])
-    term_months = IntegerField('Term (Months)', validators=[DataRequired()])
-    submit = SubmitField('Apply')
-
-class CreditCardForm(FlaskForm):
-    limit = FloatField('Credit Limit', validators=[DataRequired()])
-    submit = SubmitField('Apply')
-
-class ChangePasswordForm(FlaskForm):
-    password = PasswordField('New Password', validators=[DataRequired(), Length(min=6)])
-    submit = SubmitField('Change Password')
-
-class FixedDepositForm(FlaskForm):
-    amount = FloatField('Deposit Amount (INR)', validators=[DataRequired()])
-    term_months = IntegerField('Term (Months)', validators=[DataRequired()])
-    submit = SubmitField('Create Fixed Deposit')
-
-class RecurringDepositForm(FlaskForm):
-    monthly_amount = FloatField('Monthly Amount (INR)', validators=[DataRequired()])
-    term_months = IntegerField('Term (Months)', validators=[DataRequired()])
-    submit = SubmitField('Create Recurring Deposit')
-
-class BillPaymentForm(FlaskForm):
-    bill_type = SelectField('Bill Type', choices=[('electricity', 'Electricity'), ('water', 'Water'), ('gas', 'Gas'), ('phone', 'Phone'), ('internet', 'Internet'), ('other', 'Other')], validators=[DataRequired()])
-    bill_number = StringField('Bill Number', validators=[DataRequired()])
-    amount = FloatField('Amount (INR)', validators=[DataRequired()])
-    due_date = DateField('Due Date', validators=[DataRequired()])
-    submit = SubmitField('Pay Bill')
-
-class InsuranceForm(FlaskForm):
-    type = SelectField('Insurance Type', choices=[('life', 'Life'), ('health', 'Health'), ('vehicle', 'Vehicle')], validators=[DataRequired()])
-    coverage_amount = FloatField('Coverage Amount (INR)', validators=[DataRequired()])
-    term_years = IntegerField('Term (Years)', validators=[DataRequired()])
-    submit = SubmitField('Apply')
-
-class InvestmentForm(FlaskForm):
-    type = SelectField('Investment Type', choices=[('mutual_fund', 'Mutual Fund'), ('stock', 'Stock'), ('bond', 'Bond')], validators=[DataRequired()])
-    amount = FloatField('Investment Amount (INR)', validators=[DataRequired()])
-    submit = SubmitField('Invest')
-
-class ChequeRequestForm(FlaskForm):
-    number_of_cheques = IntegerField('Number of Cheques', validators=[DataRequired()])
-    submit = SubmitField('Request Cheque Book')
-
-class AccountStatementForm(FlaskForm):
-    start_date = DateField('Start Date', validators=[DataRequired()])
-    end_date = DateField('End Date', validators=[DataRequired()])
-    submit = SubmitField('Generate Statement')
-
-@app.route('/')
+from decimal import Decimal
+
+# The numpy-backed modules (deposits, amortization, revaluation, billpay)
+# are imported by the views and commands that use them, so a worker serving
+# the core banking pages never loads numpy
+
+MIGRATIONS = os.path.dirname(os.path.abspath(__file__))  # alembic.ini, env.py and versions/ live beside the app
+
+bp = Blueprint('main', __name__, cli_group=None)
+# Per-app state, built by create_app()
+summary_cache = LocalProxy(lambda: current_app.extensions['summary_cache'])
+card_authorizer = LocalProxy(lambda: current_app.extensions['card_authorizer'])
+
+def _card_auth_key(app):
+    return (app.config['CARD_AUTH_KEY'] or app.config['SECRET_KEY']).encode()
+
+def create_app(config=None):
+    """Build the application; config overrides the settings read from the environment."""
+    app = Flask(__name__, template_folder='templates')
+    app.config['SECRET_KEY'] = 'your_secret_key_here'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///banking.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = 'static/images'
+    app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+    app.config['BULK_UPLOAD_FOLDER'] = 'uploads/bulk'
+    app.config['STATEMENT_FOLDER'] = 'statements'
+    app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'localhost')
+    app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 25))
+    app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
+    app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS') == '1'
+    app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER')
+    app.config['TWILIO_ACCOUNT_SID'] = os.environ.get('TWILIO_ACCOUNT_SID')
+    app.config['TWILIO_AUTH_TOKEN'] = os.environ.get('TWILIO_AUTH_TOKEN')
+    app.config['TWILIO_PHONE_NUMBER'] = os.environ.get('TWILIO_PHONE_NUMBER')
+    app.config['OUTBOX_EMAIL_TRANSPORT'] = os.environ.get('OUTBOX_EMAIL_TRANSPORT', 'smtp')  # smtp, memory
+    app.config['OUTBOX_SMS_TRANSPORT'] = os.environ.get('OUTBOX_SMS_TRANSPORT', 'twilio')  # twilio, memory
+    app.config['SUMMARY_CACHE_URL'] = os.environ.get('SUMMARY_CACHE_URL')  # redis://..., memory, or unset for in-process only
+    app.config['SUMMARY_CACHE_SIZE'] = int(os.environ.get('SUMMARY_CACHE_SIZE', 10000))
+    app.config['SUMMARY_CACHE_LOCAL_TTL'] = float(os.environ.get('SUMMARY_CACHE_LOCAL_TTL', cache.LOCAL_TTL))  # Staleness bound across processes without SUMMARY_CACHE_URL
+    app.config['ADMIN_USERNAMES'] = set(filter(None, os.environ.get('ADMIN_USERNAMES', '').split(',')))  # May read /cache_stats
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', hashing.WORKERS))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', hashing.MAX_QUEUE))
+    app.config['GROUP_COMMIT'] = os.environ.get('GROUP_COMMIT') == '1'  # Coalesce deposits, withdrawals and transfers into shared transactions
+    app.config['GROUP_COMMIT_WINDOW_MS'] = float(os.environ.get('GROUP_COMMIT_WINDOW_MS', group_commit.WINDOW * 1000))
+    app.config['GROUP_COMMIT_MAX_BATCH'] = int(os.environ.get('GROUP_COMMIT_MAX_BATCH', group_commit.MAX_BATCH))
+    app.config['GROUP_COMMIT_TIMEOUT'] = float(os.environ.get('GROUP_COMMIT_TIMEOUT', group_commit.TIMEOUT))  # Seconds a request waits for its posting to commit
+    app.config['CARD_AUTH_LOG'] = os.environ.get('CARD_AUTH_LOG', os.path.join(app.instance_path, 'card_auth.log'))  # Write-ahead log of card holds
+    app.config['CARD_AUTH_SETTLE_SECONDS'] = float(os.environ.get('CARD_AUTH_SETTLE_SECONDS', card_auth.SETTLE_INTERVAL))
+    app.config['CARD_AUTH_ADDRESS'] = os.environ.get('CARD_AUTH_ADDRESS')  # host:port or socket path of `flask card-authorizer`; unset to authorize in-process
+    app.config['CARD_AUTH_KEY'] = os.environ.get('CARD_AUTH_KEY')  # Shared with the service; defaults to SECRET_KEY
+    app.config['ARCHIVE_FOLDER'] = os.environ.get('ARCHIVE_FOLDER', os.path.join(app.instance_path, 'archive'))  # Yearly partition files of archived transactions
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', transaction_archive.AFTER_DAYS))
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    # Per-user dashboard summaries; every write that changes one bumps its version
+    app.extensions['summary_cache'] = VersionedCache('summary', build_summary, maxsize=app.config['SUMMARY_CACHE_SIZE'], backend=build_backend(app.config['SUMMARY_CACHE_URL']),
+                                                     local_ttl=app.config['SUMMARY_CACHE_LOCAL_TTL'])
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
+        if app.config['CARD_AUTH_ADDRESS']:
+            app.extensions['card_authorizer'] = RemoteAuthorizer(parse_address(app.config['CARD_AUTH_ADDRESS']), _card_auth_key(app))
+        else:
+            # Loads its state on first use, so processes that never authorize never open the log
+            app.extensions['card_authorizer'] = CardAuthorizer(db.engine, app.config['CARD_AUTH_LOG'], settle_interval=app.config['CARD_AUTH_SETTLE_SECONDS'],
+                                                               on_settle=app.extensions['summary_cache'].invalidate)
+        if app.config['GROUP_COMMIT']:
+            use_group_commit(group_commit.GroupCommitter(db.engine, window=app.config['GROUP_COMMIT_WINDOW_MS'] / 1000,
+                                                         max_batch=app.config['GROUP_COMMIT_MAX_BATCH'],
+                                                         timeout=app.config['GROUP_COMMIT_TIMEOUT']))
+    if click.get_current_context(silent=True) is not None:
+        # Only the flask command needs Flask-Migrate, and with it alembic
+        from flask_migrate import Migrate
+        Migrate(app, db, directory=MIGRATIONS)
+    hashing.configure(workers=app.config['PASSWORD_HASH_WORKERS'], max_queue=app.config['PASSWORD_HASH_QUEUE'])
+    app.register_blueprint(bp)
+    return app
+
+@bp.app_errorhandler(HashingBusy)
+def hashing_busy(error):
+    # Shed the request quickly instead of queueing it behind the pool
+    return Response('Too many sign-ins right now. Please try again in a moment.', status=503, headers={'Retry-After': '1'})
+
+@bp.app_errorhandler(AuthorizerUnavailable)
+def card_authorizer_unavailable(error):
+    current_app.logger.warning('%s', error)
+    return jsonify(error='Card authorization is unavailable right now'), 503, {'Retry-After': '5'}
+
+@bp.app_errorhandler(group_commit.WriterUnavailable)
+def group_commit_unavailable(error):
+    # The message says whether the posting may still commit; the customer should check before retrying
+    current_app.logger.error('%s', error)
+    return Response('Your transaction could not be confirmed. Please check your balance before trying again.', status=503, headers={'Retry-After': '5'})
+
+@bp.app_context_processor
+def inject_current_user():
+    # Lazy, so templates that never touch current_user cost no query
+    return dict(current_user=LocalProxy(current_user))
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     form = RegistrationForm()
     if form.validate_on_submit():
@@ -112,49 +146,62 @@ def register():
                 flash('Email already registered. Please use a different email.')
             else:
                 flash('Username already taken. Please choose a different username.')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
+        user.password_hash = hash_password(form.password.data)
+        # Reserved before this session starts writing
+        account_number = sequences.account_number()
         db.session.add(user)
         db.session.flush()  # Flush to get user.id
         # Create a default account
-        account_number = str(random.randint(1000000000, 9999999999))
         account = Account(account_number=account_number, user_id=user.id)
         db.session.add(account)
+        db.session.add(NotificationCounter(user_id=user.id, unread=0))
         db.session.commit()
+        forget_accounts(user.id, account.id)
         flash('Registration successful!')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('register.html', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
+        matches, new_hash = verify_password(user.password_hash, form.password.data) if user else (False, None)
+        if matches:
+            if new_hash:
+                # Stored with outdated parameters; upgrade while we have the password
+                user.password_hash = new_hash
+                db.session.commit()
             session['user_id'] = user.id
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         flash('Invalid username or password')
     return render_template('login.html', form=form)
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
+@login_required
 def dashboard():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
-    accounts = user.accounts
+    summary = summary_cache.get(session['user_id'])
+    if summary is None:
+        session.pop('user_id', None)
+        return redirect(url_for('main.login'))
     current_date = datetime.now()
     yesterday = current_date - timedelta(days=1)
     two_days_ago = current_date - timedelta(days=2)
-    return render_template('dashboard.html', accounts=accounts, current_user=user, current_date=current_date, yesterday=yesterday, two_days_ago=two_days_ago)
+    return render_template('dashboard.html', accounts=summary['accounts'], products=summary['products'], current_user=summary['user'], unread=unread_count(session['user_id']), current_date=current_date, yesterday=yesterday, two_days_ago=two_days_ago)
+
+@bp.route('/cache_stats')
+@admin_required
+def cache_stats():
+    return jsonify(summary_cache.stats())
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
-@app.route('/upload_image', methods=['GET', 'POST'])
+@bp.route('/upload_image', methods=['GET', 'POST'])
+@login_required
 def upload_image():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = UploadImageForm()
     if form.validate_on_submit():
         file = form.image.data
@@ -162,465 +209,785 @@ def upload_image():
             filename = secure_filename(file.filename)
             name, ext = os.path.splitext(filename)
             unique_filename = f"{name}_{str(uuid.uuid4())}{ext}"
-            upload_folder = app.config['UPLOAD_FOLDER']
+            upload_folder = current_app.config['UPLOAD_FOLDER']
             if os.path.exists(upload_folder) and not os.path.isdir(upload_folder):
                 os.remove(upload_folder)
             os.makedirs(upload_folder, exist_ok=True)
             file_path = os.path.join(upload_folder, unique_filename)
             if os.path.exists(file_path):os.remove(file_path)
             file.save(file_path)
-            user = User.query.get(session['user_id'])
+            user = current_user()
             user.profile_image = unique_filename
             db.session.commit()
+            summary_cache.invalidate(user.id)
             flash('Profile image uploaded successfully!')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             flash('Invalid file type. Please upload a PNG, JPG, JPEG, or GIF image.')
     return render_template('upload_image.html', form=form)
 
-@app.route('/deposit', methods=['GET', 'POST'])
+@bp.route('/deposit', methods=['GET', 'POST'])
+@login_required
 def deposit():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = TransactionForm()
     if form.validate_on_submit():
-        account = Account.query.get(form.account_id.data)
-        if account and account.user_id == session['user_id']:
-            account.balance += form.amount.data
-            transaction = Transaction(amount=form.amount.data, transaction_type='deposit', account_id=account.id)
-            db.session.add(transaction)
-            db.session.commit()
-            flash('Deposit successful!')
-            return redirect(url_for('dashboard'))
-        flash('Invalid account')
-    return render_template('deposit.html', form=form, current_user=User.query.get(session['user_id']))
+        if owns_account(form.account_id.data):
+            try:
+                post_deposit(form.account_id.data, form.amount.data, user_id=session['user_id'])
+                summary_cache.invalidate(session['user_id'])
+                flash('Deposit successful!')
+                return redirect(url_for('main.dashboard'))
+            except PostingError as e:
+                flash(str(e))
+        else:
+            flash('Invalid account')
+    return render_template('deposit.html', form=form)
 
-@app.route('/withdraw', methods=['GET', 'POST'])
+@bp.route('/withdraw', methods=['GET', 'POST'])
+@login_required
 def withdraw():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = TransactionForm()
     if form.validate_on_submit():
-        account = Account.query.get(form.account_id.data)
-        if account and account.user_id == session['user_id'] and account.balance >= form.amount.data:
-            account.balance -= form.amount.data
-            transaction = Transaction(amount=form.amount.data, transaction_type='withdraw', account_id=account.id)
-            db.session.add(transaction)
-            db.session.commit()
-            flash('Withdrawal successful!')
-            return redirect(url_for('dashboard'))
-        flash('Invalid account or insufficient funds')
+        if owns_account(form.account_id.data):
+            try:
+                post_withdrawal(form.account_id.data, form.amount.data, user_id=session['user_id'])
+                summary_cache.invalidate(session['user_id'])
+                flash('Withdrawal successful!')
+                return redirect(url_for('main.dashboard'))
+            except PostingError as e:
+                flash(str(e))
+        else:
+            flash('Invalid account or insufficient funds')
     return render_template('withdraw.html', form=form)
 
-@app.route('/transfer', methods=['GET', 'POST'])
+@bp.route('/transfer', methods=['GET', 'POST'])
+@login_required
 def transfer():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = TransferForm()
     if form.validate_on_submit():
-        from_account = Account.query.get(form.from_account_id.data)
-        to_account = Account.query.get(form.to_account_id.data)
-        if from_account and to_account and from_account.user_id == session['user_id'] and from_account.balance >= form.amount.data:
-            from_account.balance -= form.amount.data
-            to_account.balance += form.amount.data
-            transaction = Transaction(amount=form.amount.data, transaction_type='transfer', account_id=from_account.id, to_account_id=to_account.id)
-            db.session.add(transaction)
-            db.session.commit()
-            flash('Transfer successful!')
-            return redirect(url_for('dashboard'))
-        flash('Invalid accounts or insufficient funds')
+        if owns_account(form.from_account_id.data):
+            try:
+                # Fails with 'Invalid account' if the destination does not exist
+                post_transfer(form.from_account_id.data, form.to_account_id.data, form.amount.data, user_id=session['user_id'])
+                summary_cache.invalidate(session['user_id'], account_owner(form.to_account_id.data))
+                flash('Transfer successful!')
+                return redirect(url_for('main.dashboard'))
+            except PostingError as e:
+                flash(str(e))
+        else:
+            flash('Invalid accounts or insufficient funds')
     return render_template('transfer.html', form=form)
 
-@app.route('/logout')
+@bp.route('/bulk_transfer', methods=['GET', 'POST'])
+@login_required
+def bulk_transfer():
+    form = BulkTransferForm()
+    if form.validate_on_submit():
+        if owns_account(form.from_account_id.data):
+            upload = form.file.data
+            file_format = detect_format(upload.filename)
+            upload_folder = current_app.config['BULK_UPLOAD_FOLDER']
+            os.makedirs(upload_folder, exist_ok=True)
+            file_path = os.path.join(upload_folder, f"{uuid.uuid4()}.{file_format}")
+            upload.save(file_path)
+            job = BulkTransferJob(file_path=file_path, file_format=file_format, user_id=session['user_id'], account_id=form.from_account_id.data)
+            db.session.add(job)
+            db.session.commit()
+            # Files run to 50k rows, so the job runs in the background and the status page follows it
+            start_job(current_app._get_current_object(), job.id, on_finish=_bulk_transfer_finished)
+            flash('Bulk transfer started. This page shows its progress.')
+            return redirect(url_for('main.bulk_transfer_status', job_id=job.id))
+        flash('Invalid account')
+    return render_template('bulk_transfer.html', form=form)
+
+@bp.route('/bulk_transfer/<int:job_id>')
+@login_required
+def bulk_transfer_status(job_id):
+    job = BulkTransferJob.query.get(job_id)
+    if not job or job.user_id != session['user_id']:
+        flash('Invalid bulk transfer')
+        return redirect(url_for('main.dashboard'))
+    return render_template('bulk_transfer_status.html', job=job)
+
+@bp.route('/bulk_transfer/<int:job_id>/resume', methods=['POST'])
+@login_required
+def resume_bulk_transfer(job_id):
+    job = BulkTransferJob.query.get(job_id)
+    if not job or job.user_id != session['user_id']:
+        flash('Invalid bulk transfer')
+        return redirect(url_for('main.dashboard'))
+    if start_job(current_app._get_current_object(), job.id, on_finish=_bulk_transfer_finished):
+        flash('Bulk transfer resumed. Committed rows are kept.')
+    else:
+        flash('This bulk transfer is already running or finished.')
+    return redirect(url_for('main.bulk_transfer_status', job_id=job.id))
+
+def _bulk_transfer_finished(job_id):
+    summary_cache.invalidate(*affected_user_ids(job_id))
+
+@bp.route('/bulk_transfer/<int:job_id>/report')
+@login_required
+def bulk_transfer_report(job_id):
+    job = BulkTransferJob.query.get(job_id)
+    if not job or job.user_id != session['user_id']:
+        flash('Invalid bulk transfer')
+        return redirect(url_for('main.dashboard'))
+    return Response(stream_with_context(iter_report(job.id)), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename=bulk_transfer_{job.id}_report.csv'})
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create the schema on a new, empty database and mark it migrated to the latest revision."""
+    from flask_migrate import stamp
+    if inspect(db.engine).get_table_names():
+        raise click.ClickException('Database already has tables; run flask db upgrade instead')
+    db.create_all()
+    stamp()
+    click.echo(f"Initialized {db.engine.url.render_as_string()}")
+
+@bp.cli.command('resume-bulk-transfer')
+@click.argument('job_id', type=int)
+def resume_bulk_transfer_command(job_id):
+    """Resume a bulk transfer job from its last committed chunk."""
+    try:
+        job = run_job(job_id)
+    finally:
+        summary_cache.invalidate(*affected_user_ids(job_id))
+    click.echo(f"Job {job.id}: {job.status}, {job.rows_posted} posted, {job.rows_rejected} rejected")
+
+@bp.cli.command('snapshot-balances')
+def snapshot_balances_command():
+    """Fold new transactions into the daily balance snapshots."""
+    processed = catch_up()
+    click.echo(f"Processed {processed} transactions")
+
+@bp.cli.command('accrue-deposits')
+@click.option('--date', 'run_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Accrue as of this date (default: today).')
+@click.option('--dry-run', is_flag=True, help='Report what would be accrued and credited without writing.')
+def accrue_deposits_command(run_date, dry_run):
+    """Accrue interest on fixed and recurring deposits and mature due ones."""
+    from deposits import run_accruals
+    report = run_accruals((run_date or datetime.now()).date(), dry_run=dry_run, invalidate=summary_cache.invalidate)
+    if report['already_completed']:
+        click.echo(f"Accrual for {report['run_date']} already completed")
+        return
+    for key in ('fixed_deposits', 'recurring_deposits'):
+        totals = report[key]
+        click.echo(f"{key}: {totals['processed']} processed, {totals['matured']} matured, "
+                   f"accrued {totals['accrued_interest']}, credited {totals['interest_credited']}"
+                   f"{' (dry run)' if dry_run else ''}")
+
+@bp.cli.command('loan-exposure')
+@click.option('--date', 'as_of', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Exposure as of this date (default: today).')
+def loan_exposure_command(as_of):
+    """Report outstanding principal and monthly EMI across approved loans."""
+    from amortization import portfolio_exposure
+    totals = portfolio_exposure((as_of or datetime.now()).date())
+    click.echo(f"{totals['loans']} approved loans, principal {totals['principal']}, "
+               f"outstanding {totals['outstanding']}, monthly EMI {totals['monthly_emi']}")
+
+@bp.cli.command('revalue-investments')
+@click.argument('price_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--date', 'as_of', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Price date recorded on the run (default: today).')
+@click.option('--dry-run', is_flag=True, help='Report what would change without writing.')
+def revalue_investments_command(price_file, as_of, dry_run):
+    """Mark investments to market from a CSV or Parquet price/NAV file."""
+    from revaluation import run_revaluation
+    report = run_revaluation(price_file, as_of=(as_of or datetime.now()).date(), dry_run=dry_run, invalidate=summary_cache.invalidate)
+    click.echo(f"{report['prices_loaded']} prices, {report['processed']} holdings, {report['changed']} changed, "
+               f"{report['unpriced']} unpriced, value {report['value_before']} -> {report['value_after']}"
+               f"{' (dry run)' if dry_run else ''}")
+
+def _shard(ctx, param, value):
+    from billpay import parse_shard
+    try:
+        parse_shard(value)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc))
+    return value
+
+@bp.cli.command('pay-due-bills')
+@click.option('--date', 'run_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Pay bills due on or before this date (default: today).')
+@click.option('--shard', default='0/1', show_default=True, callback=_shard, help='k/n: only the k-th of n account id ranges, for parallel workers.')
+@click.option('--top', type=int, default=None, help='Highest account id the shards split; required with --shard, and the same for every shard.')
+@click.option('--plan', 'shards', type=int, default=None, help='Print the commands for this many parallel workers, sharing one --top, and exit.')
+@click.option('--chunk-size', type=int, default=50000, show_default=True, help='Bills per transaction.')
+@click.option('--dry-run', is_flag=True, help='Report what would be paid without writing.')
+def pay_due_bills_command(run_date, shard, top, shards, chunk_size, dry_run):
+    """Auto-debit pending bill payments that have fallen due."""
+    from billpay import account_top, parse_shard, run_bill_payments
+    run_date = (run_date or datetime.now()).date()
+    if shards is not None:
+        if shards < 1:
+            raise click.BadParameter('must be at least 1', param_hint='--plan')
+        top = account_top(db.session)
+        for k in range(shards):
+            click.echo(f"flask pay-due-bills --date {run_date} --shard {k}/{shards} --top {top} --chunk-size {chunk_size}"
+                       f"{' --dry-run' if dry_run else ''}")
+        return
+    if top is None and parse_shard(shard)[1] > 1:
+        raise click.UsageError('--shard needs --top, the same for every shard; --plan prints the commands')
+    report = run_bill_payments(run_date, shard=shard, dry_run=dry_run, chunk_size=chunk_size,
+                               invalidate=summary_cache.invalidate, top=top)
+    if report['already_completed']:
+        click.echo(f"Bill payments for {report['run_date']} shard {shard} already completed")
+        return
+    click.echo(f"{report['bills_due']} due, {report['bills_paid']} paid, {report['bills_insufficient']} insufficient funds, "
+               f"{report['accounts_debited']} account debits, {report['amount_paid']} paid in {report['seconds']}s "
+               f"({report['bills_per_second']} bills/s, {report['chunks']} chunks, {report['retries']} retries)"
+               f"{' (dry run)' if dry_run else ''}")
+
+@bp.cli.command('broadcast-notification')
+@click.argument('message', required=False)
+@click.option('--resume', 'broadcast_id', type=int, default=None, help='Resume this broadcast instead of starting one.')
+@click.option('--chunk-size', type=int, default=5000, show_default=True, help='Users per transaction.')
+def broadcast_notification_command(message, broadcast_id, chunk_size):
+    """Send a notification to every user, such as a rate change notice."""
+    if broadcast_id is None:
+        if not message:
+            raise click.UsageError('Give a MESSAGE or --resume')
+        broadcast_id = create_broadcast(message).id
+    broadcast = run_broadcast(broadcast_id, chunk_size=chunk_size)
+    click.echo(f"Broadcast {broadcast.id}: {broadcast.status}, {broadcast.recipients} recipients")
+
+@bp.cli.command('export-transactions')
+@click.argument('username')
+@click.option('--format', 'file_format', type=click.Choice(sorted(FORMATS)), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--start-date', help='YYYY-MM-DD')
+@click.option('--end-date', help='YYYY-MM-DD')
+@click.option('--type', 'transaction_type', help='deposit, withdraw, transfer, ...')
+@click.option('--min-amount')
+@click.option('--max-amount')
+@click.option('--out', type=click.File('wb'), default='-', help='Output file (default: stdout).')
+def export_transactions_command(username, file_format, compress, start_date, end_date, transaction_type, min_amount, max_amount, out):
+    """Stream a user's full transaction history as CSV or JSON lines."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.UsageError(f"No user {username}")
+    criteria = filter_criteria(dict(start_date=start_date, end_date=end_date, transaction_type=transaction_type,
+                                    min_amount=min_amount, max_amount=max_amount))
+    for chunk in export_stream(identity(user.id).account_ids, criteria, file_format, compress):
+        out.write(chunk)
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Re-index transactions, cheques, bills and accounts for search."""
+    started = time.perf_counter()
+    indexed = search_index.rebuild()
+    click.echo(f"Indexed {indexed} rows in {time.perf_counter() - started:.1f}s")
+
+@bp.cli.command('archive-transactions')
+@click.option('--older-than-days', type=int, default=None, help='Archive transactions older than this (default: ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, default=transaction_archive.BATCH_SIZE, show_default=True, help='Transactions moved per write transaction.')
+def archive_transactions_command(older_than_days, batch_size):
+    """Move old transactions out of the main database into yearly archive partitions."""
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if older_than_days is None else older_than_days
+    before = datetime.combine((datetime.now() - timedelta(days=days)).date(), datetime.min.time())
+    report = transaction_archive.run_archive(before, current_app.config['ARCHIVE_FOLDER'], batch_size=batch_size)
+    click.echo(f"Archived {report['archived']} transactions before {before:%Y-%m-%d} (through id {report['through_id']}) "
+               f"in {report['seconds']}s ({report['rows_per_second']} rows/s, {report['batches']} batches, "
+               f"{report['retries']} retries)")
+    for name, count in sorted(report['partitions'].items()):
+        click.echo(f"  {name}: {count}")
+
+@bp.cli.command('card-authorizer')
+def card_authorizer_command():
+    """Serve card authorization to the web workers at CARD_AUTH_ADDRESS."""
+    if not current_app.config['CARD_AUTH_ADDRESS']:
+        raise click.UsageError('Set CARD_AUTH_ADDRESS to host:port or a socket path')
+    authorizer = CardAuthorizer(db.engine, current_app.config['CARD_AUTH_LOG'], settle_interval=current_app.config['CARD_AUTH_SETTLE_SECONDS'],
+                                on_settle=summary_cache.invalidate)
+    service = card_auth.server(authorizer, parse_address(current_app.config['CARD_AUTH_ADDRESS']), _card_auth_key(current_app))
+    click.echo(f"Authorizing cards at {current_app.config['CARD_AUTH_ADDRESS']}")
+    signal.signal(signal.SIGTERM, lambda *_: service.stop_event.set())
+    try:
+        service.serve_forever()
+    finally:
+        # Settles what is captured before the process exits
+        authorizer.stop()
+
+@bp.cli.command('outbox-dispatch')
+@click.option('--once', is_flag=True, help='Send one batch and exit instead of polling.')
+@click.option('--poll-interval', type=float, default=2.0, show_default=True)
+def outbox_dispatch_command(once, poll_interval):
+    """Deliver queued statement emails and SMS messages."""
+    if once:
+        sent, failed = dispatch_once(current_app.config)
+        click.echo(f"Sent {sent}, failed {failed}")
+        return
+    run_dispatcher(current_app._get_current_object(), poll_interval=poll_interval)
+
+@bp.route('/logout')
 def logout():
     session.pop('user_id', None)
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/transactions')
+@bp.route('/transactions')
+@login_required
 def transactions():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
-    query = Transaction.query.filter(
-        (Transaction.account_id.in_([account.id for account in user.accounts])) |
-        (Transaction.to_account_id.in_([account.id for account in user.accounts]))
+    user = identity()
+    user_transactions, next_cursor = transaction_page(
+        user.account_ids,
+        filter_criteria(request.args),
+        cursor=decode_cursor(request.args.get('before')),
+        limit=page_size(request.args),
     )
-    
-    # Apply filters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    transaction_type = request.args.get('transaction_type')
-    min_amount = request.args.get('min_amount')
-    max_amount = request.args.get('max_amount')
-    
-    if start_date:
-        query = query.filter(Transaction.timestamp >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        query = query.filter(Transaction.timestamp <= datetime.strptime(end_date, '%Y-%m-%d'))
-    if transaction_type:
-        query = query.filter(Transaction.transaction_type == transaction_type)
-    if min_amount:
-        query = query.filter(Transaction.amount >= float(min_amount))
-    if max_amount:
-        query = query.filter(Transaction.amount <= float(max_amount))
-    
-    user_transactions = query.order_by(Transaction.timestamp.desc()).all()
-    return render_template('transactions.html', transactions=user_transactions, current_user=user)
-
-@app.route('/change_password', methods=['GET', 'POST'])
+    next_url = url_for('main.transactions', **dict(request.args.to_dict(), before=next_cursor)) if next_cursor else None
+    filters = {key: value for key, value in request.args.items() if key not in ('before', 'per_page')}
+    return render_template('transactions.html', transactions=user_transactions, next_url=next_url, filters=filters)
+
+@bp.route('/search')
+@login_required
+def search():
+    # ?q= words to find (the last, and any ending in *, match as prefixes); ?kind= narrows to one of search_index.KINDS
+    query, kind = request.args.get('q', ''), request.args.get('kind') or None
+    results = search_index.search(session['user_id'], query, kind=kind)
+    return render_template('search.html', query=query, kind=kind, kinds=search_index.KINDS, results=results)
+
+@bp.route('/transactions/export')
+@login_required
+def export_transactions():
+    # Same filters as the history page; ?format=csv|jsonl, ?gzip=1 compresses on the fly
+    file_format = request.args.get('format', 'csv')
+    if file_format not in FORMATS:
+        return jsonify(error='format must be csv or jsonl'), 400
+    compress = request.args.get('gzip') == '1'
+    criteria = filter_criteria(request.args)
+    chunks = export_stream(identity().account_ids, criteria, file_format, compress)
+    filename = f"transactions.{file_format}{'.gz' if compress else ''}"
+    return Response(stream_with_context(chunks), mimetype='application/gzip' if compress else FORMATS[file_format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.route('/change_password', methods=['GET', 'POST'])
+@login_required
 def change_password():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = ChangePasswordForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        user.set_password(form.password.data)
+        user = current_user()
+        user.password_hash = hash_password(form.password.data)
         db.session.commit()
         flash('Password changed successfully!')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('change_password.html', form=form)
 
-@app.route('/account_details/<int:account_id>')
+@bp.route('/account_details/<int:account_id>')
+@login_required
 def account_details(account_id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    account = Account.query.get(account_id)
-    if not account or account.user_id != session['user_id']:
+    account = Account.query.get(account_id) if owns_account(account_id) else None
+    if account is None:
         flash('Invalid account')
-        return redirect(url_for('dashboard'))
-    transactions = Transaction.query.filter(
-        (Transaction.account_id == account_id) | (Transaction.to_account_id == account_id)
-    ).order_by(Transaction.timestamp.desc()).all()
-    return render_template('account_details.html', account=account, transactions=transactions, current_user=User.query.get(session['user_id']))
+        return redirect(url_for('main.dashboard'))
+    transactions, next_cursor = transaction_page(
+        [account_id],
+        filter_criteria(request.args),
+        cursor=decode_cursor(request.args.get('before')),
+        limit=page_size(request.args),
+    )
+    next_url = url_for('main.account_details', **dict(request.args.to_dict(), account_id=account_id, before=next_cursor)) if next_cursor else None
+    return render_template('account_details.html', account=account, transactions=transactions, next_url=next_url)
 
-@app.route('/delete_account/<int:account_id>', methods=['POST'])
+@bp.route('/delete_account/<int:account_id>', methods=['POST'])
+@login_required
 def delete_account(account_id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    account = Account.query.get(account_id)
-    if not account or account.user_id != session['user_id']:
+    account = Account.query.get(account_id) if owns_account(account_id) else None
+    if account is None:
         flash('Invalid account')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     if account.balance > 0:
         flash('Cannot delete account with positive balance')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     db.session.delete(account)
     db.session.commit()
+    forget_accounts(session['user_id'], account_id)
+    summary_cache.invalidate(session['user_id'])
     flash('Account deleted successfully!')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/loans')
+@bp.route('/loans')
+@login_required
 def loans():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_loans = Loan.query.filter_by(user_id=session['user_id']).all()
-    return render_template('loans.html', loans=user_loans, current_user=User.query.get(session['user_id']))
-
-@app.route('/apply_loan', methods=['GET', 'POST'])
+    from amortization import outstanding_as_of, schedule
+    today = datetime.now().date()
+    user_loans = [
+        dict(loan._asdict(), emi=schedule(loan.amount, loan.interest_rate, loan.term_months).emi,
+             outstanding=outstanding_as_of(loan.amount, loan.interest_rate, loan.term_months, loan.created_at, today) if loan.status == 'approved' else loan.amount)
+        for loan in db.session.execute(select(Loan.id, Loan.amount, Loan.interest_rate, Loan.term_months, Loan.status, Loan.created_at).filter_by(user_id=session['user_id'])).all()
+    ]
+    return render_template('loans.html', loans=user_loans)
+
+@bp.route('/loans/<int:loan_id>/schedule')
+@login_required
+def loan_schedule(loan_id):
+    from amortization import schedule
+    loan = db.session.execute(select(Loan.id, Loan.amount, Loan.interest_rate, Loan.term_months, Loan.user_id).filter_by(id=loan_id)).first()
+    if not loan or loan.user_id != session['user_id']:
+        flash('Invalid loan')
+        return redirect(url_for('main.loans'))
+    return render_template('loan_schedule.html', loan=loan, schedule=schedule(loan.amount, loan.interest_rate, loan.term_months))
+
+@bp.route('/apply_loan', methods=['GET', 'POST'])
+@login_required
 def apply_loan():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = LoanForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        if not user.accounts:
+        user = identity()
+        if not user.account_ids:
             flash('You need an account to apply for a loan')
-            return redirect(url_for('dashboard'))
-        loan = Loan(amount=form.amount.data, term_months=form.term_months.data, user_id=user.id, account_id=user.accounts[0].id)
+            return redirect(url_for('main.dashboard'))
+        loan = Loan(amount=form.amount.data, term_months=form.term_months.data, user_id=user.id, account_id=user.account_ids[0])
         db.session.add(loan)
         db.session.commit()
+        summary_cache.invalidate(user.id)
         flash('Loan application submitted!')
-        return redirect(url_for('loans'))
-    return render_template('apply_loan.html', form=form, current_user=User.query.get(session['user_id']))
+        return redirect(url_for('main.loans'))
+    return render_template('apply_loan.html', form=form)
 
-@app.route('/credit_cards')
+@bp.route('/credit_cards')
+@login_required
 def credit_cards():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_cards = CreditCard.query.filter_by(user_id=session['user_id']).all()
-    return render_template('credit_cards.html', cards=user_cards, current_user=User.query.get(session['user_id']))
-
-@app.route('/apply_credit_card', methods=['GET', 'POST'])
+    user_cards = db.session.execute(select(CreditCard.id, CreditCard.card_number, CreditCard.expiry_date, CreditCard.limit, CreditCard.balance).filter_by(user_id=session['user_id'])).all()
+    try:
+        # Live figure, including holds not yet settled into the balance
+        open_to_buy = {card_id: Decimal(paise).scaleb(-2)
+                       for card_id, paise in card_authorizer.open_to_buy_many([card.id for card in user_cards]).items()}
+    except AuthorizerUnavailable as exc:
+        current_app.logger.warning('%s', exc)
+        # Settled figure only; holds are missing until the authorizer is back
+        open_to_buy = {card.id: (card.limit or 0) - (card.balance or 0) for card in user_cards}
+    return render_template('credit_cards.html', cards=user_cards, open_to_buy=open_to_buy)
+
+def _owned_card(card_id):
+    return db.session.scalar(select(CreditCard.id).where(CreditCard.id == card_id, CreditCard.user_id == session['user_id']))
+
+@bp.route('/credit_cards/<int:card_id>/authorize', methods=['POST'])
+@login_required
+def authorize_card(card_id):
+    # POST amount=... places a hold; capture or release it by the returned hold_id
+    if _owned_card(card_id) is None:
+        return jsonify(error='Invalid card'), 404
+    try:
+        hold_id = card_authorizer.authorize(card_id, to_paise(request.form.get('amount', '')))
+    except ArithmeticError:
+        return jsonify(error='Invalid amount'), 400
+    except Declined as exc:
+        return jsonify(approved=False, reason=str(exc)), 402
+    return jsonify(approved=True, hold_id=hold_id, open_to_buy=str(Decimal(card_authorizer.open_to_buy(card_id)).scaleb(-2)))
+
+@bp.route('/credit_cards/holds/<int:hold_id>/<action>', methods=['POST'])
+@login_required
+def card_hold(hold_id, action):
+    # action is capture (optional amount, defaulting to the full hold) or release
+    hold = card_authorizer.hold(hold_id)
+    if action not in ('capture', 'release') or hold is None or _owned_card(hold[0]) is None:
+        return jsonify(error='Invalid hold'), 404
+    try:
+        if action == 'capture':
+            amount = request.form.get('amount')
+            card_authorizer.capture(hold_id, to_paise(amount) if amount else None)
+        else:
+            card_authorizer.release(hold_id)
+    except ArithmeticError:
+        return jsonify(error='Invalid amount'), 400
+    except Declined as exc:
+        return jsonify(error=str(exc)), 409
+    return jsonify(hold_id=hold_id, status='captured' if action == 'capture' else 'released',
+                   open_to_buy=str(Decimal(card_authorizer.open_to_buy(hold[0])).scaleb(-2)))
+
+@bp.route('/apply_credit_card', methods=['GET', 'POST'])
+@login_required
 def apply_credit_card():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = CreditCardForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        if not user.accounts:
+        user = identity()
+        if not user.account_ids:
             flash('You need an account to apply for a credit card')
-            return redirect(url_for('dashboard'))
-        card_number = str(random.randint(1000000000000000, 9999999999999999))
+            return redirect(url_for('main.dashboard'))
+        card_number = sequences.card_number()
         expiry_date = f"{random.randint(1, 12):02d}/{random.randint(25, 30)}"
         cvv = str(random.randint(100, 999))
-        card = CreditCard(card_number=card_number, expiry_date=expiry_date, cvv=cvv, limit=form.limit.data, user_id=user.id, account_id=user.accounts[0].id)
+        card = CreditCard(card_number=card_number, expiry_date=expiry_date, cvv=cvv, limit=form.limit.data, user_id=user.id, account_id=user.account_ids[0])
         db.session.add(card)
         db.session.commit()
+        summary_cache.invalidate(user.id)
         flash('Credit card application submitted!')
-        return redirect(url_for('credit_cards'))
-    return render_template('apply_credit_card.html', form=form, current_user=User.query.get(session['user_id']))
+        return redirect(url_for('main.credit_cards'))
+    return render_template('apply_credit_card.html', form=form)
 
-@app.route('/notifications')
+@bp.route('/notifications')
+@login_required
 def notifications():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_notifications = Notification.query.filter_by(user_id=session['user_id']).order_by(Notification.created_at.desc()).all()
-    return render_template('notifications.html', notifications=user_notifications, current_user=User.query.get(session['user_id']))
+    archived = request.args.get('archived') == '1'
+    user_notifications, next_cursor = inbox_page(
+        session['user_id'],
+        archived=archived,
+        cursor=decode_cursor(request.args.get('before')),
+        limit=page_size(request.args),
+    )
+    next_url = url_for('main.notifications', **dict(request.args.to_dict(), before=next_cursor)) if next_cursor else None
+    return render_template('notifications.html', notifications=user_notifications, next_url=next_url, archived=archived, unread=unread_count(session['user_id']))
+
+@bp.route('/notifications/mark_read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    # Without selected ids this marks the whole inbox read
+    notification_ids = request.form.getlist('notification_id', type=int) or None
+    mark_read(session['user_id'], notification_ids)
+    db.session.commit()
+    return redirect(url_for('main.notifications'))
+
+@bp.route('/notifications/archive', methods=['POST'])
+@login_required
+def archive_notifications():
+    notification_ids = request.form.getlist('notification_id', type=int)
+    if notification_ids:
+        archive(session['user_id'], notification_ids)
+        db.session.commit()
+    return redirect(url_for('main.notifications'))
 
-@app.route('/insurance')
+@bp.route('/insurance')
+@login_required
 def insurance():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_insurance = Insurance.query.filter_by(user_id=session['user_id']).all()
-    return render_template('insurance.html', insurance=user_insurance, current_user=User.query.get(session['user_id']))
+    user_insurance = db.session.execute(select(Insurance.type, Insurance.coverage_amount, Insurance.premium_amount, Insurance.term_years, Insurance.status).filter_by(user_id=session['user_id'])).all()
+    return render_template('insurance.html', insurance=user_insurance)
 
-@app.route('/apply_insurance', methods=['GET', 'POST'])
+@bp.route('/apply_insurance', methods=['GET', 'POST'])
+@login_required
 def apply_insurance():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = InsuranceForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        if not user.accounts:
+        user = identity()
+        if not user.account_ids:
             flash('You need an account to apply for insurance')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         # Calculate premium based on type and coverage
-        premium_rates = {'life': 0.001, 'health': 0.002, 'vehicle': 0.003}
+        premium_rates = {'life': Decimal('0.001'), 'health': Decimal('0.002'), 'vehicle': Decimal('0.003')}
         premium = form.coverage_amount.data * premium_rates[form.type.data] * form.term_years.data / 12
-        insurance = Insurance(type=form.type.data, coverage_amount=form.coverage_amount.data, premium_amount=premium, term_years=form.term_years.data, user_id=user.id, account_id=user.accounts[0].id)
+        insurance = Insurance(type=form.type.data, coverage_amount=form.coverage_amount.data, premium_amount=premium, term_years=form.term_years.data, user_id=user.id, account_id=user.account_ids[0])
         db.session.add(insurance)
         db.session.commit()
+        summary_cache.invalidate(user.id)
         flash('Insurance application submitted!')
-        return redirect(url_for('insurance'))
+        return redirect(url_for('main.insurance'))
     return render_template('apply_insurance.html', form=form)
 
-@app.route('/investments')
+@bp.route('/investments')
+@login_required
 def investments():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_investments = Investment.query.filter_by(user_id=session['user_id']).all()
-    return render_template('investments.html', investments=user_investments, current_user=User.query.get(session['user_id']))
+    user_investments = db.session.execute(select(Investment.type, Investment.instrument, Investment.amount, Investment.current_value, Investment.returns).filter_by(user_id=session['user_id'])).all()
+    return render_template('investments.html', investments=user_investments)
 
-@app.route('/apply_investment', methods=['GET', 'POST'])
+@bp.route('/apply_investment', methods=['GET', 'POST'])
+@login_required
 def apply_investment():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
+    from revaluation import units_for
     form = InvestmentForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        if not user.accounts:
+        user = identity()
+        if not user.account_ids:
             flash('You need an account to invest')
-            return redirect(url_for('dashboard'))
-        # Simple investment logic - in real app, this would integrate with actual investment APIs
-        current_value = form.amount.data * 1.05  # Assume 5% initial return
-        investment = Investment(type=form.type.data, amount=form.amount.data, current_value=current_value, user_id=user.id, account_id=user.accounts[0].id)
+            return redirect(url_for('main.dashboard'))
+        # Bought at the last revaluation price; the next revaluation moves current_value
+        instrument = (form.instrument.data or '').strip() or None
+        units = units_for(instrument or form.type.data, form.amount.data)
+        investment = Investment(type=form.type.data, instrument=instrument, units=units, amount=form.amount.data, current_value=form.amount.data, returns=0, user_id=user.id, account_id=user.account_ids[0])
         db.session.add(investment)
         db.session.commit()
+        summary_cache.invalidate(user.id)
         flash('Investment successful!')
-        return redirect(url_for('investments'))
-    return render_template('apply_investment.html', form=form, current_user=User.query.get(session['user_id']))
+        return redirect(url_for('main.investments'))
+    return render_template('apply_investment.html', form=form)
 
-@app.route('/cheque_management')
+@bp.route('/cheque_management')
+@login_required
 def cheque_management():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_cheques = Cheque.query.filter_by(user_id=session['user_id']).all()
-    return render_template('cheque_management.html', cheques=user_cheques, current_user=User.query.get(session['user_id']))
+    user_cheques = db.session.execute(select(Cheque.cheque_number, Cheque.amount, Cheque.payee, Cheque.status).filter_by(user_id=session['user_id'])).all()
+    return render_template('cheque_management.html', cheques=user_cheques)
 
-@app.route('/request_cheque', methods=['GET', 'POST'])
+@bp.route('/request_cheque', methods=['GET', 'POST'])
+@login_required
 def request_cheque():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = ChequeRequestForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        if not user.accounts:
+        user = identity()
+        if not user.account_ids:
             flash('You need an account to request cheques')
-            return redirect(url_for('dashboard'))
-        # Generate cheque numbers
-        for i in range(form.number_of_cheques.data):
-            cheque_number = f"{user.accounts[0].account_number}_{random.randint(100000, 999999)}"
-            cheque = Cheque(cheque_number=cheque_number, amount=0.0, payee='', user_id=user.id, account_id=user.accounts[0].id)
-            db.session.add(cheque)
+            return redirect(url_for('main.dashboard'))
+        numbers = sequences.cheque_numbers(user.account_ids[0], user.account_numbers[0], form.number_of_cheques.data)
+        db.session.execute(insert(Cheque), [
+            dict(cheque_number=number, amount=0, payee='', user_id=user.id, account_id=user.account_ids[0])
+            for number in numbers
+        ])
         db.session.commit()
         flash('Cheque book requested successfully!')
-        return redirect(url_for('cheque_management'))
+        return redirect(url_for('main.cheque_management'))
     return render_template('request_cheque.html', form=form)
 
-def generate_statement_pdf(statement):
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.drawString(100, 750, f"SBI Account Statement")
-    p.drawString(100, 730, f"Period: {statement.start_date} to {statement.end_date}")
-    p.drawString(100, 710, f"Generated: {statement.created_at}")
-    p.drawString(100, 690, f"Account: {statement.account.account_number}")
-    p.drawString(100, 670, f"Balance: {statement.account.balance}")
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    return buffer
-
-@app.route('/account_statements')
+@bp.route('/account_statements')
+@login_required
 def account_statements():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_statements = AccountStatement.query.filter_by(user_id=session['user_id']).all()
-    return render_template('account_statements.html', statements=user_statements, current_user=User.query.get(session['user_id']))
+    user_statements = db.session.execute(select(AccountStatement.id, AccountStatement.start_date, AccountStatement.end_date, AccountStatement.status, AccountStatement.created_at).filter_by(user_id=session['user_id'])).all()
+    return render_template('account_statements.html', statements=user_statements)
 
-@app.route('/download_statement/<int:statement_id>')
+@bp.route('/download_statement/<int:statement_id>')
+@login_required
 def download_statement(statement_id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     statement = AccountStatement.query.get(statement_id)
     if not statement or statement.user_id != session['user_id']:
         flash('Invalid statement')
-        return redirect(url_for('account_statements'))
-    pdf_buffer = generate_statement_pdf(statement)
-    return send_file(pdf_buffer, as_attachment=True, download_name=f"statement_{statement_id}.pdf", mimetype='application/pdf')
+        return redirect(url_for('main.account_statements'))
+    if ensure_rendered(statement, current_app.config['STATEMENT_FOLDER']) != 'ready':
+        flash('Your statement is still being generated. Please try again shortly.')
+        return redirect(url_for('main.account_statements'))
+    # Served from disk so repeat downloads get ETag and Range support
+    return send_file(statement.file_path, as_attachment=True, download_name=f"statement_{statement_id}.pdf", mimetype='application/pdf', conditional=True, etag=True)
+
+@bp.route('/statement_status/<int:statement_id>')
+@login_required
+def statement_status(statement_id):
+    statement = AccountStatement.query.get(statement_id)
+    if not statement or statement.user_id != session['user_id']:
+        return jsonify(error='Invalid statement'), 404
+    return jsonify(id=statement.id, status=ensure_rendered(statement, current_app.config['STATEMENT_FOLDER']))
 
-@app.route('/send_statement/<int:statement_id>', methods=['POST'])
+@bp.route('/send_statement/<int:statement_id>', methods=['POST'])
+@login_required
 def send_statement(statement_id):
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     statement = AccountStatement.query.get(statement_id)
     if not statement or statement.user_id != session['user_id']:
         flash('Invalid statement')
-        return redirect(url_for('account_statements'))
+        return redirect(url_for('main.account_statements'))
+    if ensure_rendered(statement, current_app.config['STATEMENT_FOLDER']) != 'ready':
+        flash('Your statement is still being generated. Please try again shortly.')
+        return redirect(url_for('main.account_statements'))
     send_type = request.form.get('send_type')
     contact = request.form.get('contact')
-    pdf_buffer = generate_statement_pdf(statement)
+    if not contact or send_type not in ('email', 'sms'):
+        flash('Please choose email or SMS and enter where to send the statement.')
+        return redirect(url_for('main.account_statements'))
+    # Only queued here; the outbox dispatcher delivers it
     if send_type == 'email':
-        msg = Message('Your SBI Account Statement', sender=app.config['MAIL_USERNAME'], recipients=[contact])
-        msg.body = 'Please find your account statement attached.'
-        msg.attach(f"statement_{statement_id}.pdf", 'application/pdf', pdf_buffer.getvalue())
-        mail.send(msg)
-        flash('Statement sent to email successfully!')
-    elif send_type == 'sms':
-        message = twilio_client.messages.create(
-            body='Your SBI account statement has been generated. Please check your email for the PDF.',
-            from_=app.config['TWILIO_PHONE_NUMBER'],
-            to=contact
-        )
-        flash('Statement sent via SMS successfully!')
-    return redirect(url_for('account_statements'))
-
-@app.route('/generate_statement', methods=['GET', 'POST'])
+        enqueue('email', contact, 'Please find your account statement attached.', subject='Your SBI Account Statement',
+                attachment_path=statement.file_path, attachment_name=f"statement_{statement_id}.pdf", user_id=statement.user_id)
+        flash('Your statement will be emailed shortly.')
+    else:
+        enqueue('sms', contact, 'Your SBI account statement has been generated. Please check your email for the PDF.', user_id=statement.user_id)
+        flash('Your statement notification will be sent by SMS shortly.')
+    db.session.commit()
+    return redirect(url_for('main.account_statements'))
+
+@bp.route('/generate_statement', methods=['GET', 'POST'])
+@login_required
 def generate_statement():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = AccountStatementForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        if not user.accounts:
+        user = identity()
+        if not user.account_ids:
             flash('You need an account to generate statements')
-            return redirect(url_for('dashboard'))
-        # In a real app, generate PDF statement here
-        file_path = f"statements/{user.id}_{form.start_date.data}_{form.end_date.data}.pdf"
-        statement = AccountStatement(start_date=form.start_date.data, end_date=form.end_date.data, file_path=file_path, user_id=user.id, account_id=user.accounts[0].id)
+            return redirect(url_for('main.dashboard'))
+        statement = AccountStatement(start_date=form.start_date.data, end_date=form.end_date.data, file_path='', user_id=user.id, account_id=user.account_ids[0])
         db.session.add(statement)
+        db.session.flush()  # Flush to get statement.id
+        statement.file_path = statement_path(current_app.config['STATEMENT_FOLDER'], statement.id)
         db.session.commit()
-        flash('Statement generated successfully!')
-        return redirect(url_for('account_statements'))
+        # Rendered off the request thread; the statements page polls its status
+        ensure_rendered(statement, current_app.config['STATEMENT_FOLDER'])
+        flash('Statement requested! It will be ready to download shortly.')
+        return redirect(url_for('main.account_statements'))
     return render_template('generate_statement.html', form=form)
 
-@app.route('/fixed_deposits')
+@bp.route('/fixed_deposits')
+@login_required
 def fixed_deposits():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_fixed_deposits = FixedDeposit.query.filter_by(user_id=session['user_id']).all()
-    return render_template('fixed_deposits.html', fixed_deposits=user_fixed_deposits, current_user=User.query.get(session['user_id']))
+    user_fixed_deposits = db.session.execute(select(FixedDeposit.amount, FixedDeposit.interest_rate, FixedDeposit.term_months, FixedDeposit.maturity_date, FixedDeposit.status).filter_by(user_id=session['user_id'])).all()
+    return render_template('fixed_deposits.html', fixed_deposits=user_fixed_deposits)
 
-@app.route('/apply_fixed_deposit', methods=['GET', 'POST'])
+@bp.route('/apply_fixed_deposit', methods=['GET', 'POST'])
+@login_required
 def apply_fixed_deposit():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
+    from deposits import add_months
     form = FixedDepositForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        if not user.accounts:
+        user = identity()
+        if not user.account_ids:
             flash('You need an account to apply for fixed deposit')
-            return redirect(url_for('dashboard'))
-        maturity_date = datetime.now() + timedelta(days=form.term_months.data * 30)
-        fixed_deposit = FixedDeposit(amount=form.amount.data, term_months=form.term_months.data, maturity_date=maturity_date, user_id=user.id, account_id=user.accounts[0].id)
+            return redirect(url_for('main.dashboard'))
+        maturity_date = add_months(datetime.now(), form.term_months.data)
+        fixed_deposit = FixedDeposit(amount=form.amount.data, term_months=form.term_months.data, maturity_date=maturity_date, user_id=user.id, account_id=user.account_ids[0])
         db.session.add(fixed_deposit)
         db.session.commit()
+        summary_cache.invalidate(user.id)
         flash('Fixed deposit application submitted!')
-        return redirect(url_for('fixed_deposits'))
+        return redirect(url_for('main.fixed_deposits'))
     return render_template('apply_fixed_deposit.html', form=form)
 
-@app.route('/recurring_deposits')
+@bp.route('/recurring_deposits')
+@login_required
 def recurring_deposits():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_recurring_deposits = RecurringDeposit.query.filter_by(user_id=session['user_id']).all()
-    return render_template('recurring_deposits.html', recurring_deposits=user_recurring_deposits, current_user=User.query.get(session['user_id']))
+    user_recurring_deposits = db.session.execute(select(RecurringDeposit.monthly_amount, RecurringDeposit.interest_rate, RecurringDeposit.term_months, RecurringDeposit.maturity_date, RecurringDeposit.status).filter_by(user_id=session['user_id'])).all()
+    return render_template('recurring_deposits.html', recurring_deposits=user_recurring_deposits)
 
-@app.route('/apply_recurring_deposit', methods=['GET', 'POST'])
+@bp.route('/apply_recurring_deposit', methods=['GET', 'POST'])
+@login_required
 def apply_recurring_deposit():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
+    from deposits import add_months
     form = RecurringDepositForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        if not user.accounts:
+        user = identity()
+        if not user.account_ids:
             flash('You need an account to apply for recurring deposit')
-            return redirect(url_for('dashboard'))
-        maturity_date = datetime.now() + timedelta(days=form.term_months.data * 30)
-        recurring_deposit = RecurringDeposit(monthly_amount=form.monthly_amount.data, term_months=form.term_months.data, maturity_date=maturity_date, user_id=user.id, account_id=user.accounts[0].id)
+            return redirect(url_for('main.dashboard'))
+        maturity_date = add_months(datetime.now(), form.term_months.data)
+        recurring_deposit = RecurringDeposit(monthly_amount=form.monthly_amount.data, term_months=form.term_months.data, maturity_date=maturity_date, user_id=user.id, account_id=user.account_ids[0])
         db.session.add(recurring_deposit)
         db.session.commit()
+        summary_cache.invalidate(user.id)
         flash('Recurring deposit application submitted!')
-        return redirect(url_for('recurring_deposits'))
+        return redirect(url_for('main.recurring_deposits'))
     return render_template('apply_recurring_deposit.html', form=form)
 
-@app.route('/bill_payments')
+@bp.route('/bill_payments')
+@login_required
 def bill_payments():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user_bills = BillPayment.query.filter_by(user_id=session['user_id']).all()
-    return render_template('bill_payments.html', bills=user_bills, current_user=User.query.get(session['user_id']))
+    user_bills = db.session.execute(select(BillPayment.bill_type, BillPayment.bill_number, BillPayment.amount, BillPayment.due_date, BillPayment.status, BillPayment.paid_at).filter_by(user_id=session['user_id'])).all()
+    return render_template('bill_payments.html', bills=user_bills)
 
-@app.route('/pay_bill', methods=['GET', 'POST'])
+@bp.route('/pay_bill', methods=['GET', 'POST'])
+@login_required
 def pay_bill():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     form = BillPaymentForm()
     if form.validate_on_submit():
-        user = User.query.get(session['user_id'])
-        if not user.accounts:
+        user = identity()
+        if not user.account_ids:
             flash('You need an account to pay bills')
-            return redirect(url_for('dashboard'))
-        bill = BillPayment(bill_type=form.bill_type.data, bill_number=form.bill_number.data, amount=form.amount.data, due_date=form.due_date.data, user_id=user.id, account_id=user.accounts[0].id)
+            return redirect(url_for('main.dashboard'))
+        bill = BillPayment(bill_type=form.bill_type.data, bill_number=form.bill_number.data, amount=form.amount.data, due_date=form.due_date.data, user_id=user.id, account_id=user.account_ids[0])
         db.session.add(bill)
         db.session.commit()
         flash('Bill payment submitted!')
-        return redirect(url_for('bill_payments'))
+        return redirect(url_for('main.bill_payments'))
     return render_template('pay_bill.html', form=form)
 
-@app.route('/contact', methods=['GET', 'POST'])
+@bp.route('/contact', methods=['GET', 'POST'])
+@login_required
 def contact():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
     if request.method == 'POST':
         # Here you would typically save the contact form data to database
         # For now, we'll just flash a success message
         flash('Thank you for your message! We\'ll get back to you within 24 hours.')
-        return redirect(url_for('contact'))
-    return render_template('contact.html', current_user=User.query.get(session['user_id']))
+        return redirect(url_for('main.contact'))
+    return render_template('contact.html')
 
-@app.route('/help')
+@bp.route('/help')
+@login_required
 def help():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    return render_template('help.html', current_user=User.query.get(session['user_id']))
+    return render_template('help.html')
 
-@app.route('/settings')
+@bp.route('/settings')
+@login_required
 def settings():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    return render_template('settings.html', current_user=User.query.get(session['user_id']))
+    return render_template('settings.html')
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True)
+    # Run flask init-db once first to create the schema
+    create_app().run(debug=True)
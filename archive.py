@@ -0,0 +1,181 @@
+import operator
+import os
+import time
+from collections import defaultdict
+from sqlalchemy import (BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, bindparam,
+                        create_engine, delete, func, insert, select, type_coerce)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import visitors
+from database import configure_engine, engine_options
+from models import db, Account, ArchivePartition, Money, Transaction, Watermark
+from posting import MAX_ATTEMPTS, RETRY_BACKOFF, is_retryable
+
+BATCH_SIZE = 10000  # Transactions copied out and deleted per write transaction, so each write lock stays short
+AFTER_DAYS = 730  # Transactions older than this are archived by default
+IN_BATCH = 10000  # Account ids per account number lookup
+
+# Every partition file holds one calendar year of transactions in this
+# table: Transaction's columns and history indexes, without foreign keys,
+# since accounts stay in the main database. Files are only ever appended to
+metadata = MetaData()
+table = Table(
+    'transaction', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('amount', Money, nullable=False),
+    Column('transaction_type', String(50), nullable=False),
+    Column('timestamp', DateTime, nullable=False),
+    Column('account_id', Integer, nullable=False),
+    Column('to_account_id', Integer, nullable=True),
+    Index('ix_transaction_account_id_timestamp', 'account_id', 'timestamp'),
+    Index('ix_transaction_to_account_id_timestamp', 'to_account_id', 'timestamp'),
+)
+
+_engines = {}
+
+def partition_path(folder, year):
+    return os.path.abspath(os.path.join(folder, f"transactions_{year}.db"))
+
+def engine_for(path):
+    engine = _engines.get(path)
+    if engine is None:
+        url = f"sqlite:///{path}"
+        engine = _engines[path] = configure_engine(create_engine(url, **engine_options(url)))
+    return engine
+
+def partitions(session, since=None, until=None):
+    """Paths of the partitions that may hold transactions from since to until, newest first.
+
+    Readers look here only after reading the main table: a transaction is
+    copied out before it is deleted, and catalogued in the same commit as
+    the delete, so it is always in one or the other, and briefly in both.
+    """
+    query = select(ArchivePartition.path)
+    if since is not None:
+        query = query.where(ArchivePartition.last_timestamp >= since)
+    if until is not None:
+        query = query.where(ArchivePartition.first_timestamp <= until)
+    return session.scalars(query.order_by(ArchivePartition.last_timestamp.desc())).all()
+
+def _on_timestamp(element):
+    return getattr(element, 'table', None) is Transaction.__table__ and element.key == 'timestamp'
+
+def time_bounds(criteria):
+    """(since, until) that criteria put on Transaction.timestamp, either None when open."""
+    since = until = None
+    for criterion in criteria:
+        value = getattr(getattr(criterion, 'right', None), 'value', None)
+        if value is None or not _on_timestamp(getattr(criterion, 'left', None)):
+            continue
+        if criterion.operator in (operator.ge, operator.gt):
+            since = value if since is None else max(since, value)
+        elif criterion.operator in (operator.le, operator.lt):
+            until = value if until is None else min(until, value)
+    return since, until
+
+def retarget(criteria):
+    # The same conditions on Transaction, against a partition's table
+    def swap(element):
+        if getattr(element, 'table', None) is Transaction.__table__:
+            return table.c[element.key]
+        return None
+    return [visitors.replacement_traverse(criterion, {}, swap) for criterion in criteria]
+
+def account_numbers(session, account_ids):
+    """{account id: account number} from the main database."""
+    ids = sorted(account_id for account_id in account_ids if account_id is not None)
+    found = {}
+    for start in range(0, len(ids), IN_BATCH):
+        found.update(session.execute(
+            select(Account.id, Account.account_number).where(Account.id.in_(ids[start:start + IN_BATCH]))
+        ).all())
+    return found
+
+def _eligible(session, before, after, through, batch_size):
+    source = Transaction.__table__
+    return session.execute(
+        select(source.c.id, type_coerce(source.c.amount, BigInteger).label('paise'), source.c.transaction_type,
+               source.c.timestamp, source.c.account_id, source.c.to_account_id)
+        .where(source.c.id > after, source.c.id <= through, source.c.timestamp < before)
+        .order_by(source.c.id)
+        .limit(batch_size)
+    ).all()
+
+def _copy(path, rows, created):
+    # Idempotent, so a batch copied before a crash is simply copied again
+    engine = engine_for(path)
+    if path not in created:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        metadata.create_all(engine)
+        created.add(path)
+    statement = insert(table).prefix_with('OR IGNORE').values({table.c.amount: bindparam('paise', type_=BigInteger)})
+    with engine.begin() as conn:
+        conn.execute(statement, [row._asdict() for row in rows])
+
+def _move(session, by_path):
+    # Delete from the main table and catalog the partitions in one short transaction
+    source = Transaction.__table__
+    moved = {}
+    for path, rows in by_path.items():
+        moved[path] = session.execute(delete(source).where(source.c.id.in_([row.id for row in rows]))).rowcount
+        first, last = min(row.timestamp for row in rows), max(row.timestamp for row in rows)
+        partition = session.scalar(select(ArchivePartition).where(ArchivePartition.path == path))
+        if partition is None:
+            session.add(ArchivePartition(path=path, first_timestamp=first, last_timestamp=last, transactions=moved[path]))
+        else:
+            partition.first_timestamp = min(partition.first_timestamp, first)
+            partition.last_timestamp = max(partition.last_timestamp, last)
+            partition.transactions += moved[path]
+    session.commit()
+    return moved
+
+def run_archive(before, folder, batch_size=BATCH_SIZE, session=None):
+    """Move transactions timestamped before `before` into yearly partition files under folder.
+
+    Only transactions already folded into the daily balance snapshots are
+    moved, so balances never need the archive, and never the newest
+    transaction, so SQLite does not hand out an archived id again. Each
+    batch is copied out, then deleted and catalogued in one short write
+    transaction; an interrupted run can simply be repeated.
+    """
+    from snapshots import WATERMARK  # snapshots reads through this module
+    session = session or db.session
+    started = time.perf_counter()
+    watermark = session.get(Watermark, WATERMARK)
+    newest = session.scalar(select(func.max(Transaction.id))) or 0
+    through = max(0, min(watermark.last_transaction_id if watermark else 0, newest - 1))
+    report = dict(before=before, through_id=through, archived=0, batches=0, retries=0, partitions={})
+    created = set()
+    after = 0
+    attempt = 0
+    while True:
+        rows = _eligible(session, before, after, through, batch_size)
+        if not rows:
+            break
+        by_path = defaultdict(list)
+        for row in rows:
+            by_path[partition_path(folder, row.timestamp.year)].append(row)
+        try:
+            for path, partition_rows in by_path.items():
+                _copy(path, partition_rows, created)
+            moved = _move(session, by_path)
+        except OperationalError as exc:
+            session.rollback()
+            attempt += 1
+            if attempt >= MAX_ATTEMPTS or not is_retryable(exc):
+                raise
+            report['retries'] += 1
+            time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            continue
+        except Exception:
+            session.rollback()
+            raise
+        attempt = 0
+        for path, count in moved.items():
+            name = os.path.basename(path)
+            report['partitions'][name] = report['partitions'].get(name, 0) + count
+            report['archived'] += count
+        report['batches'] += 1
+        after = rows[-1].id
+    report['seconds'] = round(time.perf_counter() - started, 2)
+    report['rows_per_second'] = round(report['archived'] / report['seconds']) if report['seconds'] else 0
+    return report
@@ -0,0 +1,83 @@
+import functools
+from collections import namedtuple
+from flask import abort, current_app, g, redirect, session, url_for
+from sqlalchemy import select
+from cache import TTLCache
+from models import db, Account, User
+
+IDENTITY_TTL = 300  # seconds; bounds how long another process's account changes go unseen
+IDENTITY_CACHE_SIZE = 10000
+
+# What never changes for a user except through account create/delete
+Identity = namedtuple('Identity', 'id username account_ids account_numbers')
+
+_identities = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_TTL)  # user id -> Identity
+_owners = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_TTL)  # account id -> user id
+
+def login_required(view):
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('main.login'))
+        if identity() is None:
+            # The user was deleted since this session logged in
+            session.pop('user_id', None)
+            return redirect(url_for('main.login'))
+        return view(*args, **kwargs)
+    return wrapped
+
+def admin_required(view):
+    # Operators listed in ADMIN_USERNAMES; anyone else gets a 404, as if the page did not exist
+    @functools.wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if identity().username not in current_app.config['ADMIN_USERNAMES']:
+            abort(404)
+        return view(*args, **kwargs)
+    return wrapped
+
+def current_user():
+    """The logged-in User, loaded at most once per request."""
+    if 'user' not in g:
+        g.user = db.session.get(User, session['user_id']) if 'user_id' in session else None
+    return g.user
+
+def identity(user_id=None):
+    user_id = session.get('user_id') if user_id is None else user_id
+    if user_id is None:
+        return None
+    cached = _identities.get(user_id)
+    if cached is not None:
+        return cached
+    rows = db.session.execute(
+        select(User.username, Account.id, Account.account_number)
+        .outerjoin(Account, Account.user_id == User.id)
+        .where(User.id == user_id)
+        .order_by(Account.id)
+    ).all()
+    if not rows:
+        return None
+    accounts = [(row.id, row.account_number) for row in rows if row.id is not None]
+    cached = Identity(user_id, rows[0].username, tuple(a for a, _ in accounts), tuple(n for _, n in accounts))
+    _identities.set(user_id, cached)
+    for account_id, _ in accounts:
+        _owners.set(account_id, user_id)
+    return cached
+
+def owns_account(account_id, user_id=None):
+    user = identity(user_id)
+    return user is not None and account_id in user.account_ids
+
+def account_owner(account_id):
+    owner = _owners.get(account_id)
+    if owner is None:
+        owner = db.session.scalar(select(Account.user_id).where(Account.id == account_id))
+        if owner is not None:
+            _owners.set(account_id, owner)
+    return owner
+
+def forget_accounts(user_id, *account_ids):
+    # Call after creating or deleting any of user_id's accounts
+    _identities.delete(user_id)
+    for account_id in account_ids:
+        _owners.delete(account_id)
@@ -0,0 +1,127 @@
+"""Archival throughput, and reads across the main table and archive partitions.
+
+Seeds --transactions transactions over 2024, folds them into the balance
+snapshots, and records full history pages, exports and monthly summaries
+for --sample users. Then archives everything before --before and reads the
+same things back, reporting rows/s moved and page latency before and
+after. Fails if any read changed, if the search index loses rows on
+rebuild, or if a page that stays after --before opens a partition.
+
+    python -m benchmarks.archive --users 2000 --transactions 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--transactions', type=int, default=500000)
+    parser.add_argument('--sample', type=int, default=50, help='users whose reads are compared')
+    parser.add_argument('--before', default='2024-10-01', help='archive transactions before this date')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    from sqlalchemy import func, select, text
+    from app import create_app
+    from benchmarks.seed import seed
+    import archive
+    from export import iter_rows
+    from history import decode_cursor, filter_criteria, transaction_page
+    from models import db, Account, Transaction
+    from search import rebuild
+    from snapshots import catch_up, period_summary
+
+    scratch = tempfile.mkdtemp()
+    path = os.path.join(scratch, 'archive.db')
+    seed(path, users=args.users, transactions=args.transactions)
+    app = create_app(dict(SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}", PASSWORD_HASH_WORKERS=0,
+                          CARD_AUTH_LOG=os.path.join(scratch, 'card_auth.log')))
+    before = datetime.strptime(args.before, '%Y-%m-%d')
+    recent = dict(start_date=args.before)
+    months = [(date(2024, month, 1), date(2024, month + 1, 1) if month < 12 else date(2025, 1, 1)) for month in range(1, 13)]
+    ok = True
+
+    def reads(account_ids):
+        # Every page of the full history, the export and monthly summaries
+        pages, cursor, timings = [], None, []
+        while True:
+            started = time.perf_counter()
+            rows, cursor = transaction_page(account_ids, filter_criteria({}), decode_cursor(cursor))
+            timings.append(time.perf_counter() - started)
+            pages.append([(row.id, row.amount, row.account_number) for row in rows])
+            if cursor is None:
+                break
+        exported = [tuple(row) for row in iter_rows(account_ids)]
+        summaries = [period_summary(account_id, start, end - timedelta(days=1))
+                     for account_id in account_ids for start, end in months]
+        return (pages, exported, summaries), timings
+
+    with app.app_context():
+        catch_up()
+        rng = random.Random(0)
+        users = rng.sample(range(1, args.users + 1), min(args.sample, args.users))
+        accounts = {user_id: db.session.scalars(select(Account.id).where(Account.user_id == user_id)).all() for user_id in users}
+        indexed = db.session.scalar(text('SELECT count(*) FROM search_index'))
+
+        expected, hot_timings = {}, []
+        for user_id, account_ids in accounts.items():
+            expected[user_id], timings = reads(account_ids)
+            hot_timings += timings
+
+        report = archive.run_archive(before, os.path.join(scratch, 'partitions'), batch_size=args.batch_size)
+        remaining = db.session.scalar(select(func.count(Transaction.id)))
+        print(f"archived {report['archived']:,} of {args.transactions:,} transactions in {report['seconds']}s "
+              f"({report['rows_per_second']:,} rows/s, {report['batches']} batches, {report['retries']} retries), "
+              f"{remaining:,} left in the main table")
+        for name, count in sorted(report['partitions'].items()):
+            print(f"  {name}: {count:,} rows, {os.path.getsize(os.path.join(scratch, 'partitions', name)) / 1e6:.1f}MB")
+        if report['archived'] == 0 or remaining + report['archived'] != args.transactions:
+            print(f"expected {args.transactions} transactions across both, found {remaining + report['archived']}")
+            ok = False
+
+        cold_timings = []
+        for user_id, account_ids in accounts.items():
+            db.session.remove()
+            found, timings = reads(account_ids)
+            cold_timings += timings
+            for label, old, new in zip(('history', 'export', 'summaries'), expected[user_id], found):
+                if old != new:
+                    print(f"user {user_id}: {label} changed after archiving")
+                    ok = False
+
+        # Recent pages must stay off the archive entirely
+        for engine in archive._engines.values():
+            engine.dispose()
+        archive._engines.clear()
+        recent_timings = []
+        for account_ids in accounts.values():
+            started = time.perf_counter()
+            transaction_page(account_ids, filter_criteria(recent))
+            recent_timings.append(time.perf_counter() - started)
+        if archive._engines:
+            print(f"pages after {args.before} opened {len(archive._engines)} partitions")
+            ok = False
+
+        started = time.perf_counter()
+        reindexed = rebuild()
+        print(f"search index rebuilt with {reindexed:,} rows in {time.perf_counter() - started:.1f}s")
+        if reindexed != indexed:
+            print(f"search index held {indexed} rows before archiving, {reindexed} after rebuild")
+            ok = False
+
+    for label, values in (('all hot', hot_timings), ('archived', cold_timings), ('recent only', recent_timings)):
+        print(f"history page {label:12} p50={percentile(values, 0.50):7.2f}ms  p99={percentile(values, 0.99):7.2f}ms")
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
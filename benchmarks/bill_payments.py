@@ -0,0 +1,134 @@
+"""Throughput and correctness of the bill auto-debit run.
+
+Seeds --bills pending bills, all due, over --accounts accounts (every tenth
+account too poor to cover them all), then pays them with one worker and
+again on a fresh copy with --shards parallel worker processes. Fails if
+money is created or lost, a balance goes negative, paid bills and
+'bill_payment' transactions disagree, or a repeat run pays anything.
+
+    python -m benchmarks.bill_payments --bills 1000000 --shards 4
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+RUN_DATE = date(2025, 1, 31)
+POOR_BALANCE = 2000
+
+def _engine(path):
+    from sqlalchemy import create_engine
+    from database import configure_engine, engine_options
+    url = f"sqlite:///{path}"
+    return configure_engine(create_engine(url, **engine_options(url)))
+
+def _seed(path, bills, accounts, seed=0):
+    import numpy as np
+    from sqlalchemy import BigInteger, bindparam, insert, update
+    from benchmarks.seed import BATCH, seed as seed_database
+    from models import Account, BillPayment
+    seed_database(path, users=accounts // 2, accounts_per_user=2, transactions=0, products=0, seed=seed)
+    engine = _engine(path)
+    rng = np.random.default_rng(seed)
+    with engine.begin() as conn:
+        conn.execute(update(Account).where(Account.id % 10 == 0).values(balance=POOR_BALANCE))
+    table = BillPayment.__table__
+    statement = insert(table).values({table.c.amount: bindparam('paise', type_=BigInteger)})
+    for start in range(0, bills, BATCH):
+        size = min(BATCH, bills - start)
+        account_ids = rng.integers(1, accounts + 1, size)
+        amounts = rng.integers(100, 5000, size) * 100
+        due = rng.integers(0, 31, size)
+        with engine.begin() as conn:
+            conn.execute(statement, [
+                dict(bill_type='electricity', bill_number=f"B{start + n}", paise=int(amount),
+                     due_date=date(2025, 1, 1) + timedelta(days=int(days)), status='pending',
+                     user_id=(int(account_id) - 1) // 2 + 1, account_id=int(account_id))
+                for n, (account_id, amount, days) in enumerate(zip(account_ids, amounts, due))
+            ])
+    engine.dispose()
+
+def _worker(path, shard, top, chunk_size, results):
+    from sqlalchemy.orm import Session
+    from billpay import run_bill_payments
+    engine = _engine(path)
+    with Session(engine) as session:
+        results.put(run_bill_payments(RUN_DATE, shard=shard, chunk_size=chunk_size, session=session, top=top))
+    engine.dispose()
+
+def run(path, shards, chunk_size):
+    from sqlalchemy.orm import Session
+    from billpay import account_top
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    started = time.perf_counter()
+    # Read once here, so every shard splits the same account id range
+    engine = _engine(path)
+    with Session(engine) as session:
+        top = account_top(session)
+    engine.dispose()
+    workers = [context.Process(target=_worker, args=(path, f"{k}/{shards}", top, chunk_size, results)) for k in range(shards)]
+    for worker in workers:
+        worker.start()
+    reports = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return reports, time.perf_counter() - started
+
+def totals(path):
+    conn = sqlite3.connect(path)
+    balance, negative = conn.execute('SELECT SUM(balance), SUM(balance < 0) FROM account').fetchone()
+    paid, paid_amount = conn.execute("SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM bill_payment WHERE status = 'paid'").fetchone()
+    posted, posted_amount = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM \"transaction\" WHERE transaction_type = 'bill_payment'").fetchone()
+    conn.close()
+    return dict(balance=balance, negative=negative, paid=paid, paid_amount=paid_amount, posted=posted,
+                posted_amount=posted_amount)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=1000000)
+    parser.add_argument('--accounts', type=int, default=100000)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp()
+    seeded = os.path.join(scratch, 'seeded.db')
+    started = time.perf_counter()
+    _seed(seeded, args.bills, args.accounts)
+    print(f"seeded {args.bills:,} bills over {args.accounts:,} accounts in {time.perf_counter() - started:.1f}s")
+    before = totals(seeded)
+    ok = True
+    for shards in sorted({1, args.shards}):
+        path = os.path.join(scratch, f"run{shards}.db")
+        shutil.copyfile(seeded, path)
+        reports, elapsed = run(path, shards, args.chunk_size)
+        paid = sum(report['bills_paid'] for report in reports)
+        print(f"{shards} worker(s): {sum(report['bills_due'] for report in reports):,} due, {paid:,} paid, "
+              f"{sum(report['bills_insufficient'] for report in reports):,} insufficient, "
+              f"{sum(report['retries'] for report in reports)} retries in {elapsed:.1f}s  bills/s={args.bills / elapsed:,.0f}")
+        after = totals(path)
+        if after['negative'] or before['balance'] - after['balance'] != after['paid_amount']:
+            print(f"balances do not reconcile: {before['balance']} -> {after['balance']}, {after['paid_amount']} paid, "
+                  f"{after['negative']} negative")
+            ok = False
+        if (after['paid'], after['paid_amount']) != (after['posted'], after['posted_amount']) or after['paid'] != paid:
+            print(f"{after['paid']} bills paid but {after['posted']} bill_payment transactions")
+            ok = False
+        # A repeat of a completed run is skipped and writes nothing
+        again, _ = run(path, shards, args.chunk_size)
+        if not all(report['already_completed'] for report in again) or totals(path) != after:
+            print('repeating the run changed something')
+            ok = False
+    shutil.rmtree(scratch, ignore_errors=True)
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Bulk transfer ingestion throughput.
+
+Writes a payment file of N rows to a scratch directory, applies it with
+bulk_transfers.run_job against a scratch SQLite database and reports rows
+per second. Fails if the posted total does not match the balance moved.
+
+    python -m benchmarks.bulk_transfer --rows 50000 --format csv
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+def write_file(path, file_format, numbers, rows):
+    rng = random.Random(42)
+    with open(path, 'w', newline='') as out:
+        if file_format == 'csv':
+            out.write('to_account,amount\n')
+        for _ in range(rows):
+            to_account, amount = rng.choice(numbers), f"{rng.randint(100, 100000) / 100:.2f}"
+            if file_format == 'csv':
+                out.write(f"{to_account},{amount}\n")
+            else:
+                out.write(json.dumps({'to_account': to_account, 'amount': amount}) + '\n')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp()
+    from sqlalchemy import insert
+    from app import create_app
+    from bulk_transfers import run_job
+    from models import db, User, Account, BulkTransferJob
+
+    numbers = [f"{2000000000 + i}" for i in range(args.accounts)]
+    path = os.path.join(scratch, f"payments.{args.format}")
+    write_file(path, args.format, numbers, args.rows)
+
+    app = create_app(dict(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(scratch, 'banking.db')}"))
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [dict(id=1, username='bench', email='bench@example.com', password_hash='x')])
+        db.session.execute(insert(Account), [dict(id=1, account_number='1000000000', balance=10 ** 9, user_id=1)] + [
+            dict(account_number=number, balance=0, user_id=1) for number in numbers
+        ])
+        job = BulkTransferJob(file_path=path, file_format=args.format, user_id=1, account_id=1)
+        db.session.add(job)
+        db.session.commit()
+
+        started = time.perf_counter()
+        job = run_job(job.id, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - started
+
+        source = db.session.get(Account, 1).balance
+        balanced = source == 10 ** 9 - job.total_amount
+    print(f"rows={job.rows_committed} posted={job.rows_posted} rejected={job.rows_rejected} "
+          f"seconds={elapsed:.2f} rows/s={job.rows_committed / elapsed:,.0f} balanced={'yes' if balanced else 'NO'}")
+    return 0 if balanced and job.status == 'completed' else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
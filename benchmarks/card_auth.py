@@ -0,0 +1,122 @@
+"""Authorizations per second and latency of the in-memory card authorizer.
+
+Seeds --cards credit cards, then has --threads threads authorize, capture
+or release for --seconds while the settler runs, timing every call. Then
+it drops the authorizer without a shutdown, as a crash would, rebuilds one
+from the database plus the log and settles. Fails if the rebuilt
+open-to-buy differs from the live one for any card, or if settled
+balances, card_purchase transactions and captured amounts disagree.
+
+    python -m benchmarks.card_auth --cards 100000 --threads 1,4,16 --seconds 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+def drive(authorizer, cards, threads, seconds, seed=0):
+    from card_auth import Declined
+    latencies = []
+    captured = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        mine, took, holds = [], 0, []
+        clock = time.perf_counter_ns
+        while time.perf_counter() < deadline:
+            for _ in range(100):
+                card_id = rng.randint(1, cards)
+                started = clock()
+                try:
+                    holds.append(authorizer.authorize(card_id, rng.randint(100, 500000)))
+                except Declined:
+                    pass
+                mine.append(clock() - started)
+                if len(holds) > 50:
+                    # Most holds are captured, in full or in part; the rest are released
+                    hold_id = holds.pop(rng.randrange(len(holds)))
+                    if rng.random() < 0.8:
+                        took += authorizer.capture(hold_id)
+                    else:
+                        authorizer.release(hold_id)
+        with lock:
+            latencies.extend(mine)
+            captured[0] += took
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sorted(latencies), time.perf_counter() - started, captured[0]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cards', type=int, default=100000)
+    parser.add_argument('--threads', default='1,4,16')
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args(argv)
+
+    from sqlalchemy import create_engine
+    from benchmarks.seed import seed
+    from card_auth import CardAuthorizer
+    from database import configure_engine, engine_options
+
+    scratch = tempfile.mkdtemp()
+    path, log_path = os.path.join(scratch, 'cards.db'), os.path.join(scratch, 'card_auth.log')
+    seed(path, users=args.cards, accounts_per_user=1, transactions=0, products=1)
+    url = f"sqlite:///{path}"
+    engine = configure_engine(create_engine(url, **engine_options(url)))
+    authorizer = CardAuthorizer(engine, log_path, settle_interval=1.0)
+    started = time.perf_counter()
+    authorizer.open_to_buy(1)
+    print(f"loaded {args.cards:,} cards in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    ok = True
+    total_captured = 0
+    for threads in (int(level) for level in args.threads.split(',')):
+        latencies, elapsed, captured = drive(authorizer, args.cards, threads, args.seconds)
+        total_captured += captured
+        print(f"threads={threads:<3} authorizations/s={len(latencies) / elapsed:>9,.0f}  "
+              f"p50={percentile(latencies, 0.50) / 1000:6.1f}us  p99={percentile(latencies, 0.99) / 1000:6.1f}us  "
+              f"p99.9={percentile(latencies, 0.999) / 1000:7.1f}us  settled so far {authorizer.settled:,}")
+
+    # Crash: the settler stops, nothing is flushed beyond what each call already wrote
+    authorizer._stop.set()
+    authorizer._thread.join()
+    live = {card_id: authorizer.open_to_buy(card_id) for card_id in range(1, args.cards + 1)}
+    authorizer._log.close()
+    started = time.perf_counter()
+    rebuilt = CardAuthorizer(engine, log_path)
+    rebuilt_live = {card_id: rebuilt.open_to_buy(card_id) for card_id in range(1, args.cards + 1)}
+    print(f"rebuilt from database + log in {(time.perf_counter() - started) * 1000:.0f}ms")
+    if rebuilt_live != live:
+        print(f"{sum(live[c] != rebuilt_live[c] for c in live)} cards differ after the rebuild")
+        ok = False
+    rebuilt.stop()
+    conn = sqlite3.connect(path)
+    balances = conn.execute('SELECT SUM(balance) FROM credit_card').fetchone()[0]
+    purchases = conn.execute("SELECT SUM(amount) FROM \"transaction\" WHERE transaction_type = 'card_purchase'").fetchone()[0]
+    settled = conn.execute('SELECT SUM(amount) FROM card_authorization').fetchone()[0]
+    conn.close()
+    print(f"captured {total_captured / 100:,.2f}, settled {settled / 100:,.2f}")
+    if not balances == purchases == settled == total_captured:
+        print(f"settlement mismatch: balances {balances}, transactions {purchases}, authorizations {settled}, "
+              f"captured {total_captured}")
+        ok = False
+    engine.dispose()
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
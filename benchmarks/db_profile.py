@@ -0,0 +1,139 @@
+"""Read/write throughput of the default SQLite engine against the tuned profile.
+
+Seeds a scratch banking database with many transactions, copies it, and
+runs the same mixed workload (history reads plus transfers from several
+threads) on the untouched copy with stock engine settings and on the other
+with database.engine_options() and configure_engine() applied.
+
+    python -m benchmarks.db_profile --rows 2000000 --readers 4 --writers 4 --seconds 10
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+def seed(path, accounts, rows, batch=50000):
+    from sqlalchemy import create_engine, insert
+    from models import db, User, Account, Transaction
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    rng = random.Random(0)
+    start = datetime.now() - timedelta(days=365)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=1, username='bench', email='bench@example.com', password_hash='x')])
+        conn.execute(insert(Account), [
+            dict(id=i, account_number=f"{1000000000 + i}", balance=1000000, user_id=1) for i in range(1, accounts + 1)
+        ])
+    for offset in range(0, rows, batch):
+        with engine.begin() as conn:
+            conn.execute(insert(Transaction), [
+                dict(amount=rng.randint(1, 500), transaction_type='transfer', account_id=rng.randint(1, accounts),
+                     to_account_id=rng.randint(1, accounts), timestamp=start + timedelta(seconds=(offset + i) * 10))
+                for i in range(min(batch, rows - offset))
+            ])
+    engine.dispose()
+
+def workload(engine, accounts, readers, writers, seconds):
+    from sqlalchemy import select
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm import Session
+    from models import Transaction
+    from posting import PostingError, post_transfer
+    counts = dict(reads=0, writes=0, errors=0)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader(n):
+        rng = random.Random(n)
+        done = errors = 0
+        with engine.connect() as conn:
+            while time.perf_counter() < deadline:
+                account_id = rng.randint(1, accounts)
+                try:
+                    conn.execute(
+                        select(Transaction.id, Transaction.amount, Transaction.timestamp)
+                        .where(Transaction.account_id == account_id)
+                        .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+                        .limit(50)
+                    ).all()
+                    conn.rollback()
+                    done += 1
+                except OperationalError:
+                    conn.rollback()
+                    errors += 1
+        with lock:
+            counts['reads'] += done
+            counts['errors'] += errors
+
+    def writer(n):
+        rng = random.Random(1000 + n)
+        done = errors = 0
+        with Session(engine) as session:
+            while time.perf_counter() < deadline:
+                from_id, to_id = rng.sample(range(1, accounts + 1), 2)
+                try:
+                    post_transfer(from_id, to_id, rng.randint(1, 50), session=session)
+                    done += 1
+                except (OperationalError, PostingError):
+                    errors += 1
+        with lock:
+            counts['writes'] += done
+            counts['errors'] += errors
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='existing SQLite banking.db to copy instead of seeding one')
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args(argv)
+
+    from sqlalchemy import create_engine, func, select
+    from database import configure_engine, engine_options
+    from models import Account
+
+    scratch = tempfile.mkdtemp()
+    source = os.path.join(scratch, 'seed.db')
+    if args.database:
+        shutil.copyfile(args.database, source)
+    else:
+        started = time.perf_counter()
+        seed(source, args.accounts, args.rows)
+        print(f"seeded {args.rows:,} transactions in {time.perf_counter() - started:.1f}s")
+    probe = create_engine(f"sqlite:///{source}")
+    with probe.connect() as conn:
+        accounts = conn.execute(select(func.max(Account.id))).scalar()
+    probe.dispose()
+
+    for label in ('default', 'tuned'):
+        path = os.path.join(scratch, f"{label}.db")
+        shutil.copyfile(source, path)
+        url = f"sqlite:///{path}"
+        if label == 'default':
+            engine = create_engine(url)
+        else:
+            engine = configure_engine(create_engine(url, **engine_options(url)))
+        counts = workload(engine, accounts, args.readers, args.writers, args.seconds)
+        engine.dispose()
+        print(f"{label:8} reads/s={counts['reads'] / args.seconds:9.1f} writes/s={counts['writes'] / args.seconds:8.1f} "
+              f"errors={counts['errors']}")
+    shutil.rmtree(scratch, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Time the deposit accrual engine on a large seeded book.
+
+Seeds fixed and recurring deposits with spread-out start dates and terms,
+then times a dry run, a real run and a repeat of the same date. Fails if the
+repeat does anything, if account balances moved by a different amount than
+the run credited, or if sampled maturity amounts differ from a scalar
+reference calculation.
+
+    python -m benchmarks.deposit_accrual --deposits 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+def seed(engine, deposits, accounts):
+    from sqlalchemy import insert
+    from deposits import add_months
+    from models import db, User, Account, FixedDeposit, RecurringDeposit
+    db.metadata.create_all(engine)
+    rng = random.Random(0)
+    today = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=1, username='bench', email='bench@example.com', password_hash='x')])
+        conn.execute(insert(Account), [
+            dict(id=i, account_number=f"{1000000000 + i}", balance=0, user_id=1) for i in range(1, accounts + 1)
+        ])
+    for model, amount_field in ((FixedDeposit, 'amount'), (RecurringDeposit, 'monthly_amount')):
+        count = deposits // 2
+        for offset in range(0, count, 100000):
+            rows = []
+            for _ in range(min(100000, count - offset)):
+                term = rng.choice((6, 12, 24, 36, 60))
+                created = today - timedelta(days=rng.randint(0, 5 * 365))
+                rows.append({amount_field: rng.randint(1000, 500000), 'interest_rate': rng.choice((5.5, 6.5, 7.1)),
+                             'term_months': term, 'created_at': created, 'maturity_date': add_months(created, term),
+                             'user_id': 1, 'account_id': rng.randint(1, accounts)})
+            with engine.begin() as conn:
+                conn.execute(insert(model), rows)
+
+def reference_maturity(kind, amount, rate, term):
+    from decimal import Decimal, ROUND_HALF_EVEN
+    # Scalar restatement of the formulas, for spot checks
+    amount, growth = float(amount), 1 + rate / 400
+    if kind == 'fixed_deposits':
+        value = amount * growth ** (term / 3)
+    else:
+        value = amount * (growth ** (term / 3) - 1) / (1 - growth ** (-1 / 3))
+    return Decimal(str(value)).quantize(Decimal('0.01'), rounding=ROUND_HALF_EVEN)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--deposits', type=int, default=1000000)
+    parser.add_argument('--accounts', type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    from decimal import Decimal
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.orm import Session
+    from database import configure_engine, engine_options
+    from deposits import run_accruals
+    from models import Account, FixedDeposit, RecurringDeposit
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'deposits.db')}"
+    engine = configure_engine(create_engine(url, **engine_options(url)))
+    started = time.perf_counter()
+    seed(engine, args.deposits, args.accounts)
+    print(f"seeded {args.deposits:,} deposits in {time.perf_counter() - started:.1f}s")
+
+    ok = True
+    run_date = date.today()
+    with Session(engine) as session:
+        for label, dry_run in (('dry run', True), ('run', False), ('repeat', False)):
+            started = time.perf_counter()
+            report = run_accruals(run_date, dry_run=dry_run, session=session)
+            elapsed = time.perf_counter() - started
+            if report['already_completed']:
+                print(f"{label:8} {elapsed:6.2f}s  already completed")
+                continue
+            if label == 'repeat':
+                ok = False
+            fixed, recurring = report['fixed_deposits'], report['recurring_deposits']
+            print(f"{label:8} {elapsed:6.2f}s  processed={fixed['processed'] + recurring['processed']:,} "
+                  f"matured={fixed['matured'] + recurring['matured']:,} "
+                  f"credited={fixed['interest_credited'] + recurring['interest_credited']} "
+                  f"deposits/s={(fixed['processed'] + recurring['processed']) / elapsed:,.0f}")
+            if not dry_run:
+                credited = fixed['interest_credited'] + recurring['interest_credited']
+        balances = session.scalar(select(func.sum(Account.balance))) or Decimal('0.00')
+        if balances != credited:
+            print(f"balances moved by {balances}, run credited {credited}")
+            ok = False
+        for kind, model, column in (('fixed_deposits', FixedDeposit, FixedDeposit.amount),
+                                    ('recurring_deposits', RecurringDeposit, RecurringDeposit.monthly_amount)):
+            for row in session.execute(select(column, model.interest_rate, model.term_months, model.maturity_amount).limit(200)):
+                expected = reference_maturity(kind, row[0], row.interest_rate, row.term_months)
+                if abs(expected - row.maturity_amount) > Decimal('0.01'):
+                    print(f"{kind}: maturity {row.maturity_amount} != reference {expected}")
+                    ok = False
+                    break
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Time-to-first-byte, throughput and peak memory of the streaming history export.
+
+Seeds one user holding every transaction, at each requested size, and
+drains export_stream() in each format. Fails if peak Python memory grows
+with the row count, or if the export does not hold every row.
+
+    python -m benchmarks.export --rows 200000,1000000
+"""
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='200000,1000000', help='history sizes, comma separated')
+    args = parser.parse_args(argv)
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from benchmarks.seed import seed
+    from database import configure_engine, engine_options
+    from export import export_stream
+
+    ok = True
+    peaks = []
+    for rows in (int(size) for size in args.rows.split(',')):
+        path = os.path.join(tempfile.mkdtemp(), 'export.db')
+        seed(path, users=1, accounts_per_user=2, transactions=rows, products=0)
+        url = f"sqlite:///{path}"
+        engine = configure_engine(create_engine(url, **engine_options(url)))
+        for file_format, compress in (('csv', False), ('jsonl', False), ('csv', True)):
+            with Session(engine) as session:
+                started = time.perf_counter()
+                first_byte = None
+                size = 0
+                body = []
+                for chunk in export_stream([1, 2], (), file_format, compress, session=session):
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    size += len(chunk)
+                    if compress:
+                        body.append(chunk)
+                elapsed = time.perf_counter() - started
+            if compress:
+                # Compressed output must still decode to every row plus the header
+                lines = gzip.decompress(b''.join(body)).count(b'\n')
+                if lines != rows + 1:
+                    print(f"gzip export has {lines - 1} rows, expected {rows}")
+                    ok = False
+            label = f"{file_format}{'.gz' if compress else ''}"
+            print(f"{rows:>9,} rows {label:6} first byte {first_byte * 1000:7.1f}ms  total {elapsed:6.2f}s  "
+                  f"rows/s={rows / elapsed:,.0f}  {size / 1e6:7.1f}MB")
+        # Separate pass, since tracing slows the export several times over
+        with Session(engine) as session:
+            tracemalloc.start()
+            for chunk in export_stream([1, 2], (), 'csv', False, session=session):
+                pass
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print(f"{rows:>9,} rows peak memory {peaks[-1] / 1e6:.1f}MB")
+        engine.dispose()
+    if peaks[-1] > 2 * peaks[0] + 1e6:
+        print(f"peak memory grew from {peaks[0] / 1e6:.1f}MB to {peaks[-1] / 1e6:.1f}MB")
+        ok = False
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Postings/s and per-posting latency with and without group commit.
+
+Runs the same mix of deposits, withdrawals and transfers from many threads
+against a fresh database, first committing each posting on its own and
+then through a GroupCommitter at each batch window. Withdrawals and
+transfers are sized so some fail for insufficient funds. Fails if the total
+balance does not match the postings that reported success.
+
+    python -m benchmarks.group_commit --threads 32 --seconds 5 --windows 0.5,2,5,10 --synchronous FULL
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+def seed(engine, accounts):
+    from sqlalchemy import insert
+    from models import db, User, Account
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=1, username='bench', email='bench@example.com', password_hash='x')])
+        conn.execute(insert(Account), [
+            dict(id=i, account_number=f"{1000000000 + i}", balance=1000, user_id=1) for i in range(1, accounts + 1)
+        ])
+
+def run(engine, accounts, threads, seconds):
+    from posting import PostingError, post_deposit, post_transfer, post_withdrawal
+    latencies, lock = [], threading.Lock()
+    totals = dict(ok=0, rejected=0, net=0)
+    deadline = time.perf_counter() + seconds
+
+    def worker(n):
+        from sqlalchemy.orm import Session
+        rng = random.Random(n)
+        mine, ok, rejected, net = [], 0, 0, 0
+        # Without group commit each thread posts through its own session
+        session = Session(engine) if not GROUP[0] else None
+        while time.perf_counter() < deadline:
+            kind, amount = rng.choice(('deposit', 'withdraw', 'transfer')), rng.randint(1, 400)
+            started = time.perf_counter()
+            try:
+                if kind == 'deposit':
+                    post_deposit(rng.randint(1, accounts), amount, session=session)
+                    net += amount
+                elif kind == 'withdraw':
+                    post_withdrawal(rng.randint(1, accounts), amount, session=session)
+                    net -= amount
+                else:
+                    from_id, to_id = rng.sample(range(1, accounts + 1), 2)
+                    post_transfer(from_id, to_id, amount, session=session)
+                ok += 1
+            except PostingError:
+                rejected += 1
+            mine.append(time.perf_counter() - started)
+        if session is not None:
+            session.close()
+        with lock:
+            latencies.extend(mine)
+            totals['ok'] += ok
+            totals['rejected'] += rejected
+            totals['net'] += net
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    latencies.sort()
+    return totals, latencies
+
+GROUP = [False]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--windows', default='0.5,2,5,10', help='batch windows in ms, comma separated')
+    parser.add_argument('--max-batch', type=int, default=128)
+    parser.add_argument('--synchronous', default=None, help='SQLite synchronous pragma (FULL makes every commit fsync)')
+    args = parser.parse_args(argv)
+
+    from sqlalchemy import create_engine, func, select
+    from database import configure_engine, engine_options, sqlite_pragmas
+    from group_commit import GroupCommitter
+    from models import Account
+    from posting import use_group_commit
+
+    pragmas = sqlite_pragmas()
+    if args.synchronous:
+        pragmas['synchronous'] = args.synchronous
+    ok = True
+    modes = [('direct', None)] + [(f"{w}ms", float(w)) for w in args.windows.split(',')]
+    for label, window in modes:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'postings.db')}"
+        engine = configure_engine(create_engine(url, **engine_options(url)), pragmas)
+        seed(engine, args.accounts)
+        committer = GroupCommitter(engine, window=window / 1000, max_batch=args.max_batch) if window is not None else None
+        GROUP[0] = committer is not None
+        use_group_commit(committer)
+        try:
+            totals, latencies = run(engine, args.accounts, args.threads, args.seconds)
+        finally:
+            use_group_commit(None)
+            if committer is not None:
+                committer.stop()
+        batch = f" avg batch={committer.postings / max(committer.batches, 1):5.1f}" if committer else ''
+        print(f"{label:7} postings/s={(totals['ok'] + totals['rejected']) / args.seconds:8.0f} "
+              f"p50={latencies[len(latencies) // 2] * 1000:6.1f}ms p99={latencies[int(len(latencies) * 0.99)] * 1000:6.1f}ms "
+              f"rejected={totals['rejected']}{batch}")
+        with engine.connect() as conn:
+            balance = conn.scalar(select(func.sum(Account.balance)))
+        if balance != 1000 * args.accounts + totals['net']:
+            print(f"{label}: balances total {balance}, expected {1000 * args.accounts + totals['net']}")
+            ok = False
+        engine.dispose()
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Drive the app through the Flask test client and report per-route latency as JSON.
+
+Each worker thread logs in as its own seeded user and loops over a weighted
+mix of login, dashboard, transactions, deposit, transfer and statement
+download for --seconds at each concurrency level. The report has requests/s
+overall and count, errors, requests/s and p50/p95/p99 (ms) per route; save
+it with --out and pass it back with --baseline on a later commit to print
+the p95 change per route.
+
+    python -m benchmarks.seed --out /tmp/bench.db --users 1000 --transactions 200000
+    python -m benchmarks.load --database /tmp/bench.db --concurrency 1,4,16 --seconds 10 --out before.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# (route, weight)
+MIX = [('dashboard', 4), ('transactions', 4), ('deposit', 2), ('transfer', 2), ('statement', 1), ('login', 1)]
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else None
+
+def _user_fixtures(path, users):
+    import sqlite3
+    conn = sqlite3.connect(path)
+    fixtures = []
+    for user_id in range(1, users + 1):
+        accounts = [row[0] for row in conn.execute('SELECT id FROM account WHERE user_id = ? ORDER BY id', (user_id,))]
+        statement = conn.execute('SELECT id FROM account_statement WHERE user_id = ? ORDER BY id', (user_id,)).fetchone()
+        fixtures.append(dict(username=f"user{user_id}", accounts=accounts, statement_id=statement[0]))
+    conn.close()
+    return fixtures
+
+def _login(client, fixture, password):
+    return client.post('/login', data=dict(username=fixture['username'], password=password))
+
+def warm_statements(app, fixtures, password, timeout=120):
+    # Downloads are measured once the PDFs exist, not while they render
+    deadline = time.monotonic() + timeout
+    for fixture in fixtures:
+        client = app.test_client()
+        _login(client, fixture, password)
+        while client.get(f"/statement_status/{fixture['statement_id']}").get_json()['status'] != 'ready':
+            if time.monotonic() > deadline:
+                raise RuntimeError('statements did not render in time')
+            time.sleep(0.1)
+
+def run_level(app, fixtures, concurrency, seconds, password, rng_seed=0):
+    samples = {route: [] for route, _ in MIX}
+    errors = {route: 0 for route, _ in MIX}
+    lock = threading.Lock()
+    routes, weights = zip(*MIX)
+    deadline = time.perf_counter() + seconds
+
+    def worker(n):
+        rng = random.Random(rng_seed + n)
+        fixture = fixtures[n]
+        peer = fixtures[(n + 1) % len(fixtures)]
+        client = app.test_client()
+        _login(client, fixture, password)
+        mine = {route: [] for route in routes}
+        failed = {route: 0 for route in routes}
+        while time.perf_counter() < deadline:
+            route = rng.choices(routes, weights)[0]
+            started = time.perf_counter()
+            if route == 'login':
+                client.get('/logout')
+                response, expected = _login(client, fixture, password), 302
+            elif route == 'dashboard':
+                response, expected = client.get('/dashboard'), 200
+            elif route == 'transactions':
+                response, expected = client.get('/transactions?per_page=50'), 200
+            elif route == 'deposit':
+                response, expected = client.post('/deposit', data=dict(account_id=fixture['accounts'][0], amount='1.00')), 302
+            elif route == 'transfer':
+                response, expected = client.post('/transfer', data=dict(
+                    from_account_id=fixture['accounts'][0], to_account_id=peer['accounts'][0], amount='1.00')), 302
+            else:
+                response, expected = client.get(f"/download_statement/{fixture['statement_id']}"), 200
+            response.close()
+            mine[route].append(time.perf_counter() - started)
+            if response.status_code != expected:
+                failed[route] += 1
+        with lock:
+            for route in routes:
+                samples[route].extend(mine[route])
+                errors[route] += failed[route]
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report = dict(concurrency=concurrency, seconds=seconds, routes={})
+    total = 0
+    for route in routes:
+        values = sorted(samples[route])
+        total += len(values)
+        report['routes'][route] = dict(count=len(values), errors=errors[route], rps=round(len(values) / seconds, 1),
+                                       p50=_ms(percentile(values, 0.50)), p95=_ms(percentile(values, 0.95)),
+                                       p99=_ms(percentile(values, 0.99)))
+    report['rps'] = round(total / seconds, 1)
+    return report
+
+def _ms(value):
+    return None if value is None else round(value, 2)
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(report, baseline):
+    # p95 per route and level, as new / old
+    old = {level['concurrency']: level for level in baseline['levels']}
+    for level in report['levels']:
+        before = old.get(level['concurrency'])
+        if before is None:
+            continue
+        for route, stats in level['routes'].items():
+            was = before['routes'].get(route, {}).get('p95')
+            if was and stats['p95']:
+                print(f"c={level['concurrency']:<3} {route:13} p95 {was:8.2f} -> {stats['p95']:8.2f} ms "
+                      f"({stats['p95'] / was:5.2f}x)", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='seeded SQLite file (copied first); seeds a fresh one when omitted')
+    parser.add_argument('--users', type=int, default=200, help='users to seed when no --database is given')
+    parser.add_argument('--transactions', type=int, default=50000, help='transactions to seed when no --database is given')
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--out', help='write the JSON report here as well as to stdout')
+    parser.add_argument('--baseline', help='earlier JSON report to compare p95 against')
+    args = parser.parse_args(argv)
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    import shutil
+    from benchmarks.seed import PASSWORD, seed
+    scratch = tempfile.mkdtemp()
+    path = os.path.join(scratch, 'load.db')
+    if args.database:
+        shutil.copyfile(args.database, path)
+    else:
+        seed(path, users=max(args.users, max(levels) + 1), transactions=args.transactions)
+    from app import create_app
+    app = create_app(dict(SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}", WTF_CSRF_ENABLED=False,
+                          STATEMENT_FOLDER=os.path.join(scratch, 'statements')))
+    os.makedirs(app.config['STATEMENT_FOLDER'], exist_ok=True)
+
+    fixtures = _user_fixtures(path, max(levels) + 1)
+    warm_statements(app, fixtures, PASSWORD)
+    report = dict(commit=_commit(), python=sys.version.split()[0], database=args.database, levels=[])
+    for concurrency in levels:
+        report['levels'].append(run_level(app, fixtures, concurrency, args.seconds, PASSWORD))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, 'w') as handle:
+            handle.write(output + '\n')
+    if args.baseline:
+        with open(args.baseline) as handle:
+            compare(report, json.load(handle))
+    shutil.rmtree(scratch, ignore_errors=True)
+    errors = sum(stats['errors'] for level in report['levels'] for stats in level['routes'].values())
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Login throughput and latency as the password hashing pool grows.
+
+Seeds a scratch SQLite database with users sharing one precomputed hash,
+then drives concurrent logins through the Flask test client for each pool
+size and reports logins/s, p50/p99 latency and how many requests were shed
+with 503.
+
+    python -m benchmarks.login_throughput --workers 1 2 4 --logins 200 --concurrency 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+PASSWORD = 'bench-password'
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+def drive(app, users, logins, concurrency):
+    latencies, shed, failed = [], [], []
+    lock = threading.Lock()
+    counter = iter(range(logins))
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            started = time.perf_counter()
+            response = client.post('/login', data=dict(username=users[n % len(users)], password=PASSWORD))
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.status_code == 503:
+                    shed.append(elapsed)
+                elif response.status_code == 302 and response.headers['Location'].endswith('/dashboard'):
+                    latencies.append(elapsed)
+                else:
+                    failed.append(response.status_code)
+            client.get('/logout')
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, shed, failed, time.perf_counter() - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--max-queue', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    import hashing
+    from app import create_app
+    from models import db, User
+
+    app = create_app(dict(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'banking.db')}",
+                          WTF_CSRF_ENABLED=False))
+    password_hash = hashing._hash(PASSWORD, hashing.HASH_METHOD)
+    users = [f"bench{i}" for i in range(args.users)]
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            dict(username=name, email=f"{name}@example.com", password_hash=password_hash) for name in users
+        ])
+        db.session.commit()
+
+    ok = True
+    for workers in args.workers:
+        hashing.configure(workers=workers, max_queue=args.max_queue)
+        if workers:
+            hashing._get_executor()
+        latencies, shed, failed, elapsed = drive(app, users, args.logins, args.concurrency)
+        ok = ok and not failed
+        print(f"workers={workers:2d} logins/s={len(latencies) / elapsed:7.1f} p50={percentile(latencies, 50) * 1000:7.1f}ms "
+              f"p99={percentile(latencies, 99) * 1000:7.1f}ms shed={len(shed):4d} failed={len(failed)}")
+    hashing.configure(workers=0)
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
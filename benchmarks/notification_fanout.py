@@ -0,0 +1,102 @@
+"""Broadcast a notice to many users while another thread keeps notifying.
+
+Seeds users plus one user with a deep inbox, then times the chunked
+broadcast, the worst latency a concurrent notify() saw while it ran (how
+long the broadcast held the write lock), an inbox page deep in the history,
+and the unread badge. Fails if any user is missing the notice or if any
+unread counter disagrees with a recount.
+
+    python -m benchmarks.notification_fanout --users 1000000 --chunk-size 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+def seed(engine, users, inbox):
+    from sqlalchemy import insert
+    from models import db, User, Notification, NotificationCounter
+    db.metadata.create_all(engine)
+    for offset in range(0, users, 100000):
+        with engine.begin() as conn:
+            conn.execute(insert(User), [
+                dict(id=i, username=f"user{i}", email=f"user{i}@example.com", password_hash='x')
+                for i in range(offset + 1, min(offset + 100000, users) + 1)
+            ])
+    with engine.begin() as conn:
+        conn.execute(insert(Notification), [
+            dict(message=f"notice {i}", is_read=i % 3 == 0, archived=False, user_id=1) for i in range(inbox)
+        ])
+        conn.execute(insert(NotificationCounter), [dict(user_id=1, unread=inbox - (inbox + 2) // 3)])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--inbox', type=int, default=100000, help='notifications already held by user 1')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.orm import Session
+    from database import configure_engine, engine_options
+    from history import decode_cursor
+    from inbox import create_broadcast, inbox_page, notify, run_broadcast, unread_count
+    from models import Notification
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'inbox.db')}"
+    engine = configure_engine(create_engine(url, **engine_options(url)))
+    started = time.perf_counter()
+    seed(engine, args.users, args.inbox)
+    print(f"seeded {args.users:,} users in {time.perf_counter() - started:.1f}s")
+
+    done = threading.Event()
+    latencies = []
+
+    def notifier():
+        with Session(engine) as session:
+            while not done.is_set():
+                started = time.perf_counter()
+                notify(2, 'direct message', session=session)
+                session.commit()
+                latencies.append(time.perf_counter() - started)
+                time.sleep(0.01)
+
+    ok = True
+    with Session(engine) as session:
+        broadcast = create_broadcast('Interest rates change on 1 November', session=session)
+        thread = threading.Thread(target=notifier)
+        thread.start()
+        started = time.perf_counter()
+        broadcast = run_broadcast(broadcast.id, chunk_size=args.chunk_size, session=session)
+        elapsed = time.perf_counter() - started
+        done.set()
+        thread.join()
+        print(f"broadcast {elapsed:6.2f}s  recipients={broadcast.recipients:,} users/s={broadcast.recipients / elapsed:,.0f}")
+        print(f"notify    {len(latencies)} calls during broadcast, median {sorted(latencies)[len(latencies) // 2] * 1000:.0f}ms, worst {max(latencies) * 1000:.0f}ms")
+        if broadcast.recipients != args.users:
+            print(f"broadcast reached {broadcast.recipients} of {args.users} users")
+            ok = False
+
+        cursor = None
+        started = time.perf_counter()
+        for _ in range(20):
+            rows, cursor = inbox_page(1, cursor=decode_cursor(cursor), session=session)
+        print(f"inbox     20 pages in {(time.perf_counter() - started) * 1000:.1f}ms")
+        started = time.perf_counter()
+        for _ in range(1000):
+            unread_count(1, session=session)
+        print(f"badge     {(time.perf_counter() - started) * 1000:.3f}us per lookup")
+
+        for user_id in (1, 2, args.users):
+            expected = session.scalar(select(func.count()).select_from(Notification).where(
+                Notification.user_id == user_id, Notification.is_read == False, Notification.archived == False))
+            if unread_count(user_id, session=session) != expected:
+                print(f"user {user_id}: counter {unread_count(user_id, session=session)}, recount {expected}")
+                ok = False
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Issue account and card numbers from several threads and insert a large cheque book.
+
+Fails on any duplicate number, any card or account number that does not
+pass the Luhn check, or a cheque book whose numbers are not consecutive.
+
+    python -m benchmarks.number_issuance --numbers 100000 --threads 8 --cheques 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--numbers', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--cheques', type=int, default=10000)
+    parser.add_argument('--block-size', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from sqlalchemy import create_engine, func, insert, select
+    from database import configure_engine, engine_options
+    from models import db, User, Account, Cheque
+    import sequences
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'numbers.db')}"
+    engine = configure_engine(create_engine(url, **engine_options(url)))
+    db.metadata.create_all(engine)
+    if args.block_size:
+        sequences.allocator = sequences.BlockAllocator(args.block_size)
+
+    ok = True
+    for name, issue in (('account', sequences.account_number), ('card', sequences.card_number)):
+        issued = [[] for _ in range(args.threads)]
+        per_thread = args.numbers // args.threads
+
+        def worker(n):
+            for _ in range(per_thread):
+                issued[n].append(issue(engine))
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        numbers = [number for batch in issued for number in batch]
+        print(f"{name:8} {len(numbers):,} numbers in {elapsed:.2f}s  numbers/s={len(numbers) / elapsed:,.0f} "
+              f"e.g. {numbers[0]}")
+        if len(set(numbers)) != len(numbers) or not all(sequences.luhn_valid(n) for n in numbers):
+            print(f"{name}: duplicate or invalid numbers")
+            ok = False
+
+    account_number = sequences.account_number(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=1, username='bench', email='bench@example.com', password_hash='x')])
+        conn.execute(insert(Account), [dict(id=1, account_number=account_number, user_id=1)])
+    started = time.perf_counter()
+    numbers = sequences.cheque_numbers(1, account_number, args.cheques, engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Cheque), [
+            dict(cheque_number=number, amount=0, payee='', user_id=1, account_id=1) for number in numbers
+        ])
+    elapsed = time.perf_counter() - started
+    print(f"cheques  {args.cheques:,} in {elapsed:.3f}s")
+    with engine.connect() as conn:
+        stored = conn.scalar(select(func.count()).select_from(Cheque))
+    if stored != args.cheques or numbers[-1] != f"{account_number}-{args.cheques:06d}":
+        print(f"cheque book: {stored} stored, last {numbers[-1]}")
+        ok = False
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Multi-process transfer stress test for the posting service.
+
+Every worker process hammers random transfers between a shared pool of
+accounts. Afterwards the total balance must equal what was seeded and every
+account must be non-negative, otherwise the run fails.
+
+    python -m benchmarks.posting_stress --accounts 100 --transfers 500 --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+OPENING_BALANCE = 1000
+
+def _engine(url):
+    from sqlalchemy import create_engine
+    return create_engine(url, connect_args={'timeout': 60})
+
+def seed(url, accounts):
+    from sqlalchemy import insert
+    from models import db, User, Account
+    engine = _engine(url)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=1, username='bench', email='bench@example.com', password_hash='x')])
+        conn.execute(insert(Account), [
+            dict(id=i, account_number=f"{1000000000 + i}", balance=OPENING_BALANCE, user_id=1)
+            for i in range(1, accounts + 1)
+        ])
+    engine.dispose()
+
+def worker(url, accounts, transfers, seed_value):
+    from sqlalchemy.orm import Session
+    from posting import PostingError, post_transfer
+    rng = random.Random(seed_value)
+    engine = _engine(url)
+    posted = rejected = 0
+    with Session(engine) as session:
+        for _ in range(transfers):
+            from_id, to_id = rng.sample(range(1, accounts + 1), 2)
+            try:
+                post_transfer(from_id, to_id, rng.randint(1, 300), session=session)
+                posted += 1
+            except PostingError:
+                rejected += 1
+    engine.dispose()
+    return posted, rejected
+
+def verify(url, accounts):
+    from sqlalchemy import func, select
+    from models import Account, Transaction
+    engine = _engine(url)
+    with engine.connect() as conn:
+        total = conn.execute(select(func.sum(Account.balance))).scalar()
+        negative = conn.execute(select(func.count()).where(Account.balance < 0)).scalar()
+        posted = conn.execute(select(func.count()).select_from(Transaction)).scalar()
+    engine.dispose()
+    return total == OPENING_BALANCE * accounts and negative == 0, total, posted
+
+def run(url, accounts, transfers, workers):
+    seed(url, accounts)
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(workers) as pool:
+        started = time.perf_counter()
+        results = pool.starmap(worker, [(url, accounts, transfers, n) for n in range(workers)])
+        elapsed = time.perf_counter() - started
+    posted = sum(p for p, _ in results)
+    rejected = sum(r for _, r in results)
+    balanced, total, recorded = verify(url, accounts)
+    return dict(workers=workers, posted=posted, rejected=rejected, recorded=recorded, total=total,
+                balanced=balanced and recorded == posted, seconds=elapsed, tps=posted / elapsed)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='database URL (default: scratch SQLite file)')
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--transfers', type=int, default=500, help='transfers per worker')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args(argv)
+
+    url = args.database or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'posting.db')}"
+    ok = True
+    for workers in args.workers:
+        result = run(url, args.accounts, args.transfers, workers)
+        ok = ok and result['balanced']
+        print(f"workers={result['workers']:2d} posted={result['posted']:6d} rejected={result['rejected']:5d} "
+              f"tps={result['tps']:8.1f} balanced={'yes' if result['balanced'] else 'NO'}")
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
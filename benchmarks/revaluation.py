@@ -0,0 +1,107 @@
+"""Time investment revaluation over a large book against a generated price file.
+
+Seeds holdings spread over many instruments (plus legacy rows priced by
+type), writes a CSV price file, and times a dry run, a real run and a repeat
+with the same file. Fails if the repeat changes anything, if the audit rows
+disagree with the run totals, or if sampled values differ from units * price.
+
+    python -m benchmarks.revaluation --holdings 1000000 --instruments 5000
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+def seed(engine, holdings, instruments, accounts=1000):
+    from sqlalchemy import insert
+    from models import db, User, Account, Investment
+    db.metadata.create_all(engine)
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=1, username='bench', email='bench@example.com', password_hash='x')])
+        conn.execute(insert(Account), [
+            dict(id=i, account_number=f"{1000000000 + i}", balance=0, user_id=1) for i in range(1, accounts + 1)
+        ])
+    for offset in range(0, holdings, 100000):
+        rows = []
+        for _ in range(min(100000, holdings - offset)):
+            amount = rng.randint(1000, 100000)
+            kind = rng.choice(('mutual_fund', 'stock', 'bond'))
+            # One in ten is a legacy holding with no instrument or units
+            instrument = None if rng.random() < 0.1 else f"INS{rng.randrange(instruments):06d}"
+            rows.append(dict(type=kind, instrument=instrument, units=amount / 10.0 if instrument else None,
+                             amount=amount, current_value=amount, returns=0, user_id=1,
+                             account_id=rng.randint(1, accounts)))
+        with engine.begin() as conn:
+            conn.execute(insert(Investment), rows)
+
+def write_prices(path, instruments):
+    rng = random.Random(1)
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['instrument', 'price'])
+        for kind in ('mutual_fund', 'stock', 'bond'):
+            writer.writerow([kind, round(rng.uniform(0.9, 1.2), 4)])
+        # Leave a few instruments unpriced
+        for i in range(instruments - instruments // 100):
+            writer.writerow([f"INS{i:06d}", round(rng.uniform(5, 20), 4)])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--holdings', type=int, default=1000000)
+    parser.add_argument('--instruments', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    from decimal import Decimal
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.orm import Session
+    from database import configure_engine, engine_options
+    from models import InstrumentPrice, Investment, RevaluationChange
+    from revaluation import run_revaluation
+
+    scratch = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(scratch, 'revaluation.db')}"
+    engine = configure_engine(create_engine(url, **engine_options(url)))
+    started = time.perf_counter()
+    seed(engine, args.holdings, args.instruments)
+    print(f"seeded {args.holdings:,} holdings in {time.perf_counter() - started:.1f}s")
+    price_file = os.path.join(scratch, 'prices.csv')
+    write_prices(price_file, args.instruments)
+
+    ok = True
+    with Session(engine) as session:
+        for label, dry_run in (('dry run', True), ('run', False), ('repeat', False)):
+            started = time.perf_counter()
+            report = run_revaluation(price_file, dry_run=dry_run, session=session)
+            elapsed = time.perf_counter() - started
+            print(f"{label:8} {elapsed:6.2f}s  changed={report['changed']:,} unpriced={report['unpriced']:,} "
+                  f"value {report['value_before']} -> {report['value_after']} "
+                  f"holdings/s={report['processed'] / elapsed:,.0f}")
+            if label == 'run':
+                run_id, changed = report['run_id'], report['changed']
+            if label == 'repeat' and report['changed']:
+                ok = False
+        audited = session.scalar(select(func.count()).select_from(RevaluationChange).where(RevaluationChange.run_id == run_id))
+        if audited != changed:
+            print(f"audit has {audited} changes, run reported {changed}")
+            ok = False
+        prices = dict(session.execute(select(InstrumentPrice.instrument, InstrumentPrice.price)).all())
+        for row in session.execute(select(Investment).limit(500)).scalars():
+            price = prices.get(row.instrument or row.type)
+            if price is None:
+                continue
+            # The run gave legacy holdings units at this price
+            units = row.units
+            expected = Decimal(str(round(units * price, 2)))
+            if abs(expected - row.current_value) > Decimal('0.01') or row.returns != row.current_value - row.amount:
+                print(f"investment {row.id}: {row.current_value} != {units} * {price}")
+                ok = False
+                break
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
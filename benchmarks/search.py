@@ -0,0 +1,102 @@
+"""Latency of full-text search against a LIKE scan, on a seeded database.
+
+Seeds --users users with --transactions transactions (the search index is
+filled by its triggers as the rows go in), then runs token, prefix and
+kind-filtered queries for random users and reports p50/p99 per query
+shape, next to the LIKE '%...%' scan over transaction account numbers it
+replaces. Fails if any result belongs to another user or a query misses
+the row it was built from.
+
+    python -m benchmarks.search --users 10000 --transactions 10000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='already seeded SQLite file to search instead of seeding one')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=500, help='queries per shape')
+    args = parser.parse_args(argv)
+
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+    from benchmarks.seed import seed
+    from database import configure_engine, engine_options
+    from search import search
+
+    path = args.database
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), 'search.db')
+        started = time.perf_counter()
+        seed(path, users=args.users, transactions=args.transactions)
+        print(f"seeded and indexed {args.transactions:,} transactions in {time.perf_counter() - started:.1f}s")
+    url = f"sqlite:///{path}"
+    engine = configure_engine(create_engine(url, **engine_options(url)))
+    rng = random.Random(0)
+    ok = True
+    with Session(engine) as session:
+        users = session.scalar(text('SELECT MAX(id) FROM user'))
+        owners = {kind: dict(session.execute(text(sql)).all()) for kind, sql in (
+            ('account', 'SELECT id, user_id FROM account'),
+            ('bill', 'SELECT id, user_id FROM bill_payment'),
+            ('cheque', 'SELECT id, user_id FROM cheque'),
+        )}
+
+        def user_of(result):
+            if result['kind'] == 'transaction':
+                row = session.execute(text(
+                    'SELECT a.user_id, t.user_id FROM "transaction" AS x JOIN account AS a ON a.id = x.account_id '
+                    'LEFT JOIN account AS t ON t.id = x.to_account_id WHERE x.id = :id'), dict(id=result['id'])).one()
+                return set(row)
+            return {owners[result['kind']][result['id']]}
+
+        def shapes(user_id):
+            # (shape, query, kind, expected text or None)
+            bill = session.execute(text('SELECT bill_number FROM bill_payment WHERE user_id = :u LIMIT 1'), dict(u=user_id)).scalar()
+            cheque = session.execute(text('SELECT cheque_number FROM cheque WHERE user_id = :u LIMIT 1'), dict(u=user_id)).scalar()
+            account = session.execute(text('SELECT account_number FROM account WHERE user_id = :u LIMIT 1'), dict(u=user_id)).scalar()
+            return [
+                ('token', 'deposit', None, None),
+                ('account prefix', account[:8], 'account', account),
+                ('bill number', bill, 'bill', bill),
+                ('cheque number', cheque, None, cheque),
+                ('two words', 'transfer ' + account[:6], 'transaction', None),
+            ]
+
+        timings = {}
+        for _ in range(args.queries):
+            user_id = rng.randint(1, users)
+            for shape, query, kind, expected in shapes(user_id):
+                started = time.perf_counter()
+                results = search(user_id, query, kind=kind, session=session)
+                timings.setdefault(shape, []).append(time.perf_counter() - started)
+                for result in results:
+                    if user_id not in user_of(result):
+                        print(f"{shape} {query!r} for user {user_id} returned {result}")
+                        ok = False
+                if expected and not any(expected in result['text'] for result in results):
+                    print(f"{shape} {query!r} for user {user_id} missed {expected}")
+                    ok = False
+        for shape, values in timings.items():
+            print(f"{shape:15} p50={percentile(values, 0.50):7.2f}ms  p99={percentile(values, 0.99):7.2f}ms")
+        # What a substring match on account numbers costs without the index
+        started = time.perf_counter()
+        session.execute(text('SELECT t.id FROM "transaction" AS t JOIN account AS a ON a.id = t.account_id '
+                             'WHERE a.account_number LIKE :q'), dict(q='%00001234%')).all()
+        print(f"LIKE scan       {(time.perf_counter() - started) * 1000:7.2f}ms")
+    engine.dispose()
+    print('ok' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Bulk-load a deterministic banking database into a scratch SQLite file.
+
+The same arguments always produce the same rows, apart from the password
+hash's salt: users user1..userN (all with password PASSWORD), their
+accounts, M transactions spread over a year, and a few rows per user in
+every product table. Balances start high enough for deposits and transfers
+to keep succeeding under load.
+
+    python -m benchmarks.seed --users 10000 --transactions 1000000 --out /tmp/bench.db
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+PASSWORD = 'bench-password'
+BASE = datetime(2024, 1, 1)
+BATCH = 50000
+OPENING_BALANCE = 1000000
+
+def _batches(rows, size=BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def seed(path, users=1000, accounts_per_user=2, transactions=100000, products=2, seed=0):
+    """Create path and fill it; returns the row counts per table."""
+    from sqlalchemy import create_engine, insert
+    from werkzeug.security import generate_password_hash
+    from database import configure_engine, engine_options
+    from hashing import HASH_METHOD
+    import search  # Registers the full-text index and its triggers with create_all
+    from models import (db, User, Account, Transaction, Loan, CreditCard, Notification, NotificationCounter,
+                        FixedDeposit, RecurringDeposit, BillPayment, Insurance, Investment, Cheque, AccountStatement)
+
+    if os.path.exists(path):
+        os.remove(path)
+    url = f"sqlite:///{path}"
+    engine = configure_engine(create_engine(url, **engine_options(url)))
+    db.metadata.create_all(engine)
+    rng = random.Random(seed)
+    # One real hash shared by every user; hashing each would dominate the seed time
+    password_hash = generate_password_hash(PASSWORD, method=HASH_METHOD)
+    accounts = users * accounts_per_user
+
+    def owned(u, n):
+        return dict(user_id=u, account_id=(u - 1) * accounts_per_user + 1 + n % accounts_per_user)
+
+    def day(offset):
+        return BASE + timedelta(days=offset)
+
+    tables = [
+        (User, (dict(id=u, username=f"user{u}", email=f"user{u}@example.com", password_hash=password_hash)
+                for u in range(1, users + 1))),
+        (NotificationCounter, (dict(user_id=u, unread=products) for u in range(1, users + 1))),
+        (Account, (dict(id=a, account_number=f"9{a:011d}", balance=OPENING_BALANCE, user_id=(a - 1) // accounts_per_user + 1)
+                   for a in range(1, accounts + 1))),
+        (Transaction, (dict(amount=rng.randint(1, 5000), transaction_type=kind,
+                            timestamp=BASE + timedelta(seconds=rng.randrange(365 * 86400)),
+                            account_id=rng.randint(1, accounts),
+                            to_account_id=rng.randint(1, accounts) if kind == 'transfer' else None)
+                       for kind in (rng.choice(('deposit', 'withdraw', 'transfer')) for _ in range(transactions)))),
+        (Loan, (dict(amount=rng.randint(10, 500) * 1000, interest_rate=8.5, term_months=rng.choice((12, 24, 60)),
+                     status=rng.choice(('pending', 'approved')), created_at=day(rng.randrange(365)), **owned(u, n))
+                for u in range(1, users + 1) for n in range(products))),
+        (CreditCard, (dict(card_number=f"4{(u - 1) * products + n:015d}", expiry_date='01/30', cvv='123',
+                           limit=50000, **owned(u, n))
+                      for u in range(1, users + 1) for n in range(products))),
+        (Notification, (dict(message=f"Welcome notice {n}", is_read=False, archived=False, user_id=u,
+                             created_at=day(rng.randrange(365)))
+                        for u in range(1, users + 1) for n in range(products))),
+        (FixedDeposit, (dict(amount=rng.randint(1, 100) * 1000, term_months=12, created_at=day(o),
+                             maturity_date=day(o + 365), **owned(u, n))
+                        for u in range(1, users + 1) for n in range(products) for o in (rng.randrange(365),))),
+        (RecurringDeposit, (dict(monthly_amount=rng.randint(1, 20) * 500, term_months=24, created_at=day(o),
+                                 maturity_date=day(o + 730), **owned(u, n))
+                            for u in range(1, users + 1) for n in range(products) for o in (rng.randrange(365),))),
+        (BillPayment, (dict(bill_type=rng.choice(('electricity', 'water', 'phone')), bill_number=f"B{u}-{n}",
+                            amount=rng.randint(100, 5000), due_date=date(2024, 12, 1) + timedelta(days=n), **owned(u, n))
+                       for u in range(1, users + 1) for n in range(products))),
+        (Insurance, (dict(type=rng.choice(('life', 'health', 'vehicle')), coverage_amount=500000, premium_amount=500,
+                          term_years=10, **owned(u, n))
+                     for u in range(1, users + 1) for n in range(products))),
+        (Investment, (dict(type=rng.choice(('mutual_fund', 'stock', 'bond')), amount=10000, current_value=10000,
+                           returns=0, **owned(u, n))
+                      for u in range(1, users + 1) for n in range(products))),
+        (Cheque, (dict(cheque_number=f"{u}-{n:06d}", amount=0, payee='', **owned(u, n))
+                  for u in range(1, users + 1) for n in range(products))),
+        (AccountStatement, (dict(start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), file_path='', **owned(u, 0))
+                            for u in range(1, users + 1))),
+    ]
+    counts = {}
+    for model, rows in tables:
+        counts[model.__tablename__] = 0
+        for batch in _batches(rows):
+            with engine.begin() as conn:
+                conn.execute(insert(model), batch)
+            counts[model.__tablename__] += len(batch)
+    engine.dispose()
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', required=True, help='SQLite file to create (replaced if it exists)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--accounts-per-user', type=int, default=2)
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--products', type=int, default=2, help='rows per user in each product table')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    counts = seed(args.out, args.users, args.accounts_per_user, args.transactions, args.products, args.seed)
+    print(json.dumps(dict(path=args.out, seconds=round(time.perf_counter() - started, 2), rows=counts), indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Statement PDF rendering throughput.
+
+Seeds a scratch SQLite database with one account per statement size, then
+renders --count statements of each size through a process pool and reports
+PDFs per second.
+
+    python -m benchmarks.statement_pdf --lines 1000 50000 --count 8 --workers 2
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+def seed(url, sizes, count):
+    from sqlalchemy import create_engine, insert
+    from models import db, User, Account, Transaction, AccountStatement
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    statements = {}
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=1, username='bench', email='bench@example.com', password_hash='x')])
+        conn.execute(insert(Account), [dict(id=0, account_number='1999999999', balance=0, user_id=1)])
+        start = datetime(2024, 1, 1)
+        for account_id, lines in enumerate(sizes, 1):
+            conn.execute(insert(Account), [dict(id=account_id, account_number=f"{1000000000 + account_id}", balance=0, user_id=1)])
+            step = timedelta(days=365) / lines
+            conn.execute(insert(Transaction), [
+                dict(amount=100 + i % 500, transaction_type=('deposit', 'withdraw', 'transfer')[i % 3],
+                     timestamp=start + step * i, account_id=account_id, to_account_id=0 if i % 3 == 2 else None)
+                for i in range(lines)
+            ])
+            result = conn.execute(insert(AccountStatement).returning(AccountStatement.id), [
+                dict(start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), file_path='', user_id=1,
+                     account_id=account_id, created_at=datetime.now())
+                for _ in range(count)
+            ])
+            statements[lines] = [row.id for row in result]
+    engine.dispose()
+    return statements
+
+def _warm(_):
+    import statements  # noqa: F401
+    return os.getpid()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[1000, 50000])
+    parser.add_argument('--count', type=int, default=8, help='statements rendered per size')
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args(argv)
+
+    from statements import render_statement, statement_path
+    scratch = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(scratch, 'banking.db')}"
+    statements = seed(url, args.lines, args.count)
+
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx) as pool:
+        # Warm the workers so import time isn't billed to the first size
+        list(pool.map(_warm, range(args.workers)))
+        for lines, ids in statements.items():
+            started = time.perf_counter()
+            paths = list(pool.map(render_statement, [url] * len(ids), ids, [statement_path(scratch, i) for i in ids], [None] * len(ids)))
+            elapsed = time.perf_counter() - started
+            size = os.path.getsize(paths[0])
+            print(f"lines={lines:6d} pdfs={len(ids)} workers={args.workers} seconds={elapsed:.2f} "
+                  f"pdfs/s={len(ids) / elapsed:.2f} bytes={size}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import time
+from datetime import date
+from decimal import Decimal
+import numpy as np
+from sqlalchemy import BigInteger, String, bindparam, func, insert, select, tuple_, type_coerce, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from models import db, utcnow, Account, BillPayment, BillPaymentRun, Transaction
+from posting import MAX_ATTEMPTS, RETRY_BACKOFF, is_retryable
+
+CHUNK_SIZE = 50000  # Due bills loaded, funded and written per database transaction
+IN_BATCH = 10000  # Account ids per balance lookup
+OPEN_END = 2 ** 63 - 1  # Upper bound of the last shard's account id range
+
+class ChunkConflict(Exception):
+    # A balance or bill changed between loading a chunk and writing it
+    pass
+
+def parse_shard(shard):
+    # 'k/n' -> (k, n), the k-th (0-based) of n account id ranges
+    k, n = (int(part) for part in shard.split('/'))
+    if n < 1 or not 0 <= k < n:
+        raise ValueError(f"Bad shard {shard!r}, expected k/n with 0 <= k < n")
+    return k, n
+
+def account_top(session):
+    # Highest account id; read once by whoever starts the shards and given to each
+    return session.scalar(select(func.max(Account.id))) or 0
+
+def shard_range(shard, top):
+    # 1..top split into n contiguous account id ranges, so parallel workers never
+    # share an account. Workers given different tops would overlap or leave gaps.
+    # The last range is open-ended, for accounts opened since top was read
+    k, n = parse_shard(shard)
+    return top * k // n + 1, top * (k + 1) // n if k < n - 1 else OPEN_END
+
+def _load(session, run_date, account_range, after, chunk_size):
+    # Pending bills due by run_date in (due_date, id) order, walking ix_bill_payment_status_due_date
+    table = BillPayment.__table__
+    rows = session.execute(
+        select(table.c.id, table.c.account_id, table.c.user_id, type_coerce(table.c.amount, BigInteger),
+               func.date(table.c.due_date, type_=String))
+        .where(table.c.status == 'pending', table.c.due_date <= run_date,
+               table.c.account_id.between(*account_range),
+               tuple_(table.c.due_date, table.c.id) > tuple_(*after))
+        .order_by(table.c.due_date, table.c.id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        return None
+    ids, account_ids, user_ids, amounts, due = zip(*rows)
+    return dict(id=np.array(ids, dtype=np.int64), account_id=np.array(account_ids, dtype=np.int64),
+                user_id=np.array(user_ids, dtype=np.int64),
+                amount=np.array(amounts, dtype=np.int64), due=np.array(due, dtype='datetime64[D]'))
+
+def _balances(session, accounts):
+    # {account_id: paise} for the sorted unique accounts, IN_BATCH at a time
+    balance = type_coerce(Account.balance, BigInteger)
+    found = {}
+    for start in range(0, len(accounts), IN_BATCH):
+        batch = [int(a) for a in accounts[start:start + IN_BATCH]]
+        found.update(session.execute(select(Account.id, balance).where(Account.id.in_(batch))).all())
+    return np.array([found.get(int(a), 0) or 0 for a in accounts], dtype=np.int64)
+
+def _fund(chunk, accounts, balances):
+    """Which bills in the chunk each account can cover, oldest due first.
+
+    Bills are grouped by account and paid in due date order while the
+    running total stays within the balance; the first bill that does not
+    fit, and every later one for that account, waits for another run.
+    A negative balance blocks the account outright.
+    """
+    order = np.lexsort((chunk['id'], chunk['due'], chunk['account_id']))
+    account_ids, amounts = chunk['account_id'][order], chunk['amount'][order]
+    group = np.searchsorted(accounts, account_ids)
+    running = np.cumsum(amounts)
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    running -= np.repeat(running[starts] - amounts[starts], np.diff(np.r_[starts, len(group)]))
+    paid = np.zeros(len(order), dtype=bool)
+    paid[order] = running <= balances[group]
+    totals = np.bincount(np.searchsorted(accounts, chunk['account_id'][paid]),
+                         weights=chunk['amount'][paid], minlength=len(accounts)).astype(np.int64)
+    return paid, totals
+
+def _write(session, chunk, paid, accounts, totals, paid_at):
+    debited = totals > 0
+    table = Account.__table__
+    balance = type_coerce(table.c.balance, BigInteger)
+    rows = [dict(debit_account_id=int(a), debit_paise=int(t)) for a, t in zip(accounts[debited], totals[debited])]
+    # One guarded debit per account, like posting.debit, however many of its bills are due
+    updated = session.execute(
+        update(table)
+        .where(table.c.id == bindparam('debit_account_id'), balance >= bindparam('debit_paise', type_=BigInteger))
+        .values({table.c.balance: balance - bindparam('debit_paise', type_=BigInteger)}),
+        rows,
+    ).rowcount
+    if updated != len(rows):
+        raise ChunkConflict(f"expected to debit {len(rows)} accounts, debited {updated}")
+    bills = BillPayment.__table__
+    ids = chunk['id'][paid]
+    updated = session.execute(
+        update(bills)
+        .where(bills.c.id == bindparam('bill_id'), bills.c.status == 'pending')
+        .values(status='paid', paid_at=paid_at),
+        [dict(bill_id=int(i)) for i in ids],
+    ).rowcount
+    if updated != len(ids):
+        raise ChunkConflict(f"expected {len(ids)} pending bills, updated {updated}")
+    transactions = Transaction.__table__
+    session.execute(
+        insert(transactions).values({transactions.c.amount: bindparam('paise', type_=BigInteger),
+                                     transactions.c.transaction_type: 'bill_payment',
+                                     transactions.c.timestamp: paid_at,
+                                     transactions.c.account_id: bindparam('bill_account_id')}),
+        [dict(paise=int(p), bill_account_id=int(a)) for p, a in zip(chunk['amount'][paid], chunk['account_id'][paid])],
+    )
+
+def _start(session, run_date, shard):
+    run = session.scalar(select(BillPaymentRun).where(BillPaymentRun.run_date == run_date,
+                                                      BillPaymentRun.shard == shard))
+    if run is None:
+        run = BillPaymentRun(run_date=run_date, shard=shard, bills_due=0, bills_paid=0, bills_insufficient=0,
+                             accounts_debited=0, amount_paid=0)
+        session.add(run)
+        try:
+            session.commit()
+        except IntegrityError:
+            # Another worker started the same shard first; the guarded writes keep the two apart
+            session.rollback()
+            return _start(session, run_date, shard)
+    return run
+
+def run_bill_payments(run_date, shard='0/1', dry_run=False, chunk_size=CHUNK_SIZE, session=None, invalidate=None, top=None):
+    """Auto-debit every pending bill due on or before run_date.
+
+    Bills are paid from their linked account with one 'bill_payment'
+    transaction each; bills the balance cannot cover stay pending and are
+    counted as insufficient. Each chunk's debits, bill updates and progress
+    commit together and only pending bills are ever marked paid, so an
+    interrupted run can be repeated, and a (date, shard) that already
+    completed is not run again. shard 'k/n' restricts the run to the k-th
+    of n ranges of account ids up to top, for parallel workers; every
+    worker must be given the same top. With dry_run nothing is
+    written. invalidate, if given, is called with the owners of the bills
+    each chunk paid.
+    """
+    session = session or db.session
+    started = time.perf_counter()
+    report = dict(run_date=run_date, shard=shard, dry_run=dry_run, already_completed=False, bills_due=0,
+                  bills_paid=0, bills_insufficient=0, accounts_debited=0, amount_paid=Decimal('0.00'), chunks=0,
+                  retries=0)
+    if top is None:
+        if parse_shard(shard)[1] > 1:
+            raise ValueError('Sharded runs need top, read once with account_top() and given to every shard')
+        top = account_top(session)
+    account_range = shard_range(shard, top)
+    run = None
+    if not dry_run:
+        run = _start(session, run_date, shard)
+        if run.status == 'completed':
+            report['already_completed'] = True
+            return report
+    after = (date.min, 0)
+    short = np.array([], dtype=np.int64)
+    attempt = 0
+    while True:
+        chunk = _load(session, run_date, account_range, after, chunk_size)
+        if chunk is None:
+            break
+        accounts = np.unique(chunk['account_id'])
+        balances = _balances(session, accounts)
+        # An account already short on an earlier chunk's bill pays none of its later ones
+        balances[np.isin(accounts, short)] = -1
+        paid, totals = _fund(chunk, accounts, balances)
+        counts = dict(bills_due=len(chunk['id']), bills_paid=int(paid.sum()),
+                      bills_insufficient=int((~paid).sum()), accounts_debited=int((totals > 0).sum()),
+                      amount_paid=Decimal(int(totals.sum())).scaleb(-2))
+        if not dry_run:
+            try:
+                _write(session, chunk, paid, accounts, totals, utcnow())
+                for key, value in counts.items():
+                    setattr(run, key, getattr(run, key) + value)
+                session.commit()
+            except (ChunkConflict, OperationalError) as exc:
+                session.rollback()
+                attempt += 1
+                if attempt >= MAX_ATTEMPTS or (isinstance(exc, OperationalError) and not is_retryable(exc)):
+                    raise
+                # Reload the same chunk; what is already paid is no longer pending
+                report['retries'] += 1
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+                continue
+            except Exception:
+                session.rollback()
+                raise
+            if invalidate is not None:
+                invalidate(*np.unique(chunk['user_id'][paid]).tolist())
+        attempt = 0
+        short = np.union1d(short, chunk['account_id'][~paid])
+        after = (chunk['due'][-1].astype(object), int(chunk['id'][-1]))
+        report['chunks'] += 1
+        for key, value in counts.items():
+            report[key] += value
+    if not dry_run:
+        run.status = 'completed'
+        run.completed_at = utcnow()
+        session.commit()
+    report['seconds'] = round(time.perf_counter() - started, 2)
+    report['bills_per_second'] = round(report['bills_due'] / report['seconds']) if report['seconds'] else None
+    return report
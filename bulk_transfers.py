@@ -0,0 +1,234 @@
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import bindparam, insert, or_, select, update
+from sqlalchemy.exc import OperationalError
+from models import db, utcnow, Account, Transaction, BulkTransferJob, BulkTransferRow
+from posting import InsufficientFunds, MAX_ATTEMPTS, PostingError, RETRY_BACKOFF, debit, is_retryable
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000  # Rows applied per database transaction
+WORKERS = 1  # Background threads running jobs in each web process
+LEASE = timedelta(minutes=5)  # A running job that commits no chunk for this long is presumed abandoned
+FORMATS = ('csv', 'jsonl')
+REPORT_FIELDS = ('line', 'to_account_number', 'amount', 'status', 'message')
+
+# Destination credits are applied per account with one executemany
+_credit_many = (
+    Account.__table__.update()
+    .where(Account.__table__.c.id == bindparam('credit_account_id'))
+    .values(balance=Account.__table__.c.balance + bindparam('credit_amount'))
+)
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+def iter_records(path, file_format):
+    # Stream the file a row at a time; it is never loaded whole
+    with open(path, 'rb') as raw:
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        if file_format == 'jsonl':
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield record if isinstance(record, dict) else None
+        else:
+            yield from csv.DictReader(stream)
+
+def _parse(record):
+    # -> (to_account_number, amount, error)
+    if record is None:
+        return None, None, 'Malformed row'
+    to_account = str(record.get('to_account') or '').strip()
+    if not to_account:
+        return None, None, 'Missing to_account'
+    try:
+        amount = Decimal(str(record.get('amount')).strip())
+    except (InvalidOperation, ValueError):
+        return to_account, None, 'Invalid amount'
+    if not amount.is_finite() or amount <= 0 or amount != amount.quantize(Decimal('0.01')):
+        return to_account, None, 'Invalid amount'
+    return to_account, amount, None
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _apply_chunk(job, first_line, parsed):
+    numbers = {to_account for to_account, _, error in parsed if not error}
+    account_ids = dict(db.session.execute(
+        select(Account.account_number, Account.id).where(Account.account_number.in_(numbers))
+    ).all()) if numbers else {}
+    available = db.session.scalar(select(Account.balance).where(Account.id == job.account_id, Account.user_id == job.user_id))
+    if available is None:
+        raise PostingError('Invalid account')
+
+    results, transactions = [], []
+    credits = defaultdict(Decimal)
+    for offset, (to_account, amount, error) in enumerate(parsed):
+        to_account_id = account_ids.get(to_account)
+        if not error and to_account_id is None:
+            error = 'Unknown account'
+        elif not error and to_account_id == job.account_id:
+            error = 'Cannot transfer to the same account'
+        elif not error and amount > available:
+            error = 'Insufficient funds'
+        results.append(dict(
+            job_id=job.id, line=first_line + offset, to_account_number=to_account and to_account[:20],
+            amount=amount, status='rejected' if error else 'posted', message=error,
+        ))
+        if error:
+            continue
+        available -= amount
+        credits[to_account_id] += amount
+        transactions.append(dict(amount=amount, transaction_type='transfer', account_id=job.account_id, to_account_id=to_account_id))
+
+    total = sum((t['amount'] for t in transactions), Decimal('0'))
+    if transactions:
+        # One conditional debit for the whole chunk; if the source balance
+        # moved since it was read, or the account is no longer the job
+        # owner's, this fails
+        debit(db.session, job.account_id, total, job.user_id)
+        db.session.execute(_credit_many, [
+            dict(credit_account_id=account_id, credit_amount=amount) for account_id, amount in sorted(credits.items())
+        ])
+        db.session.execute(insert(Transaction), transactions)
+    db.session.execute(insert(BulkTransferRow), results)
+    job.rows_committed += len(parsed)
+    job.rows_posted += len(transactions)
+    job.rows_rejected += len(parsed) - len(transactions)
+    job.total_amount += total
+    db.session.commit()
+
+def claim_job(job_id):
+    """Mark job_id running; False if it is completed or another worker is running it."""
+    now = utcnow()
+    table = BulkTransferJob.__table__
+    # Every chunk commit moves updated_at, so only a job whose worker died stays idle past its lease
+    claimed = db.session.execute(
+        update(table)
+        .where(table.c.id == job_id, table.c.status != 'completed',
+               or_(table.c.status != 'running', table.c.updated_at <= now - LEASE))
+        .values(status='running', updated_at=now)
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+def run_job(job_id, chunk_size=CHUNK_SIZE, claimed=False):
+    """Apply a bulk transfer file, resuming after the last committed chunk.
+
+    Each chunk's postings, per-row results and the job's resume point
+    commit together, so a crash or a rerun never applies a row twice.
+    Unless the caller already claimed it, the job is claimed first and
+    returned untouched if another worker holds it.
+    """
+    if not claimed and not claim_job(job_id):
+        return db.session.get(BulkTransferJob, job_id)
+    job = db.session.get(BulkTransferJob, job_id)
+    records = itertools.islice(iter_records(job.file_path, job.file_format), job.rows_committed, None)
+    try:
+        for chunk in _chunks(records, chunk_size):
+            parsed = [_parse(record) for record in chunk]
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                first_line = job.rows_committed + 1
+                try:
+                    _apply_chunk(job, first_line, parsed)
+                    break
+                except (InsufficientFunds, OperationalError) as exc:
+                    db.session.rollback()
+                    if attempt == MAX_ATTEMPTS or (isinstance(exc, OperationalError) and not is_retryable(exc)):
+                        raise
+                    time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        job.status = 'completed'
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        job.status = 'failed'
+        db.session.commit()
+        raise
+    return job
+
+def affected_user_ids(job_id):
+    # Owners of the source account and of every account the job has credited
+    job = db.session.get(BulkTransferJob, job_id)
+    recipients = db.session.scalars(
+        select(Account.user_id).distinct()
+        .join(BulkTransferRow, BulkTransferRow.to_account_number == Account.account_number)
+        .where(BulkTransferRow.job_id == job_id, BulkTransferRow.status == 'posted')
+    ).all()
+    return [job.user_id, *recipients]
+
+def iter_report(job_id):
+    # Per-row results as CSV text, streamed in line order
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_FIELDS)
+    rows = db.session.execute(
+        select(*(getattr(BulkTransferRow, field) for field in REPORT_FIELDS))
+        .where(BulkTransferRow.job_id == job_id)
+        .order_by(BulkTransferRow.line)
+        .execution_options(yield_per=CHUNK_SIZE)
+    )
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    # Threads do not survive a fork, so each web worker process starts its own
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='bulk-transfer')
+            _executor_pid = os.getpid()
+        return _executor
+
+def _run_in_background(app, job_id, on_finish):
+    with app.app_context():
+        try:
+            run_job(job_id, claimed=True)
+        except Exception:
+            logger.exception('Bulk transfer job %s failed', job_id)
+        finally:
+            try:
+                if on_finish is not None:
+                    on_finish(job_id)
+            finally:
+                db.session.remove()
+
+def start_job(app, job_id, on_finish=None):
+    """Claim job_id and run it on a background thread, returning at once.
+
+    False if the job is completed or already running. on_finish, if given,
+    is called with the job id in an app context once the run ends.
+    """
+    if not claim_job(job_id):
+        return False
+    _get_executor().submit(_run_in_background, app, job_id, on_finish)
+    return True
@@ -0,0 +1,202 @@
+import itertools
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from sqlalchemy import func, literal, select, union_all
+from models import db, User, Account, Loan, CreditCard, FixedDeposit, RecurringDeposit, Insurance, Investment
+
+LOCAL_TTL = 30  # Seconds a summary is served from process memory without a shared backend
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+class TTLCache(LRUCache):
+    # LRU whose entries also expire ttl seconds after they were set
+    def __init__(self, maxsize=1024, ttl=300):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = super().get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value):
+        super().set(key, (time.monotonic() + self.ttl, value))
+
+class MemoryBackend:
+    # Stands in for a shared cache (Redis) in tests and single-process setups
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = value
+
+    def incr(self, key):
+        with self._lock:
+            self._data[key] = int(self._data.get(key) or 0) + 1
+            return self._data[key]
+
+class RedisBackend:
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+def build_backend(url):
+    if not url:
+        return None
+    if url == 'memory':
+        return MemoryBackend()
+    return RedisBackend(url)
+
+class VersionedCache:
+    """Two-level cache whose entries are keyed by a per-key version.
+
+    invalidate() bumps the version instead of deleting anything, so entries
+    computed from data that was read before a write are never served after
+    it. With a shared backend the versions live there, and a bump in one
+    process is seen by every other one on its next read. Without one,
+    bumps stay in the process that made them, so local entries also expire
+    after local_ttl seconds: that bounds how long another process's writes
+    go unseen.
+    """
+    def __init__(self, name, loader, maxsize=1024, backend=None, ttl=300, local_ttl=LOCAL_TTL):
+        self.name, self.loader, self.backend, self.ttl = name, loader, backend, ttl
+        self.local = TTLCache(maxsize, local_ttl)
+        # key -> version, least recently bumped first and at most maxsize of them. Versions come
+        # from one counter, and a key without one reads as the highest version evicted, so
+        # forgetting a key's version can never bring back an entry from before its last bump
+        self._versions = OrderedDict()
+        self._counter = itertools.count(1)
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = self.shared_hits = self.misses = self.invalidations = 0
+
+    def _version(self, key):
+        if self.backend is not None:
+            return int(self.backend.get(f"{self.name}:v:{key}") or 0)
+        with self._lock:
+            return self._versions.get(key, self._floor)
+
+    def get(self, key):
+        version = self._version(key)
+        value = self.local.get((key, version))
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.backend is not None:
+            cached = self.backend.get(f"{self.name}:{key}:{version}")
+            if cached is not None:
+                self.shared_hits += 1
+                value = pickle.loads(cached)
+                self.local.set((key, version), value)
+                return value
+        self.misses += 1
+        value = self.loader(key)
+        if value is not None:
+            self.local.set((key, version), value)
+            if self.backend is not None:
+                self.backend.set(f"{self.name}:{key}:{version}", pickle.dumps(value), ttl=self.ttl)
+        return value
+
+    def invalidate(self, *keys):
+        for key in set(keys):
+            if key is None:
+                continue
+            self.invalidations += 1
+            if self.backend is not None:
+                self.backend.incr(f"{self.name}:v:{key}")
+            else:
+                with self._lock:
+                    self._versions[key] = next(self._counter)
+                    self._versions.move_to_end(key)
+                    while len(self._versions) > self.local.maxsize:
+                        self._floor = max(self._floor, self._versions.popitem(last=False)[1])
+
+    def stats(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        return dict(name=self.name, hits=self.hits, shared_hits=self.shared_hits, misses=self.misses,
+                    invalidations=self.invalidations, size=len(self.local),
+                    hit_rate=round((self.hits + self.shared_hits) / lookups, 4) if lookups else None)
+
+# (product, amount column) summed per user for the dashboard
+PRODUCTS = (
+    ('loans', Loan, Loan.amount),
+    ('credit_cards', CreditCard, CreditCard.limit),
+    ('fixed_deposits', FixedDeposit, FixedDeposit.amount),
+    ('recurring_deposits', RecurringDeposit, RecurringDeposit.monthly_amount),
+    ('insurance', Insurance, Insurance.coverage_amount),
+    ('investments', Investment, Investment.current_value),
+)
+
+def build_summary(user_id, session=None):
+    """Everything the dashboard shows for user_id, as plain values, in three queries."""
+    session = session or db.session
+    user = session.execute(
+        select(User.id, User.username, User.email, User.profile_image).where(User.id == user_id)
+    ).first()
+    if user is None:
+        return None
+    accounts = session.execute(
+        select(Account.id, Account.account_number, Account.balance).where(Account.user_id == user_id).order_by(Account.id)
+    ).all()
+    # One UNION ALL round trip for every product's count and total
+    totals = union_all(*(
+        select(literal(name).label('product'), func.count().label('count'), func.coalesce(func.sum(column), 0).label('total'))
+        .where(model.user_id == user_id)
+        for name, model, column in PRODUCTS
+    ))
+    products = {}
+    for row in session.execute(totals):
+        products[row.product] = dict(count=row.count, total=row.total)
+    return dict(
+        user=user._asdict(),
+        accounts=[account._asdict() for account in accounts],
+        total_balance=sum((account.balance for account in accounts), Decimal('0.00')),
+        products=products,
+    )
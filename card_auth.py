@@ -0,0 +1,452 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from multiprocessing.managers import BaseManager
+from sqlalchemy import BigInteger, bindparam, func, insert, select, type_coerce, update
+from sqlalchemy.orm import Session
+from models import utcnow, CardAuthorization, CreditCard, Transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows: no guard against a second process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STRIPES = 64  # Independent locks; a card always maps to the same one
+SYNC_INTERVAL = 0.1  # Seconds between fsyncs of the log
+SETTLE_INTERVAL = 5.0  # Seconds between settlements of captured holds
+SETTLE_BATCH = 10000  # Captured holds written per database transaction
+HOLD_TTL = 7 * 86400  # Seconds an uncaptured hold lives before it is released
+COMPACT_BYTES = 64 << 20  # Log size that triggers a rewrite down to the open holds
+
+class Declined(Exception):
+    pass
+
+class AuthorizerUnavailable(RuntimeError):
+    # Another process holds the log, or the authorizer service cannot be reached
+    pass
+
+def to_paise(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def _utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+class _Stripe:
+    __slots__ = ('lock', 'cards', 'holds')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cards = {}  # card_id -> [limit, balance, held, account_id], amounts in paise
+        self.holds = {}  # hold_id -> [card_id, amount, captured or None, authorized_at]
+
+class CardAuthorizer:
+    """Open-to-buy for every credit card, kept in memory.
+
+    authorize() places a hold against limit - balance - holds, capture()
+    fixes what the merchant actually took and release() drops a hold, each
+    under the lock of the card's stripe and appended to a write-ahead log
+    before it returns. Cards load from the database on first use. A
+    background thread fsyncs the log every SYNC_INTERVAL and settles
+    captured holds into CreditCard.balance, one 'card_purchase' Transaction
+    and CardAuthorization row each, every SETTLE_INTERVAL. On start the open
+    holds are rebuilt from the log, with only their cards, skipping holds
+    the database shows as settled.
+
+    The state lives in one process; the log is locked so a second process
+    cannot open it. With several web workers, run it once under
+    `flask card-authorizer` and give the workers a RemoteAuthorizer.
+    Amounts are integer paise throughout.
+    """
+
+    def __init__(self, engine, log_path, stripes=STRIPES, settle_interval=SETTLE_INTERVAL, sync_interval=SYNC_INTERVAL,
+                 on_settle=None):
+        self.engine, self.log_path = engine, log_path
+        self.on_settle = on_settle  # Called with the card holders' user ids after each settled batch
+        self.settle_interval, self.sync_interval = settle_interval, sync_interval
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self._log_lock = threading.Lock()
+        self._settle_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._log = None
+        self._thread = None
+        self._pid = None
+        self._sequence = None
+        self.authorized = self.declined = self.settled = 0
+
+    def _stripe(self, card_id):
+        return self._stripes[card_id % len(self._stripes)]
+
+    def _hold_stripe(self, hold_id):
+        # Hold ids are issued so they land on their card's stripe
+        return self._stripes[hold_id % len(self._stripes)]
+
+    def _append(self, line):
+        with self._log_lock:
+            self._log.write(line)
+            self._log.flush()
+
+    def _load(self, card_ids):
+        # {card_id: card state} for cards not yet in memory, read in one query per SETTLE_BATCH ids
+        card_ids = sorted(card_ids)
+        loaded = {}
+        with Session(self.engine) as session:
+            for start in range(0, len(card_ids), SETTLE_BATCH):
+                for card_id, limit, balance, account_id in session.execute(
+                    select(CreditCard.id, type_coerce(CreditCard.limit, BigInteger), type_coerce(CreditCard.balance, BigInteger),
+                           CreditCard.account_id)
+                    .where(CreditCard.id.in_(card_ids[start:start + SETTLE_BATCH]))
+                ):
+                    loaded[card_id] = [limit or 0, balance or 0, 0, account_id]
+        return loaded
+
+    def _card(self, stripe, card_id):
+        card = stripe.cards.get(card_id)
+        if card is None:
+            # First use since the state was loaded
+            card = self._load([card_id]).get(card_id)
+            if card is None:
+                return None
+            stripe.cards[card_id] = card
+        return card
+
+    def authorize(self, card_id, amount):
+        """Place a hold of amount paise on card_id; returns the hold id or raises Declined."""
+        self._ensure_started()
+        if amount <= 0:
+            raise Declined('Amount must be positive')
+        stripe = self._stripe(card_id)
+        with stripe.lock:
+            card = self._card(stripe, card_id)
+            if card is None:
+                self.declined += 1
+                raise Declined('Unknown card')
+            if card[0] - card[1] - card[2] < amount:
+                self.declined += 1
+                raise Declined('Insufficient credit limit')
+            hold_id = next(self._sequence) * len(self._stripes) + card_id % len(self._stripes)
+            now = time.time()
+            self._append(f"A,{hold_id},{card_id},{amount},{now}\n")
+            card[2] += amount
+            stripe.holds[hold_id] = [card_id, amount, None, now]
+            self.authorized += 1
+        return hold_id
+
+    def capture(self, hold_id, amount=None):
+        """Fix the amount taken on a hold (at most the amount held) for settlement."""
+        self._ensure_started()
+        stripe = self._hold_stripe(hold_id)
+        with stripe.lock:
+            hold = stripe.holds.get(hold_id)
+            if hold is None or hold[2] is not None:
+                raise Declined('No open hold')
+            amount = hold[1] if amount is None else amount
+            if not 0 < amount <= hold[1]:
+                raise Declined('Capture must be positive and within the hold')
+            self._append(f"C,{hold_id},{amount}\n")
+            stripe.cards[hold[0]][2] -= hold[1] - amount
+            hold[2] = amount
+        return amount
+
+    def release(self, hold_id):
+        """Drop an uncaptured hold, restoring the card's open-to-buy."""
+        self._ensure_started()
+        stripe = self._hold_stripe(hold_id)
+        with stripe.lock:
+            hold = stripe.holds.get(hold_id)
+            if hold is None or hold[2] is not None:
+                raise Declined('No open hold')
+            self._append(f"R,{hold_id}\n")
+            del stripe.holds[hold_id]
+            stripe.cards[hold[0]][2] -= hold[1]
+
+    def open_to_buy(self, card_id):
+        self._ensure_started()
+        stripe = self._stripe(card_id)
+        with stripe.lock:
+            card = self._card(stripe, card_id)
+            return None if card is None else card[0] - card[1] - card[2]
+
+    def open_to_buy_many(self, card_ids):
+        """{card_id: open-to-buy} for every known card in card_ids, loading the missing ones in one query."""
+        if not card_ids:
+            return {}
+        self._ensure_started()
+        loaded = self._load([card_id for card_id in card_ids if card_id not in self._stripe(card_id).cards])
+        found = {}
+        for card_id in card_ids:
+            stripe = self._stripe(card_id)
+            with stripe.lock:
+                card = stripe.cards.get(card_id)
+                if card is None and card_id in loaded:
+                    card = stripe.cards[card_id] = loaded[card_id]
+                if card is not None:
+                    found[card_id] = card[0] - card[1] - card[2]
+        return found
+
+    def hold(self, hold_id):
+        # (card_id, amount, captured or None), or None once settled or released
+        self._ensure_started()
+        stripe = self._hold_stripe(hold_id)
+        with stripe.lock:
+            hold = stripe.holds.get(hold_id)
+            return None if hold is None else tuple(hold[:3])
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid != os.getpid() or self._thread is None:
+                self._recover()
+                self._pid = os.getpid()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='card-settlement', daemon=True)
+                self._thread.start()
+
+    def _replay(self):
+        # -> ({hold_id: [card_id, amount, captured, authorized_at]}, highest sequence seen)
+        holds, sequence = {}, 0
+        if not os.path.exists(self.log_path):
+            return holds, sequence
+        with open(self.log_path) as log:
+            for line in log:
+                if not line.endswith('\n'):
+                    break  # Torn final write
+                kind, *fields = line[:-1].split(',')
+                if kind == 'N':
+                    sequence = max(sequence, int(fields[0]))
+                    continue
+                hold_id = int(fields[0])
+                sequence = max(sequence, hold_id // len(self._stripes) + 1)
+                if kind == 'A':
+                    holds[hold_id] = [int(fields[1]), int(fields[2]), None, float(fields[3])]
+                elif kind == 'C' and hold_id in holds:
+                    holds[hold_id][2] = int(fields[1])
+                elif kind in ('R', 'S'):
+                    holds.pop(hold_id, None)
+        return holds, sequence
+
+    def _recover(self):
+        holds, sequence = self._replay()
+        with Session(self.engine) as session:
+            # Settled in the database but not yet marked in the log
+            captured = [hold_id for hold_id, hold in holds.items() if hold[2] is not None]
+            for start in range(0, len(captured), SETTLE_BATCH):
+                for hold_id in session.scalars(select(CardAuthorization.id).where(
+                        CardAuthorization.id.in_(captured[start:start + SETTLE_BATCH]))):
+                    del holds[hold_id]
+            last_id = session.scalar(select(func.max(CardAuthorization.id))) or 0
+        for stripe in self._stripes:
+            stripe.cards.clear()
+            stripe.holds.clear()
+        # Only cards with open holds; the rest load on first use
+        for card_id, card in self._load({hold[0] for hold in holds.values()}).items():
+            self._stripe(card_id).cards[card_id] = card
+        for hold_id, hold in holds.items():
+            stripe = self._stripe(hold[0])
+            card = stripe.cards.get(hold[0])
+            if card is None:
+                continue
+            card[2] += hold[1] if hold[2] is None else hold[2]
+            stripe.holds[hold_id] = hold
+        self._sequence = itertools.count(max(sequence, last_id // len(self._stripes) + 1))
+        if self._log is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            self._log = open(self.log_path, 'a')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self._log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    self._log.close()
+                    self._log = None
+                    raise AuthorizerUnavailable(f"{self.log_path} is in use by another process")
+        self._compact()
+
+    def _compact(self):
+        # Rewrite the log as just the open holds, with every stripe locked
+        for stripe in self._stripes:
+            stripe.lock.acquire()
+        try:
+            with self._log_lock:
+                temp = self.log_path + '.tmp'
+                with open(temp, 'w') as log:
+                    log.write(f"N,{next(self._sequence)}\n")
+                    for stripe in self._stripes:
+                        for hold_id, (card_id, amount, captured, authorized_at) in stripe.holds.items():
+                            log.write(f"A,{hold_id},{card_id},{amount},{authorized_at}\n")
+                            if captured is not None:
+                                log.write(f"C,{hold_id},{captured}\n")
+                    log.flush()
+                    os.fsync(log.fileno())
+                os.replace(temp, self.log_path)
+                replaced = open(self.log_path, 'a')
+                if fcntl is not None:
+                    fcntl.flock(replaced, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._log.close()
+                self._log = replaced
+        finally:
+            for stripe in reversed(self._stripes):
+                stripe.lock.release()
+
+    def _run(self):
+        last_settle = time.monotonic()
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+                if time.monotonic() - last_settle >= self.settle_interval:
+                    last_settle = time.monotonic()
+                    self.settle()
+            except Exception:
+                # Retried on the next tick; captured holds stay in memory and in the log
+                logger.exception('Card settlement failed')
+
+    def sync(self):
+        with self._log_lock:
+            self._log.flush()
+            fd = self._log.fileno()
+        os.fsync(fd)
+
+    def _expire(self, now):
+        for stripe in self._stripes:
+            with stripe.lock:
+                for hold_id in [h for h, hold in stripe.holds.items() if hold[2] is None and now - hold[3] > HOLD_TTL]:
+                    self._append(f"R,{hold_id}\n")
+                    card_id, amount = stripe.holds.pop(hold_id)[:2]
+                    stripe.cards[card_id][2] -= amount
+
+    def settle(self):
+        """Post captured holds to the database in batches; returns how many settled."""
+        self._ensure_started()
+        with self._settle_lock:
+            self._expire(time.time())
+            captured = []
+            for stripe in self._stripes:
+                with stripe.lock:
+                    captured.extend((hold_id, hold[0], hold[2], hold[3], stripe.cards[hold[0]][3])
+                                    for hold_id, hold in stripe.holds.items() if hold[2] is not None)
+            for start in range(0, len(captured), SETTLE_BATCH):
+                self._settle_batch(captured[start:start + SETTLE_BATCH])
+            self.sync()
+            if os.path.getsize(self.log_path) > COMPACT_BYTES:
+                self._compact()
+            return len(captured)
+
+    def _settle_batch(self, batch):
+        # UTC, like every other timestamp in the ledger
+        settled_at = utcnow()
+        totals = {}
+        for _, card_id, amount, _, _ in batch:
+            totals[card_id] = totals.get(card_id, 0) + amount
+        cards, authorizations, transactions = CreditCard.__table__, CardAuthorization.__table__, Transaction.__table__
+        with self.engine.begin() as conn:
+            balance = type_coerce(cards.c.balance, BigInteger)
+            conn.execute(
+                update(cards).where(cards.c.id == bindparam('settle_card_id'))
+                .values({cards.c.balance: func.coalesce(balance, 0) + bindparam('settle_paise', type_=BigInteger)}),
+                [dict(settle_card_id=card_id, settle_paise=total) for card_id, total in totals.items()],
+            )
+            conn.execute(
+                insert(authorizations).values({authorizations.c.amount: bindparam('paise', type_=BigInteger)}),
+                [dict(id=hold_id, card_id=card_id, paise=amount, authorized_at=_utc(authorized_at),
+                      settled_at=settled_at) for hold_id, card_id, amount, authorized_at, _ in batch],
+            )
+            conn.execute(
+                insert(transactions).values({transactions.c.amount: bindparam('paise', type_=BigInteger),
+                                             transactions.c.transaction_type: 'card_purchase'}),
+                [dict(paise=amount, account_id=account_id, timestamp=_utc(authorized_at))
+                 for _, _, amount, authorized_at, account_id in batch],
+            )
+            user_ids = conn.scalars(select(cards.c.user_id).where(cards.c.id.in_(list(totals)))).all()
+        # Committed: the holds become balance, here and in the log
+        for hold_id, card_id, amount, _, _ in batch:
+            stripe = self._stripe(card_id)
+            with stripe.lock:
+                self._append(f"S,{hold_id}\n")
+                del stripe.holds[hold_id]
+                card = stripe.cards[card_id]
+                card[1] += amount
+                card[2] -= amount
+        self.settled += len(batch)
+        if self.on_settle is not None:
+            self.on_settle(*user_ids)
+
+    def stop(self):
+        """Settle what is captured, stop the background thread and close the log."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.settle()
+        self._thread = None
+        with self._log_lock:
+            self._log.close()
+            self._log = None
+
+# The web-facing calls; everything else stays inside the serving process
+EXPOSED = ('authorize', 'capture', 'release', 'open_to_buy', 'open_to_buy_many', 'hold')
+
+class _Server(BaseManager):
+    pass
+
+class _Client(BaseManager):
+    pass
+
+_Client.register('authorizer', exposed=EXPOSED)
+
+def parse_address(value):
+    # host:port for TCP, anything else is a Unix socket path
+    host, _, port = value.rpartition(':')
+    return (host, int(port)) if host and port.isdigit() else value
+
+def server(authorizer, address, authkey):
+    """A multiprocessing server exposing authorizer at address; call serve_forever() on it."""
+    authorizer._ensure_started()
+    _Server.register('authorizer', callable=lambda: authorizer, exposed=EXPOSED)
+    return _Server(address=address, authkey=authkey).get_server()
+
+class RemoteAuthorizer:
+    """CardAuthorizer's web-facing calls, answered by the process serving it at address.
+
+    Each worker process connects on first use and again after losing the
+    connection; Declined raised by the service is raised here unchanged.
+    """
+
+    def __init__(self, address, authkey):
+        self.address, self.authkey = address, authkey
+        self._proxy = None
+        self._pid = None
+
+    def _call(self, name, *args):
+        try:
+            if self._pid != os.getpid():
+                client = _Client(address=self.address, authkey=self.authkey)
+                client.connect()
+                self._proxy, self._pid = client.authorizer(), os.getpid()
+            return getattr(self._proxy, name)(*args)
+        except (OSError, EOFError) as exc:
+            self._pid = None
+            raise AuthorizerUnavailable(f"Card authorizer at {self.address} is unreachable: {exc}") from exc
+
+    def authorize(self, card_id, amount):
+        return self._call('authorize', card_id, amount)
+
+    def capture(self, hold_id, amount=None):
+        return self._call('capture', hold_id, amount)
+
+    def release(self, hold_id):
+        return self._call('release', hold_id)
+
+    def open_to_buy(self, card_id):
+        return self._call('open_to_buy', card_id)
+
+    def open_to_buy_many(self, card_ids):
+        return self._call('open_to_buy_many', card_ids)
+
+    def hold(self, hold_id):
+        return self._call('hold', hold_id)
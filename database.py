@@ -0,0 +1,54 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer, and NORMAL only fsyncs at checkpoints, which is still safe
+# against corruption in WAL mode.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms a writer waits for the lock before "database is locked"
+    'mmap_size': 268435456,
+    'cache_size': -65536,  # negative is KiB, so 64 MiB
+    'foreign_keys': 'ON',
+}
+
+def sqlite_pragmas(environ=os.environ):
+    return {
+        name: environ.get(f"SQLITE_{name.upper()}", default)
+        for name, default in SQLITE_PRAGMAS.items()
+    }
+
+def engine_options(database_uri, environ=os.environ):
+    """SQLAlchemy engine keyword arguments for database_uri, from DB_* variables."""
+    options = dict(
+        pool_size=int(environ.get('DB_POOL_SIZE', 5)),
+        max_overflow=int(environ.get('DB_MAX_OVERFLOW', 10)),
+        pool_timeout=int(environ.get('DB_POOL_TIMEOUT', 30)),
+        pool_recycle=int(environ.get('DB_POOL_RECYCLE', 1800)),
+        pool_pre_ping=environ.get('DB_POOL_PRE_PING', '1') == '1',
+    )
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite':
+        # Connections are cheap and never go stale
+        options.update(pool_recycle=-1, pool_pre_ping=False)
+        if url.database in (None, '', ':memory:'):
+            # One shared in-memory database; the default SingletonThreadPool takes no sizing
+            return {}
+    return options
+
+def configure_engine(engine, pragmas=None):
+    # Install the pragmas on engine's future connections; a no-op off SQLite
+    if engine.dialect.name != 'sqlite':
+        return engine
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
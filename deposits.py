@@ -0,0 +1,174 @@
+import calendar
+from decimal import Decimal
+import numpy as np
+from sqlalchemy import BigInteger, String, bindparam, func, insert, select, type_coerce, update
+from models import db, utcnow, Account, DepositAccrualRun, FixedDeposit, RecurringDeposit, Transaction
+
+CHUNK_SIZE = 100000  # Deposits loaded and written per database transaction
+
+def add_months(value, months):
+    # Calendar months, clamping to the end of shorter months (31 Jan + 1 -> 28/29 Feb)
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+def months_between(start, end):
+    # Whole calendar months from start to end, elementwise over datetime64[D] arrays
+    start_month, end_month = start.astype('datetime64[M]'), end.astype('datetime64[M]')
+    months = (end_month - start_month).astype(np.int64)
+    start_day = (start - start_month.astype('datetime64[D]')).astype(np.int64)
+    end_day = (end - end_month.astype('datetime64[D]')).astype(np.int64)
+    return months - (end_day < start_day)
+
+def fd_value(principal, rate, months):
+    # Quarterly compounding
+    return principal * (1 + rate / 400) ** (months / 3)
+
+def rd_value(installment, rate, months):
+    # M = R[(1+i)^n - 1] / [1 - (1+i)^(-1/3)], i the quarterly rate and n in quarters
+    growth = 1 + rate / 400
+    return installment * (growth ** (months / 3) - 1) / (1 - growth ** (-1 / 3))
+
+# (report key, model, amount column, value function, principal per month of term?)
+PRODUCTS = (
+    ('fixed_deposits', FixedDeposit, FixedDeposit.amount, fd_value, False),
+    ('recurring_deposits', RecurringDeposit, RecurringDeposit.monthly_amount, rd_value, True),
+)
+
+def _paise(values):
+    return [Decimal(int(value)).scaleb(-2) for value in values]
+
+def _load(session, model, amount_column, last_id, chunk_size):
+    # Columnar chunk of active deposits; amounts stay in integer paise
+    rows = session.execute(
+        select(model.id, model.account_id, model.user_id, type_coerce(amount_column, BigInteger), model.interest_rate, model.term_months,
+               func.date(model.created_at, type_=String), func.date(model.maturity_date, type_=String),
+               func.coalesce(type_coerce(model.accrued_interest, BigInteger), -1),
+               func.coalesce(type_coerce(model.maturity_amount, BigInteger), -1))
+        .where(model.status == 'active', model.id > last_id)
+        .order_by(model.id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        return None
+    ids, account_ids, user_ids, amounts, rates, terms, created, maturity, accrued, maturity_amounts = zip(*rows)
+    return dict(
+        id=np.array(ids, dtype=np.int64), account_id=np.array(account_ids, dtype=np.int64),
+        user_id=np.array(user_ids, dtype=np.int64),
+        amount=np.array(amounts, dtype=np.float64), rate=np.array(rates, dtype=np.float64),
+        term=np.array(terms, dtype=np.int64), created=np.array(created, dtype='datetime64[D]'),
+        maturity=np.array(maturity, dtype='datetime64[D]'),
+        accrued=np.array(accrued, dtype=np.int64), maturity_amount=np.array(maturity_amounts, dtype=np.int64),
+    )
+
+def _compute(chunk, value, per_month, run_date):
+    elapsed = np.clip(months_between(chunk['created'], np.datetime64(run_date, 'D')), 0, chunk['term'])
+    principal = chunk['amount'] * chunk['term'] if per_month else chunk['amount']
+    principal_so_far = chunk['amount'] * elapsed if per_month else chunk['amount']
+    maturity_amount = np.rint(value(chunk['amount'], chunk['rate'], chunk['term'])).astype(np.int64)
+    accrued = np.rint(value(chunk['amount'], chunk['rate'], elapsed) - principal_so_far).astype(np.int64)
+    matured = chunk['maturity'] <= np.datetime64(run_date, 'D')
+    interest = maturity_amount - principal.astype(np.int64)
+    accrued = np.where(matured, interest, accrued)
+    # Accrual only moves when another month completes, so a daily run rewrites few rows
+    changed = matured | (accrued != chunk['accrued']) | (maturity_amount != chunk['maturity_amount'])
+    return dict(maturity_amount=maturity_amount, accrued=accrued, matured=matured, changed=changed,
+                interest=np.where(matured, interest, 0))
+
+def _write(session, model, chunk, result):
+    table = model.__table__
+    changed = result['changed']
+    rows = [
+        dict(deposit_id=int(i), accrued=int(a), maturity_amount=int(m), new_status='matured' if done else 'active')
+        for i, a, m, done in zip(chunk['id'][changed], result['accrued'][changed],
+                                 result['maturity_amount'][changed], result['matured'][changed])
+    ]
+    if not rows:
+        return
+    updated = session.execute(
+        update(table)
+        .where(table.c.id == bindparam('deposit_id'), table.c.status == 'active')
+        .values({table.c.accrued_interest: bindparam('accrued', type_=BigInteger),
+                 table.c.maturity_amount: bindparam('maturity_amount', type_=BigInteger),
+                 table.c.status: bindparam('new_status')}),
+        rows,
+    ).rowcount
+    if updated != len(rows):
+        # Another run matured some of these since they were loaded
+        raise RuntimeError(f"{model.__tablename__}: expected {len(rows)} active deposits, updated {updated}")
+    credited = result['matured'] & (result['interest'] > 0)
+    if not credited.any():
+        return
+    account_ids, interest = chunk['account_id'][credited], result['interest'][credited]
+    session.execute(insert(Transaction), [
+        dict(amount=amount, transaction_type='interest', account_id=int(account_id))
+        for account_id, amount in zip(account_ids, _paise(interest))
+    ])
+    # One balance update per account however many of its deposits matured
+    accounts, index = np.unique(account_ids, return_inverse=True)
+    totals = np.bincount(index, weights=interest).astype(np.int64)
+    balance = Account.__table__.c.balance
+    session.execute(
+        update(Account.__table__)
+        .where(Account.__table__.c.id == bindparam('credit_account_id'))
+        .values({balance: type_coerce(balance, BigInteger) + bindparam('credit_paise', type_=BigInteger)}),
+        [dict(credit_account_id=int(a), credit_paise=int(t)) for a, t in zip(accounts, totals)],
+    )
+
+def run_accruals(run_date, dry_run=False, chunk_size=CHUNK_SIZE, session=None, invalidate=None):
+    """Accrue interest on active deposits as of run_date and mature due ones.
+
+    Matured deposits have their interest credited to the linked account as
+    an 'interest' transaction. A date that already completed is not run
+    again, and each chunk's updates, credits and progress commit together,
+    so an interrupted run can simply be repeated. With dry_run nothing is
+    written; the report shows what a real run would do. invalidate, if
+    given, is called with the owners of the deposits each chunk changed.
+    """
+    session = session or db.session
+    report = dict(run_date=run_date, dry_run=dry_run, already_completed=False)
+    run = None
+    if not dry_run:
+        run = session.get(DepositAccrualRun, run_date)
+        if run is not None and run.status == 'completed':
+            report['already_completed'] = True
+            return report
+        if run is None:
+            run = DepositAccrualRun(run_date=run_date, deposits_processed=0, deposits_matured=0, interest_credited=0)
+            session.add(run)
+            session.commit()
+    for key, model, amount_column, value, per_month in PRODUCTS:
+        totals = dict(processed=0, matured=0, accrued_interest=Decimal('0.00'), interest_credited=Decimal('0.00'))
+        last_id = 0
+        while True:
+            chunk = _load(session, model, amount_column, last_id, chunk_size)
+            if chunk is None:
+                break
+            last_id = int(chunk['id'][-1])
+            result = _compute(chunk, value, per_month, run_date)
+            processed, matured = len(chunk['id']), int(result['matured'].sum())
+            accrued_total = Decimal(int(result['accrued'][~result['matured']].sum())).scaleb(-2)
+            interest_total = Decimal(int(result['interest'].sum())).scaleb(-2)
+            if not dry_run:
+                try:
+                    _write(session, model, chunk, result)
+                    run.deposits_processed += processed
+                    run.deposits_matured += matured
+                    run.interest_credited += interest_total
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    raise
+                if invalidate is not None:
+                    invalidate(*np.unique(chunk['user_id'][result['changed']]).tolist())
+            totals['processed'] += processed
+            totals['matured'] += matured
+            totals['accrued_interest'] += accrued_total
+            totals['interest_credited'] += interest_total
+        report[key] = totals
+    if not dry_run:
+        run.status = 'completed'
+        run.completed_at = utcnow()
+        session.commit()
+    return report
@@ -0,0 +1,113 @@
+import csv
+import heapq
+import io
+import json
+import zlib
+from collections import namedtuple
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+import archive
+from models import db, Account, Transaction
+
+FIELDS = ('id', 'timestamp', 'transaction_type', 'amount', 'account_number', 'to_account_number')
+YIELD_PER = 2000  # Rows fetched per round trip on each cursor
+FLUSH_AT = 65536  # Bytes of text buffered before a chunk goes out
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+Row = namedtuple('Row', FIELDS)
+
+def _branch(session, column, account_id, criteria):
+    # Walks the (account_id, timestamp) or (to_account_id, timestamp) index
+    # in order, so rows stream out without a sort over the whole history
+    to_account = aliased(Account)
+    return session.execute(
+        select(Transaction.id, Transaction.timestamp, Transaction.transaction_type, Transaction.amount,
+               Account.account_number, to_account.account_number.label('to_account_number'))
+        .join(Account, Account.id == Transaction.account_id)
+        .outerjoin(to_account, to_account.id == Transaction.to_account_id)
+        .where(column == account_id, *criteria)
+        .order_by(Transaction.timestamp, Transaction.id)
+        .execution_options(yield_per=YIELD_PER, stream_results=True)
+    )
+
+def _archived_branch(session, path, column, account_id, criteria, numbers):
+    # The same walk over one archive partition; account numbers come from
+    # the main database, looked up once per chunk and shared across branches
+    source = archive.table
+    with archive.engine_for(path).connect() as conn:
+        result = conn.execute(
+            select(source.c.id, source.c.timestamp, source.c.transaction_type, source.c.amount,
+                   source.c.account_id, source.c.to_account_id)
+            .where(source.c[column] == account_id, *criteria)
+            .order_by(source.c.timestamp, source.c.id)
+            .execution_options(yield_per=YIELD_PER, stream_results=True)
+        )
+        for chunk in result.partitions():
+            missing = {row.account_id for row in chunk} | {row.to_account_id for row in chunk}
+            numbers.update(archive.account_numbers(session, missing - numbers.keys()))
+            for row in chunk:
+                yield Row(row.id, row.timestamp, row.transaction_type, row.amount,
+                          numbers.get(row.account_id), numbers.get(row.to_account_id))
+
+def iter_rows(account_ids, criteria=(), session=None):
+    """Every transaction touching account_ids, oldest first, as it is read.
+
+    One streaming cursor per (account, direction), merged on
+    (timestamp, id); a transfer between two of the accounts shows up once.
+    Archive partitions join the merge only when criteria reach their dates.
+    """
+    session = session or db.session
+    branches = [_branch(session, column, account_id, criteria)
+                for account_id in account_ids
+                for column in (Transaction.account_id, Transaction.to_account_id)]
+    numbers = {}
+    for path in archive.partitions(session, *archive.time_bounds(criteria)):
+        branches += [_archived_branch(session, path, column, account_id, archive.retarget(criteria), numbers)
+                     for account_id in account_ids
+                     for column in ('account_id', 'to_account_id')]
+    last_id = None
+    for row in heapq.merge(*branches, key=lambda row: (row.timestamp, row.id)):
+        if row.id != last_id:
+            yield row
+        last_id = row.id
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for row in rows:
+        writer.writerow((row.id, row.timestamp.isoformat(), row.transaction_type, row.amount,
+                         row.account_number, row.to_account_number or ''))
+        if buffer.tell() > FLUSH_AT:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _jsonl_lines(rows):
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(id=row.id, timestamp=row.timestamp.isoformat(), transaction_type=row.transaction_type,
+                               amount=str(row.amount), account_number=row.account_number,
+                               to_account_number=row.to_account_number)) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size > FLUSH_AT:
+            yield ''.join(lines)
+            lines, size = [], 0
+    yield ''.join(lines)
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(account_ids, criteria=(), file_format='csv', compress=False, session=None):
+    """Chunks of the export as bytes; memory stays flat whatever the row count."""
+    lines = (_csv_lines if file_format == 'csv' else _jsonl_lines)(iter_rows(account_ids, criteria, session))
+    if compress:
+        return _gzip(lines)
+    return (chunk.encode() for chunk in lines)
@@ -0,0 +1,88 @@
+from decimal import Decimal
+from flask_wtf import FlaskForm
+from wtforms import StringField, PasswordField, DecimalField, IntegerField, SubmitField, FileField, DateField, SelectField
+from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional, StopValidation
+
+class Finite:
+    # DecimalField parses NaN and Infinity, which DataRequired lets through and NumberRange cannot compare
+    def __call__(self, form, field):
+        if field.data is not None and not field.data.is_finite():
+            raise StopValidation('Enter a number')
+
+class RegistrationForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired(), Length(min=4, max=150)])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
+
+class LoginForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired()])
+    password = PasswordField('Password', validators=[DataRequired()])
+
+class TransactionForm(FlaskForm):
+    account_id = IntegerField('Account ID', validators=[DataRequired()])
+    amount = DecimalField('Amount', places=2, validators=[DataRequired(), Finite(), NumberRange(min=Decimal('0.01'))])
+
+class TransferForm(FlaskForm):
+    from_account_id = IntegerField('From Account ID', validators=[DataRequired()])
+    to_account_id = IntegerField('To Account ID', validators=[DataRequired()])
+    amount = DecimalField('Amount', places=2, validators=[DataRequired(), Finite(), NumberRange(min=Decimal('0.01'))])
+
+class BulkTransferForm(FlaskForm):
+    from_account_id = IntegerField('From Account ID', validators=[DataRequired()])
+    file = FileField('Payment File (CSV or JSONL)', validators=[DataRequired()])
+    submit = SubmitField('Upload')
+
+class UploadImageForm(FlaskForm):
+    image = FileField('Profile Image', validators=[DataRequired()])
+    submit = SubmitField('Upload')
+
+class LoanForm(FlaskForm):
+    amount = DecimalField('Loan Amount', places=2, validators=[DataRequired(), Finite(), NumberRange(min=Decimal('0.01'))])
+    term_months = IntegerField('Term (Months)', validators=[DataRequired()])
+    submit = SubmitField('Apply')
+
+class CreditCardForm(FlaskForm):
+    limit = DecimalField('Credit Limit', places=2, validators=[DataRequired(), Finite(), NumberRange(min=Decimal('0.01'))])
+    submit = SubmitField('Apply')
+
+class ChangePasswordForm(FlaskForm):
+    password = PasswordField('New Password', validators=[DataRequired(), Length(min=6)])
+    submit = SubmitField('Change Password')
+
+class FixedDepositForm(FlaskForm):
+    amount = DecimalField('Deposit Amount (INR)', places=2, validators=[DataRequired(), Finite(), NumberRange(min=Decimal('0.01'))])
+    term_months = IntegerField('Term (Months)', validators=[DataRequired()])
+    submit = SubmitField('Create Fixed Deposit')
+
+class RecurringDepositForm(FlaskForm):
+    monthly_amount = DecimalField('Monthly Amount (INR)', places=2, validators=[DataRequired(), Finite(), NumberRange(min=Decimal('0.01'))])
+    term_months = IntegerField('Term (Months)', validators=[DataRequired()])
+    submit = SubmitField('Create Recurring Deposit')
+
+class BillPaymentForm(FlaskForm):
+    bill_type = SelectField('Bill Type', choices=[('electricity', 'Electricity'), ('water', 'Water'), ('gas', 'Gas'), ('phone', 'Phone'), ('internet', 'Internet'), ('other', 'Other')], validators=[DataRequired()])
+    bill_number = StringField('Bill Number', validators=[DataRequired()])
+    amount = DecimalField('Amount (INR)', places=2, validators=[DataRequired(), Finite(), NumberRange(min=Decimal('0.01'))])
+    due_date = DateField('Due Date', validators=[DataRequired()])
+    submit = SubmitField('Pay Bill')
+
+class InsuranceForm(FlaskForm):
+    type = SelectField('Insurance Type', choices=[('life', 'Life'), ('health', 'Health'), ('vehicle', 'Vehicle')], validators=[DataRequired()])
+    coverage_amount = DecimalField('Coverage Amount (INR)', places=2, validators=[DataRequired(), Finite(), NumberRange(min=Decimal('0.01'))])
+    term_years = IntegerField('Term (Years)', validators=[DataRequired()])
+    submit = SubmitField('Apply')
+
+class InvestmentForm(FlaskForm):
+    type = SelectField('Investment Type', choices=[('mutual_fund', 'Mutual Fund'), ('stock', 'Stock'), ('bond', 'Bond')], validators=[DataRequired()])
+    instrument = StringField('Ticker / Scheme Code', validators=[Optional(), Length(max=50)])
+    amount = DecimalField('Investment Amount (INR)', places=2, validators=[DataRequired(), Finite(), NumberRange(min=Decimal('0.01'))])
+    submit = SubmitField('Invest')
+
+class ChequeRequestForm(FlaskForm):
+    number_of_cheques = IntegerField('Number of Cheques', validators=[DataRequired(), NumberRange(min=1)])
+    submit = SubmitField('Request Cheque Book')
+
+class AccountStatementForm(FlaskForm):
+    start_date = DateField('Start Date', validators=[DataRequired()])
+    end_date = DateField('End Date', validators=[DataRequired()])
+    submit = SubmitField('Generate Statement')
@@ -0,0 +1,168 @@
+import os
+import queue
+import random
+import threading
+import time
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from posting import MAX_ATTEMPTS, RETRY_BACKOFF, PostingError, is_retryable
+
+WINDOW = 0.002  # Seconds the writer waits for more postings after the first of a batch
+MAX_BATCH = 128  # Postings per transaction at most
+TIMEOUT = 30.0  # Seconds submit() waits for the transaction holding its posting
+LIVENESS_INTERVAL = 0.5  # Seconds between checks that the writer thread is still running
+
+class WriterUnavailable(RuntimeError):
+    # The writer stopped or timed out before reporting on a posting
+    pass
+
+class _Posting:
+    __slots__ = ('apply', 'args', 'done', 'error', 'state')
+
+    def __init__(self, apply, args):
+        self.apply, self.args = apply, args
+        self.done = threading.Event()
+        self.error = None
+        self.state = 'queued'  # queued, taken by the writer, or cancelled by its caller
+
+class GroupCommitter:
+    """Single writer thread that commits concurrent postings together.
+
+    submit() queues a posting and blocks until the transaction holding it
+    commits. Each posting runs in its own savepoint, so one that fails
+    validation rolls back alone and its PostingError is raised to its own
+    caller while the rest of the batch commits. If the writer dies, or
+    nothing is reported within timeout seconds, submit() raises
+    WriterUnavailable instead of waiting for ever.
+    """
+
+    def __init__(self, engine, window=WINDOW, max_batch=MAX_BATCH, timeout=TIMEOUT):
+        self.engine, self.window, self.max_batch, self.timeout = engine, window, max_batch, timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._states = threading.Lock()  # Guards _Posting.state between the writer and timed-out callers
+        self._thread = None
+        self._pid = None
+        self.batches = self.postings = 0
+
+    def _ensure_started(self):
+        # Started on first use, and again in each worker process after a fork
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def submit(self, apply, *args):
+        writer = self._ensure_started()
+        posting = _Posting(apply, args)
+        self._queue.put(posting)
+        deadline = time.monotonic() + self.timeout
+        while not posting.done.wait(max(0, min(LIVENESS_INTERVAL, deadline - time.monotonic()))):
+            if writer.is_alive():
+                if time.monotonic() < deadline:
+                    continue
+                with self._states:
+                    if posting.state == 'queued':
+                        posting.state = 'cancelled'  # A later writer skips it
+                        raise WriterUnavailable(f"Group commit writer did not take the posting within {self.timeout}s; it was not committed")
+                raise WriterUnavailable(f"Posting not committed within {self.timeout}s; it may still commit")
+            # The writer died. Whatever it held was rolled back with its session
+            if posting.done.wait(LIVENESS_INTERVAL):
+                break
+            with self._states:
+                if posting.state == 'queued' and time.monotonic() >= deadline:
+                    posting.state = 'cancelled'
+                if posting.state != 'queued':
+                    raise WriterUnavailable('Group commit writer stopped; the posting was not committed')
+            writer = self._ensure_started()  # Still queued, so the new writer takes it
+        if posting.error is not None:
+            raise posting.error
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+
+    def _take(self, posting, batch):
+        with self._states:
+            if posting.state == 'queued':
+                posting.state = 'taken'
+                batch.append(posting)
+
+    def _collect(self):
+        batch = []
+        while not batch:
+            first = self._queue.get()
+            if first is None:
+                return None
+            self._take(first, batch)
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                posting = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if posting is None:
+                self._queue.put(None)  # Stop after this batch
+                break
+            self._take(posting, batch)
+        return batch
+
+    def _run(self):
+        batch = []
+        try:
+            with Session(self.engine) as session:
+                while True:
+                    batch = self._collect()
+                    if batch is None:
+                        return
+                    self._commit(session, batch)
+                    for posting in batch:
+                        posting.done.set()
+                    self.batches += 1
+                    self.postings += len(batch)
+                    batch = []
+        except BaseException:
+            # Closing the session rolled back whatever this batch had applied
+            for posting in batch:
+                posting.error = WriterUnavailable('Group commit writer stopped; the posting was not committed')
+                posting.done.set()
+            raise
+
+    def _commit(self, session, batch):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                if session.bind.dialect.name == 'sqlite':
+                    # Without an explicit BEGIN pysqlite commits at every RELEASE SAVEPOINT
+                    session.connection().exec_driver_sql('BEGIN IMMEDIATE')
+                for posting in batch:
+                    posting.error = None
+                    try:
+                        with session.begin_nested():
+                            posting.apply(session, *posting.args)
+                    except PostingError as exc:
+                        posting.error = exc
+                session.commit()
+                return
+            except OperationalError as exc:
+                session.rollback()
+                if attempt == MAX_ATTEMPTS or not is_retryable(exc):
+                    error = exc
+                    break
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            except Exception as exc:
+                session.rollback()
+                error = exc
+                break
+        for posting in batch:
+            posting.error = error
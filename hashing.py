@@ -0,0 +1,76 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Stored hashes whose method prefix differs from this are rehashed on the
+# next successful login. Spell out every parameter, as werkzeug stores them.
+HASH_METHOD = 'pbkdf2:sha256:600000'
+WORKERS = 2  # Hashing processes; 0 hashes inline on the calling thread
+MAX_QUEUE = 16  # Hash jobs allowed to wait for a worker before new ones are shed
+QUEUE_TIMEOUT = 0.05  # seconds a request waits for a queue slot before it is shed
+
+class HashingBusy(Exception):
+    pass
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(WORKERS + MAX_QUEUE)
+_method = HASH_METHOD
+
+def configure(workers=WORKERS, max_queue=MAX_QUEUE, method=HASH_METHOD):
+    """Resize the pool and queue; call before serving requests."""
+    global WORKERS, MAX_QUEUE, _executor, _slots, _method
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        WORKERS, MAX_QUEUE, _method = workers, max_queue, method
+        _slots = threading.BoundedSemaphore(workers + max_queue)
+
+def _warm():
+    return True
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            # Start the workers now rather than on the first login
+            for future in [_executor.submit(_warm) for _ in range(WORKERS)]:
+                future.result()
+        return _executor
+
+def needs_rehash(password_hash, method=None):
+    return password_hash.split('$', 1)[0] != (method or _method)
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+def _verify(password_hash, password, method):
+    # -> (matches, upgraded hash or None); the rehash shares the worker trip
+    if not check_password_hash(password_hash, password):
+        return False, None
+    return True, (generate_password_hash(password, method=method) if needs_rehash(password_hash, method) else None)
+
+def _run(fn, *args):
+    if WORKERS == 0:
+        return fn(*args)
+    slots = _slots
+    if not slots.acquire(timeout=QUEUE_TIMEOUT):
+        raise HashingBusy('Password hashing is saturated')
+    try:
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        slots.release()
+
+def hash_password(password):
+    return _run(_hash, password, _method)
+
+def verify_password(password_hash, password):
+    """Check password off-thread; returns (matches, new_hash).
+
+    new_hash is set when the password matched but the stored hash used
+    outdated parameters, and should replace it.
+    """
+    return _run(_verify, password_hash, password, _method)
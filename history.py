@@ -0,0 +1,143 @@
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import select, union_all, and_, or_
+import archive
+from models import db, Account, Transaction
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Shape of a history row, for rows read from the archive
+PageRow = namedtuple('PageRow', 'id amount transaction_type timestamp account_id to_account_id account_number')
+
+def filter_criteria(args):
+    # Date, type and amount filters shared by the history pages
+    criteria = []
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    transaction_type = args.get('transaction_type')
+    min_amount = args.get('min_amount')
+    max_amount = args.get('max_amount')
+
+    if start_date:
+        criteria.append(Transaction.timestamp >= datetime.strptime(start_date, '%Y-%m-%d'))
+    if end_date:
+        criteria.append(Transaction.timestamp <= datetime.strptime(end_date, '%Y-%m-%d'))
+    if transaction_type:
+        criteria.append(Transaction.transaction_type == transaction_type)
+    if min_amount:
+        criteria.append(Transaction.amount >= Decimal(min_amount))
+    if max_amount:
+        criteria.append(Transaction.amount <= Decimal(max_amount))
+    return criteria
+
+def page_size(args):
+    try:
+        size = int(args.get('per_page', PAGE_SIZE))
+    except ValueError:
+        size = PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def encode_cursor(transaction):
+    return f"{transaction.timestamp.isoformat()}_{transaction.id}"
+
+def decode_cursor(value):
+    # Malformed cursors fall back to the first page
+    if not value:
+        return None
+    try:
+        timestamp, transaction_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(transaction_id)
+    except ValueError:
+        return None
+
+def _keyset(cursor):
+    timestamp, transaction_id = cursor
+    # Written so the leading timestamp bound can drive the index range scan
+    return and_(
+        Transaction.timestamp <= timestamp,
+        or_(Transaction.timestamp < timestamp, Transaction.id < transaction_id),
+    )
+
+def _page_ids(source, account_ids, criteria, limit):
+    branches = []
+    for account_id in account_ids:
+        for column in (source.c.account_id, source.c.to_account_id):
+            branch = (
+                select(source.c.id)
+                .where(column == account_id, *criteria)
+                .order_by(source.c.timestamp.desc(), source.c.id.desc())
+                .limit(limit + 1)
+                .subquery()
+            )
+            branches.append(select(branch.c.id))
+    return union_all(*branches).subquery()
+
+def _archived(account_ids, criteria, cursor, limit, rows):
+    # Rows from the archive partitions that could still make this page:
+    # those inside the requested dates and, when the main table already
+    # filled the page, newer than its last row
+    since, until = archive.time_bounds(criteria)
+    if cursor:
+        until = cursor[0] if until is None else min(until, cursor[0])
+    if len(rows) > limit:
+        since = rows[limit].timestamp if since is None else max(since, rows[limit].timestamp)
+    paths = archive.partitions(db.session, since, until)
+    if not paths:
+        return []
+    source = archive.table
+    criteria = archive.retarget(criteria)
+    found = []
+    for path in paths:
+        page_ids = _page_ids(source, account_ids, criteria, limit)
+        with archive.engine_for(path).connect() as conn:
+            found.extend(conn.execute(
+                select(source.c.id, source.c.amount, source.c.transaction_type, source.c.timestamp,
+                       source.c.account_id, source.c.to_account_id)
+                .where(source.c.id.in_(select(page_ids.c.id)))
+                .order_by(source.c.timestamp.desc(), source.c.id.desc())
+                .limit(limit + 1)
+            ).all())
+    numbers = archive.account_numbers(db.session, {row.account_id for row in found})
+    return [PageRow(*row, numbers.get(row.account_id)) for row in found]
+
+def transaction_page(account_ids, criteria=(), cursor=None, limit=PAGE_SIZE):
+    """Return one page of transactions touching account_ids, newest first, and the next cursor.
+
+    Each (account, direction) pair is its own branch so SQLite can walk the
+    (account_id, timestamp) / (to_account_id, timestamp) indexes backwards and
+    stop after limit + 1 rows, keeping page cost independent of history size.
+    Archive partitions are read the same way, and only when the page
+    reaches back into the dates they hold.
+    """
+    if not account_ids:
+        return [], None
+    criteria = list(criteria)
+    paged = criteria + [_keyset(cursor)] if cursor else criteria
+    page_ids = _page_ids(Transaction.__table__, account_ids, paged, limit)
+    # Plain rows with the source account number joined in, so rendering a
+    # page never lazy-loads Transaction.account
+    rows = db.session.execute(
+        select(
+            Transaction.id,
+            Transaction.amount,
+            Transaction.transaction_type,
+            Transaction.timestamp,
+            Transaction.account_id,
+            Transaction.to_account_id,
+            Account.account_number,
+        )
+        .join(Account, Account.id == Transaction.account_id)
+        .where(Transaction.id.in_(select(page_ids.c.id)))
+        .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+        .limit(limit + 1)
+    ).all()
+    archived = _archived(account_ids, paged, cursor, limit, rows)
+    if archived:
+        # A transaction caught mid-move is in both; keep one
+        merged = {row.id: row for row in archived}
+        merged.update((row.id, row) for row in rows)
+        rows = sorted(merged.values(), key=lambda row: (row.timestamp, row.id), reverse=True)[:limit + 1]
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,129 @@
+import time
+from sqlalchemy import and_, exists, func, insert, literal, or_, select, update
+from history import PAGE_SIZE
+from models import db, utcnow, User, Notification, NotificationBroadcast, NotificationCounter
+
+BROADCAST_CHUNK_SIZE = 5000  # Users per broadcast transaction; bounds how long the write lock is held
+BROADCAST_PAUSE = 0.02  # Seconds between chunks, so waiting writers get the lock instead of polling past it
+
+def encode_cursor(notification):
+    return f"{notification.created_at.isoformat()}_{notification.id}"
+
+def _adjust(session, user_id, delta):
+    counter = NotificationCounter.__table__
+    if session.execute(update(counter).where(counter.c.user_id == user_id)
+                       .values(unread=counter.c.unread + delta)).rowcount:
+        return
+    # No counter yet: count once, after the change being recorded is flushed
+    session.add(NotificationCounter(user_id=user_id, unread=session.scalar(
+        select(func.count()).select_from(Notification)
+        .where(Notification.user_id == user_id, Notification.is_read == False, Notification.archived == False)
+    )))
+
+def notify(user_id, message, session=None):
+    """Add a notification and bump the user's unread count; the caller commits."""
+    session = session or db.session
+    notification = Notification(message=message, user_id=user_id, is_read=False, archived=False)
+    session.add(notification)
+    session.flush()
+    _adjust(session, user_id, 1)
+    return notification
+
+def unread_count(user_id, session=None):
+    session = session or db.session
+    return session.scalar(select(NotificationCounter.unread).where(NotificationCounter.user_id == user_id)) or 0
+
+def inbox_page(user_id, archived=False, cursor=None, limit=PAGE_SIZE, session=None):
+    """One page of a user's notifications, newest first, and the next cursor."""
+    session = session or db.session
+    criteria = [Notification.user_id == user_id, Notification.archived == archived]
+    if cursor:
+        created_at, notification_id = cursor
+        criteria.append(and_(Notification.created_at <= created_at,
+                             or_(Notification.created_at < created_at, Notification.id < notification_id)))
+    rows = session.execute(
+        select(Notification.id, Notification.message, Notification.is_read, Notification.created_at)
+        .where(*criteria)
+        .order_by(Notification.created_at.desc(), Notification.id.desc())
+        .limit(limit + 1)
+    ).all()
+    return rows[:limit], encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+
+def _scope(user_id, notification_ids):
+    criteria = [Notification.user_id == user_id, Notification.archived == False]
+    if notification_ids is not None:
+        criteria.append(Notification.id.in_(notification_ids))
+    return criteria
+
+def mark_read(user_id, notification_ids=None, session=None):
+    """Mark the given notifications (all when None) read; returns how many were unread."""
+    session = session or db.session
+    marked = session.execute(
+        update(Notification).where(*_scope(user_id, notification_ids), Notification.is_read == False)
+        .values(is_read=True).execution_options(synchronize_session=False)
+    ).rowcount
+    if marked:
+        _adjust(session, user_id, -marked)
+    return marked
+
+def archive(user_id, notification_ids, session=None):
+    # Archived notifications count as read
+    session = session or db.session
+    mark_read(user_id, notification_ids, session)
+    return session.execute(
+        update(Notification).where(*_scope(user_id, notification_ids))
+        .values(archived=True).execution_options(synchronize_session=False)
+    ).rowcount
+
+def create_broadcast(message, session=None):
+    session = session or db.session
+    broadcast = NotificationBroadcast(message=message, created_at=utcnow())
+    session.add(broadcast)
+    session.commit()
+    return broadcast
+
+def run_broadcast(broadcast_id, chunk_size=BROADCAST_CHUNK_SIZE, pause=BROADCAST_PAUSE, session=None):
+    """Deliver a broadcast to every user, resuming after the last committed chunk.
+
+    Each chunk is a range of user ids: one INSERT ... SELECT writes the
+    notices and one UPDATE bumps the counters, committed together with the
+    progress, so the write lock is held for one chunk at a time and
+    released for pause seconds before the next.
+    """
+    session = session or db.session
+    broadcast = session.get(NotificationBroadcast, broadcast_id)
+    if broadcast.status == 'completed':
+        return broadcast
+    broadcast.status = 'running'
+    session.commit()
+    counter = NotificationCounter.__table__
+    while True:
+        last_id = broadcast.last_user_id
+        upper = session.scalar(select(func.max(User.id)).where(
+            User.id.in_(select(User.id).where(User.id > last_id).order_by(User.id).limit(chunk_size))))
+        if upper is None:
+            break
+        in_chunk = and_(User.id > last_id, User.id <= upper)
+        try:
+            added = session.execute(insert(Notification).from_select(
+                ['message', 'is_read', 'archived', 'user_id', 'broadcast_id', 'created_at'],
+                select(literal(broadcast.message), literal(False), literal(False), User.id,
+                       literal(broadcast.id), literal(broadcast.created_at)).where(in_chunk),
+            )).rowcount
+            session.execute(insert(counter).from_select(
+                ['user_id', 'unread'],
+                select(User.id, literal(0)).where(in_chunk, ~exists().where(counter.c.user_id == User.id)),
+            ))
+            session.execute(update(counter).where(counter.c.user_id > last_id, counter.c.user_id <= upper)
+                            .values(unread=counter.c.unread + 1))
+            broadcast.last_user_id = upper
+            broadcast.recipients += added
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        time.sleep(pause)
+    broadcast.status = 'completed'
+    broadcast.completed_at = utcnow()
+    session.commit()
+    return broadcast
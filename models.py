@@ -1,18 +1,46 @@
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
+from hashing import HASH_METHOD
 
 db = SQLAlchemy()
 
+def utcnow():
+    # UTC like CURRENT_TIMESTAMP, but stored in SQLAlchemy's own
+    # 'YYYY-MM-DD HH:MM:SS.ffffff' format, which keyset cursors compare against
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class Money(db.TypeDecorator):
+    # INR amounts stored as integer paise and surfaced as Decimal rupees, so
+    # comparisons are exact and SUM() over a column is a native integer sum
+    impl = db.BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        value = Decimal(str(value))
+        if not value.is_finite():
+            raise ValueError(f"Money amounts must be finite, not {value}")
+        return int((value * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return Decimal(int(value)).scaleb(-2)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
     email = db.Column(db.String(150), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     profile_image = db.Column(db.String(255), nullable=True)  # Path to profile image
     accounts = db.relationship('Account', backref='user', lazy=True)
 
+    # Hashes inline; web requests go through hashing.py's process pool instead
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=HASH_METHOD)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -20,14 +48,14 @@ class User(db.Model):
 class Account(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     account_number = db.Column(db.String(20), unique=True, nullable=False)
-    balance = db.Column(db.Float, default=0.0)  # Balance in INR
+    balance = db.Column(Money, default=0)  # Balance in INR
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, nullable=False)  # Amount in INR
-    transaction_type = db.Column(db.String(50), nullable=False)  # deposit, withdraw, transfer
-    timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
+    amount = db.Column(Money, nullable=False)  # Amount in INR
+    transaction_type = db.Column(db.String(50), nullable=False)  # deposit, withdraw, transfer, interest, bill_payment, card_purchase
+    timestamp = db.Column(db.DateTime, default=utcnow)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     to_account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)  # for transfers
 
@@ -35,9 +63,15 @@ class Transaction(db.Model):
     account = db.relationship('Account', foreign_keys=[account_id], backref='transactions_from')
     to_account = db.relationship('Account', foreign_keys=[to_account_id], backref='transactions_to')
 
+    # Back the keyset-paginated history pages, one index per direction
+    __table_args__ = (
+        db.Index('ix_transaction_account_id_timestamp', 'account_id', 'timestamp'),
+        db.Index('ix_transaction_to_account_id_timestamp', 'to_account_id', 'timestamp'),
+    )
+
 class Loan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, nullable=False)  # Amount in INR
+    amount = db.Column(Money, nullable=False)  # Amount in INR
     interest_rate = db.Column(db.Float, default=8.5)  # SBI loan interest rate
     term_months = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected, paid
@@ -50,36 +84,69 @@ class CreditCard(db.Model):
     card_number = db.Column(db.String(20), unique=True, nullable=False)
     expiry_date = db.Column(db.String(10), nullable=False)  # MM/YY
     cvv = db.Column(db.String(4), nullable=False)
-    limit = db.Column(db.Float, default=50000.0)  # SBI credit limit in INR
-    balance = db.Column(db.Float, default=0.0)  # Balance in INR
+    limit = db.Column(Money, default=50000)  # SBI credit limit in INR
+    balance = db.Column(Money, default=0)  # Balance in INR
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
 
+class CardAuthorization(db.Model):
+    # A captured hold once settled into the card balance; id is the authorizer's hold id
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    card_id = db.Column(db.Integer, db.ForeignKey('credit_card.id'), nullable=False, index=True)
+    amount = db.Column(Money, nullable=False)
+    authorized_at = db.Column(db.DateTime, nullable=False)
+    settled_at = db.Column(db.DateTime, nullable=False)
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     message = db.Column(db.String(500), nullable=False)
     is_read = db.Column(db.Boolean, default=False)
+    archived = db.Column(db.Boolean, default=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('notification_broadcast.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=utcnow)
+
+    __table_args__ = (
+        # Inbox pages walk this backwards from the newest notification
+        db.Index('ix_notification_user_id_archived_created_at', 'user_id', 'archived', 'created_at'),
+    )
+
+class NotificationCounter(db.Model):
+    # Unread notifications per user, kept in step with every write to Notification
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+
+class NotificationBroadcast(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    message = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed
+    last_user_id = db.Column(db.Integer, default=0)  # Users up to here have the notice; resume point
+    recipients = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())  # Also the notices' created_at
+    completed_at = db.Column(db.DateTime, nullable=True)
 
 class FixedDeposit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, nullable=False)  # Amount in INR
+    amount = db.Column(Money, nullable=False)  # Amount in INR
     interest_rate = db.Column(db.Float, default=6.5)  # SBI FD interest rate
     term_months = db.Column(db.Integer, nullable=False)
     maturity_date = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), default='active')  # active, matured
+    accrued_interest = db.Column(Money, default=0)  # As of the last accrual run
+    maturity_amount = db.Column(Money, nullable=True)  # Set by the first accrual run
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
 class RecurringDeposit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    monthly_amount = db.Column(db.Float, nullable=False)  # Monthly amount in INR
+    monthly_amount = db.Column(Money, nullable=False)  # Monthly amount in INR
     interest_rate = db.Column(db.Float, default=5.5)  # SBI RD interest rate
     term_months = db.Column(db.Integer, nullable=False)
     maturity_date = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), default='active')  # active, matured
+    accrued_interest = db.Column(Money, default=0)  # As of the last accrual run
+    maturity_amount = db.Column(Money, nullable=True)  # Set by the first accrual run
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
@@ -88,18 +155,24 @@ class BillPayment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     bill_type = db.Column(db.String(50), nullable=False)  # electricity, water, gas, phone, etc.
     bill_number = db.Column(db.String(50), nullable=False)
-    amount = db.Column(db.Float, nullable=False)  # Amount in INR
+    amount = db.Column(Money, nullable=False)  # Amount in INR
     due_date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, paid
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    paid_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # The auto-debit run walks pending bills in due date order
+        db.Index('ix_bill_payment_status_due_date', 'status', 'due_date'),
+    )
 
 class Insurance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50), nullable=False)  # life, health, vehicle
-    coverage_amount = db.Column(db.Float, nullable=False)  # Coverage in INR
-    premium_amount = db.Column(db.Float, nullable=False)  # Monthly premium in INR
+    coverage_amount = db.Column(Money, nullable=False)  # Coverage in INR
+    premium_amount = db.Column(Money, nullable=False)  # Monthly premium in INR
     term_years = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(20), default='active')  # active, expired, claimed
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -109,9 +182,11 @@ class Insurance(db.Model):
 class Investment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50), nullable=False)  # mutual_fund, stock, bond
-    amount = db.Column(db.Float, nullable=False)  # Investment amount in INR
-    current_value = db.Column(db.Float, nullable=False)  # Current value in INR
-    returns = db.Column(db.Float, default=0.0)  # Returns in INR
+    amount = db.Column(Money, nullable=False)  # Investment amount in INR
+    current_value = db.Column(Money, nullable=False)  # Current value in INR
+    returns = db.Column(Money, default=0)  # Returns in INR
+    instrument = db.Column(db.String(50), nullable=True)  # Ticker or scheme code; priced by type when empty
+    units = db.Column(db.Float, nullable=True)  # Empty until the instrument has a price
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
@@ -119,7 +194,7 @@ class Investment(db.Model):
 class Cheque(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     cheque_number = db.Column(db.String(20), unique=True, nullable=False)
-    amount = db.Column(db.Float, nullable=False)  # Amount in INR
+    amount = db.Column(Money, nullable=False)  # Amount in INR
     payee = db.Column(db.String(100), nullable=False)
     status = db.Column(db.String(20), default='issued')  # issued, cleared, bounced
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -131,9 +206,135 @@ class AccountStatement(db.Model):
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     file_path = db.Column(db.String(255), nullable=False)  # Path to generated statement file
+    status = db.Column(db.String(20), default='pending')  # pending, rendering, ready, failed
+    claimed_at = db.Column(db.DateTime)  # When the current render was queued; its lease runs from here
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
+class BulkTransferJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(255), nullable=False)  # Uploaded payment file
+    file_format = db.Column(db.String(10), nullable=False)  # csv, jsonl
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed
+    rows_committed = db.Column(db.Integer, default=0)  # Data rows already applied; resume point
+    rows_posted = db.Column(db.Integer, default=0)
+    rows_rejected = db.Column(db.Integer, default=0)
+    total_amount = db.Column(Money, default=0)  # Total posted in INR
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)  # Source account
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+class BulkTransferRow(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('bulk_transfer_job.id'), nullable=False)
+    line = db.Column(db.Integer, nullable=False)  # 1-based data row in the uploaded file
+    to_account_number = db.Column(db.String(20))
+    amount = db.Column(Money)  # Amount in INR
+    status = db.Column(db.String(20), nullable=False)  # posted, rejected
+    message = db.Column(db.String(255))
+
+    __table_args__ = (
+        db.Index('ix_bulk_transfer_row_job_id_line', 'job_id', 'line'),
+    )
+
+class DailyBalance(db.Model):
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    closing_balance = db.Column(Money, nullable=False, default=0)  # End-of-day balance in INR
+    debit_total = db.Column(Money, nullable=False, default=0)
+    credit_total = db.Column(Money, nullable=False, default=0)
+    txn_count = db.Column(db.Integer, nullable=False, default=0)
+
+class Watermark(db.Model):
+    name = db.Column(db.String(50), primary_key=True)  # Job that owns the watermark
+    last_transaction_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+class ArchivePartition(db.Model):
+    # One SQLite file of archived transactions per calendar year; see archive.py
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), unique=True, nullable=False)
+    first_timestamp = db.Column(db.DateTime, nullable=False)  # Oldest and newest transaction moved into the file
+    last_timestamp = db.Column(db.DateTime, nullable=False)
+    transactions = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+class OutboundMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)  # email, sms
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    attachment_path = db.Column(db.String(255), nullable=True)
+    attachment_name = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=db.func.current_timestamp())  # Also the lease expiry while sending
+    claimed_by = db.Column(db.String(36), nullable=True)  # Dispatcher batch holding the message
+    last_error = db.Column(db.String(500), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_outbound_message_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
 
+class DepositAccrualRun(db.Model):
+    run_date = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), default='running')  # running, completed
+    deposits_processed = db.Column(db.Integer, default=0)
+    deposits_matured = db.Column(db.Integer, default=0)
+    interest_credited = db.Column(Money, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    completed_at = db.Column(db.DateTime, nullable=True)
 
+class BillPaymentRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    run_date = db.Column(db.Date, nullable=False)
+    shard = db.Column(db.String(20), nullable=False, default='0/1')  # k/n: the k-th of n account id ranges
+    status = db.Column(db.String(20), default='running')  # running, completed
+    bills_due = db.Column(db.Integer, default=0)
+    bills_paid = db.Column(db.Integer, default=0)
+    bills_insufficient = db.Column(db.Integer, default=0)  # Left pending for a later run
+    accounts_debited = db.Column(db.Integer, default=0)
+    amount_paid = db.Column(Money, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('run_date', 'shard', name='uq_bill_payment_run_run_date_shard'),
+    )
+
+class NumberSequence(db.Model):
+    name = db.Column(db.String(50), primary_key=True)  # account, card, cheque:<account id>
+    next_value = db.Column(db.BigInteger, nullable=False)  # First value not yet reserved
+
+class InstrumentPrice(db.Model):
+    instrument = db.Column(db.String(50), primary_key=True)
+    price = db.Column(db.Float, nullable=False)  # Latest price or NAV per unit in INR
+    as_of = db.Column(db.Date, nullable=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('revaluation_run.id'), nullable=True)
+
+class RevaluationRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    price_file = db.Column(db.String(255), nullable=False)
+    as_of = db.Column(db.Date, nullable=True)
+    status = db.Column(db.String(20), default='running')  # running, completed, failed
+    prices_loaded = db.Column(db.Integer, default=0)
+    holdings_processed = db.Column(db.Integer, default=0)
+    holdings_changed = db.Column(db.Integer, default=0)
+    holdings_unpriced = db.Column(db.Integer, default=0)
+    value_before = db.Column(Money, default=0)
+    value_after = db.Column(Money, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+class RevaluationChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('revaluation_run.id'), nullable=False, index=True)
+    investment_id = db.Column(db.Integer, db.ForeignKey('investment.id'), nullable=False)
+    old_value = db.Column(Money, nullable=False)
+    new_value = db.Column(Money, nullable=False)
@@ -0,0 +1,194 @@
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import or_, select, update
+from models import db, utcnow, OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+BACKOFF = timedelta(seconds=30)  # Doubled after every failed attempt
+LEASE = timedelta(minutes=5)  # A claimed batch not finished by then is retried
+POLL_INTERVAL = 2.0  # seconds between dispatcher passes when idle
+
+class SMTPTransport:
+    # One SMTP connection per dispatched batch
+    def __init__(self, host='localhost', port=25, username=None, password=None, use_tls=False, sender=None, timeout=30):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.username, self.password, self.use_tls = username, password, use_tls
+        self.sender = sender or username
+        self.connection = None
+
+    def __enter__(self):
+        import smtplib
+        self.connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            self.connection.starttls()
+        if self.username:
+            self.connection.login(self.username, self.password)
+        return self
+
+    def __exit__(self, *exc_info):
+        import smtplib
+        try:
+            self.connection.quit()
+        except smtplib.SMTPException:
+            self.connection.close()
+        self.connection = None
+
+    def send(self, message):
+        from email.message import EmailMessage
+        email = EmailMessage()
+        email['From'] = self.sender
+        email['To'] = message.recipient
+        email['Subject'] = message.subject or ''
+        email.set_content(message.body)
+        if message.attachment_path:
+            with open(message.attachment_path, 'rb') as attachment:
+                email.add_attachment(attachment.read(), maintype='application', subtype='pdf',
+                                     filename=message.attachment_name or 'attachment.pdf')
+        self.connection.send_message(email)
+
+class TwilioSMSTransport:
+    def __init__(self, account_sid=None, auth_token=None, from_number=None):
+        self.account_sid, self.auth_token, self.from_number = account_sid, auth_token, from_number
+        self.client = None
+
+    def __enter__(self):
+        from twilio.rest import Client
+        self.client = Client(self.account_sid, self.auth_token)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.client = None
+
+    def send(self, message):
+        self.client.messages.create(body=message.body, from_=self.from_number, to=message.recipient)
+
+class MemoryTransport:
+    # Records messages instead of delivering them; stands in for SMTP or SMS locally
+    sent = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def send(self, message):
+        self.sent.append((message.channel, message.recipient, message.subject, message.body, message.attachment_name))
+
+def build_transport(config, channel):
+    name = config.get('OUTBOX_EMAIL_TRANSPORT' if channel == 'email' else 'OUTBOX_SMS_TRANSPORT')
+    if name == 'memory':
+        return MemoryTransport()
+    if channel == 'email':
+        return SMTPTransport(
+            host=config.get('MAIL_SERVER', 'localhost'), port=config.get('MAIL_PORT', 25),
+            username=config.get('MAIL_USERNAME'), password=config.get('MAIL_PASSWORD'),
+            use_tls=config.get('MAIL_USE_TLS', False), sender=config.get('MAIL_DEFAULT_SENDER'),
+        )
+    return TwilioSMSTransport(
+        account_sid=config.get('TWILIO_ACCOUNT_SID'), auth_token=config.get('TWILIO_AUTH_TOKEN'),
+        from_number=config.get('TWILIO_PHONE_NUMBER'),
+    )
+
+def enqueue(channel, recipient, body, subject=None, attachment_path=None, attachment_name=None, user_id=None):
+    """Add a message to the outbox; it is sent once the caller commits."""
+    message = OutboundMessage(channel=channel, recipient=recipient, subject=subject, body=body,
+                              attachment_path=attachment_path, attachment_name=attachment_name,
+                              user_id=user_id, next_attempt_at=utcnow())
+    db.session.add(message)
+    return message
+
+def _claim(session, batch_size):
+    now = utcnow()
+    due = (
+        select(OutboundMessage.id)
+        .where(or_(OutboundMessage.status == 'pending', OutboundMessage.status == 'sending'),
+               OutboundMessage.next_attempt_at <= now)
+        .order_by(OutboundMessage.next_attempt_at)
+        .limit(batch_size)
+    )
+    token = str(uuid.uuid4())
+    # Claiming by token lets several dispatchers run without sending twice
+    session.execute(
+        update(OutboundMessage)
+        .where(OutboundMessage.id.in_(due.scalar_subquery()), OutboundMessage.next_attempt_at <= now,
+               or_(OutboundMessage.status == 'pending', OutboundMessage.status == 'sending'))
+        .values(status='sending', claimed_by=token, next_attempt_at=now + LEASE)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return session.scalars(select(OutboundMessage).where(OutboundMessage.claimed_by == token,
+                                                         OutboundMessage.status == 'sending')).all()
+
+def _failed(message, error):
+    message.attempts += 1
+    message.last_error = str(error)[:500]
+    if message.attempts >= MAX_ATTEMPTS:
+        message.status = 'failed'
+    else:
+        message.status = 'pending'
+        message.next_attempt_at = utcnow() + BACKOFF * 2 ** (message.attempts - 1)
+    message.claimed_by = None
+
+def dispatch_once(config, session=None, batch_size=BATCH_SIZE):
+    """Send one batch of due messages; returns (sent, failed) counts."""
+    session = session or db.session
+    messages = _claim(session, batch_size)
+    by_channel = defaultdict(list)
+    for message in messages:
+        by_channel[message.channel].append(message)
+    sent = failed = 0
+    for channel, batch in by_channel.items():
+        try:
+            with build_transport(config, channel) as transport:
+                for message in batch:
+                    try:
+                        transport.send(message)
+                    except Exception as exc:
+                        logger.warning('Outbound message %s failed: %s', message.id, exc)
+                        _failed(message, exc)
+                        failed += 1
+                    else:
+                        message.status = 'sent'
+                        message.sent_at = utcnow()
+                        message.claimed_by = None
+                        sent += 1
+        except Exception as exc:
+            # Could not open the transport: every unsent message in the batch retries
+            logger.warning('Outbound %s transport failed: %s', channel, exc)
+            for message in batch:
+                if message.status == 'sending':
+                    _failed(message, exc)
+                    failed += 1
+        session.commit()
+    return sent, failed
+
+def run_dispatcher(app, stop_event=None, poll_interval=POLL_INTERVAL):
+    # Loop until stop_event is set, sleeping only when there was nothing to send
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        with app.app_context():
+            try:
+                sent, failed = dispatch_once(app.config)
+            except Exception:
+                logger.exception('Outbox dispatch failed')
+                db.session.rollback()
+                sent = failed = 0
+            finally:
+                db.session.remove()
+        if not sent and not failed:
+            stop_event.wait(poll_interval)
+
+def start_dispatcher(app, poll_interval=POLL_INTERVAL):
+    """Run the dispatcher on a daemon thread in this process."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=run_dispatcher, args=(app, stop_event, poll_interval),
+                              name='outbox-dispatcher', daemon=True)
+    thread.start()
+    return stop_event
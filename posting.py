@@ -0,0 +1,112 @@
+import random
+import time
+from decimal import Decimal
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from models import db, Account, Transaction
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 0.02  # seconds, doubled on every retry
+
+_committer = None  # group_commit.GroupCommitter taking postings made without a session
+
+def use_group_commit(committer):
+    global _committer
+    _committer = committer
+
+class PostingError(Exception):
+    pass
+
+class InsufficientFunds(PostingError):
+    pass
+
+def is_retryable(exc):
+    # SQLite busy/locked, PostgreSQL deadlock/serialization, MySQL deadlock/lock wait
+    code = getattr(exc.orig, 'pgcode', None) or (getattr(exc.orig, 'args', None) or [None])[0]
+    if code in ('40P01', '40001', 1213, 1205):
+        return True
+    message = str(exc.orig).lower()
+    return 'locked' in message or 'busy' in message or 'deadlock' in message
+
+def _check_amount(amount):
+    if amount is None or not Decimal(amount).is_finite() or amount <= 0:
+        raise PostingError('Amount must be positive')
+
+def _owned(account_id, user_id):
+    # Ownership is checked by the posting statement itself, not a cached
+    # lookup, so an account deleted or reassigned since cannot be posted to
+    criteria = [Account.id == account_id]
+    if user_id is not None:
+        criteria.append(Account.user_id == user_id)
+    return criteria
+
+def credit(session, account_id, amount, user_id=None):
+    result = session.execute(
+        update(Account)
+        .where(*_owned(account_id, user_id))
+        .values(balance=Account.balance + amount)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise PostingError('Invalid account')
+
+def debit(session, account_id, amount, user_id=None):
+    # The balance check and the write are one statement, so concurrent
+    # workers can never both spend the same funds
+    result = session.execute(
+        update(Account)
+        .where(*_owned(account_id, user_id), Account.balance >= amount)
+        .values(balance=Account.balance - amount)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise InsufficientFunds('Invalid account or insufficient funds')
+
+def apply_deposit(session, account_id, amount, user_id=None):
+    _check_amount(amount)
+    credit(session, account_id, amount, user_id)
+    session.add(Transaction(amount=amount, transaction_type='deposit', account_id=account_id))
+
+def apply_withdrawal(session, account_id, amount, user_id=None):
+    _check_amount(amount)
+    debit(session, account_id, amount, user_id)
+    session.add(Transaction(amount=amount, transaction_type='withdraw', account_id=account_id))
+
+def apply_transfer(session, from_account_id, to_account_id, amount, user_id=None):
+    _check_amount(amount)
+    if from_account_id == to_account_id:
+        raise PostingError('Cannot transfer to the same account')
+    # Always touch the lower account id first so two opposing transfers
+    # take their row locks in the same order and cannot deadlock. Only the
+    # source has to belong to user_id
+    legs = sorted([(from_account_id, debit, user_id), (to_account_id, credit, None)], key=lambda leg: leg[0])
+    for account_id, apply_leg, owner_id in legs:
+        apply_leg(session, account_id, amount, owner_id)
+    session.add(Transaction(amount=amount, transaction_type='transfer', account_id=from_account_id, to_account_id=to_account_id))
+
+def _post(apply, *args, session=None):
+    if session is None and _committer is not None:
+        return _committer.submit(apply, *args)
+    session = session or db.session
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            apply(session, *args)
+            session.commit()
+            return
+        except PostingError:
+            session.rollback()
+            raise
+        except OperationalError as exc:
+            session.rollback()
+            if attempt == MAX_ATTEMPTS or not is_retryable(exc):
+                raise
+            time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+def post_deposit(account_id, amount, session=None, user_id=None):
+    _post(apply_deposit, account_id, amount, user_id, session=session)
+
+def post_withdrawal(account_id, amount, session=None, user_id=None):
+    _post(apply_withdrawal, account_id, amount, user_id, session=session)
+
+def post_transfer(from_account_id, to_account_id, amount, session=None, user_id=None):
+    _post(apply_transfer, from_account_id, to_account_id, amount, user_id, session=session)
@@ -0,0 +1,183 @@
+import csv
+from decimal import Decimal
+import numpy as np
+from sqlalchemy import BigInteger, bindparam, delete, func, insert, select, type_coerce, update
+from models import db, utcnow, InstrumentPrice, Investment, RevaluationChange, RevaluationRun
+
+CHUNK_SIZE = 50000  # Holdings loaded, revalued and written per database transaction
+PRICE_BATCH = 10000  # Price file rows read at a time
+
+def _csv_batches(path, batch_size):
+    with open(path, newline='') as handle:
+        batch = []
+        for row in csv.DictReader(handle):
+            batch.append((row['instrument'], row.get('price') or row.get('nav')))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def _parquet_batches(path, batch_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Reading Parquet price files requires pyarrow')
+    parquet = pq.ParquetFile(path)
+    column = 'price' if 'price' in parquet.schema_arrow.names else 'nav'
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=['instrument', column]):
+        yield zip(batch.column('instrument').to_pylist(), batch.column(column).to_pylist())
+
+def load_prices(path, batch_size=PRICE_BATCH):
+    """Instrument codes and prices from a CSV or Parquet file, as sorted arrays.
+
+    The file needs an instrument column and a price (or nav) column; the
+    instrument may also be an investment type, which prices every holding
+    of that type with no instrument of its own. Later rows win.
+    """
+    reader = _parquet_batches if path.endswith('.parquet') else _csv_batches
+    prices = {}
+    for batch in reader(path, batch_size):
+        for instrument, price in batch:
+            if instrument and price not in (None, ''):
+                prices[instrument.strip()] = float(price)
+    instruments = np.array(sorted(prices), dtype=str)
+    return instruments, np.array([prices[i] for i in instruments], dtype=np.float64)
+
+def _load(session, last_id, chunk_size):
+    # Holdings bought before their instrument had a price, and legacy ones, have no units yet
+    rows = session.execute(
+        select(Investment.id, Investment.user_id, func.coalesce(Investment.instrument, Investment.type), Investment.units,
+               type_coerce(Investment.amount, BigInteger), type_coerce(Investment.current_value, BigInteger))
+        .where(Investment.id > last_id)
+        .order_by(Investment.id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        return None
+    ids, user_ids, instruments, units, amounts, values = zip(*rows)
+    return dict(
+        id=np.array(ids, dtype=np.int64), user_id=np.array(user_ids, dtype=np.int64),
+        instrument=np.array(instruments, dtype=str),
+        units=np.array([np.nan if u is None else u for u in units], dtype=np.float64), amount=np.array(amounts, dtype=np.int64),
+        value=np.array(values, dtype=np.int64),
+    )
+
+def _revalue(chunk, instruments, prices):
+    none = np.zeros(len(chunk['id']), dtype=bool)
+    if not len(instruments):
+        return dict(value=chunk['value'], units=chunk['units'], priced=none, unitised=none, changed=none)
+    # Sorted-array join: each holding's instrument found by binary search
+    index = np.minimum(np.searchsorted(instruments, chunk['instrument']), len(instruments) - 1)
+    priced = instruments[index] == chunk['instrument']
+    # Holdings without units buy them now at this price, so they start at no gain
+    unitised = priced & np.isnan(chunk['units']) & (prices[index] > 0)
+    units = np.where(unitised, chunk['amount'] / 100 / np.where(unitised, prices[index], 1), chunk['units'])
+    priced &= ~np.isnan(units)
+    value = np.where(priced, np.rint(units * prices[index] * 100), chunk['value']).astype(np.int64)
+    return dict(value=value, units=units, priced=priced, unitised=unitised, changed=priced & (value != chunk['value']))
+
+def _write(session, run, chunk, result):
+    table = Investment.__table__
+    unitised = result['unitised']
+    if unitised.any():
+        session.execute(
+            update(table).where(table.c.id == bindparam('investment_id')).values({table.c.units: bindparam('new_units')}),
+            [dict(investment_id=int(i), new_units=float(u)) for i, u in zip(chunk['id'][unitised], result['units'][unitised])],
+        )
+    changed = result['changed']
+    ids, old, new = chunk['id'][changed], chunk['value'][changed], result['value'][changed]
+    if not len(ids):
+        return
+    session.execute(
+        update(table)
+        .where(table.c.id == bindparam('investment_id'))
+        .values({table.c.current_value: bindparam('new_value', type_=BigInteger),
+                 table.c.returns: bindparam('new_returns', type_=BigInteger)}),
+        [dict(investment_id=int(i), new_value=int(v), new_returns=int(r))
+         for i, v, r in zip(ids, new, new - chunk['amount'][changed])],
+    )
+    changes = RevaluationChange.__table__
+    session.execute(
+        insert(changes).values({changes.c.run_id: run.id, changes.c.investment_id: bindparam('investment_id'),
+                                changes.c.old_value: bindparam('old_paise', type_=BigInteger),
+                                changes.c.new_value: bindparam('new_paise', type_=BigInteger)}),
+        [dict(investment_id=int(i), old_paise=int(o), new_paise=int(n)) for i, o, n in zip(ids, old, new)],
+    )
+
+def _save_prices(session, run, instruments, prices, as_of, batch_size=PRICE_BATCH):
+    # Latest known prices, used to convert new investments into units
+    table = InstrumentPrice.__table__
+    for start in range(0, len(instruments), batch_size):
+        names = [str(i) for i in instruments[start:start + batch_size]]
+        session.execute(delete(table).where(table.c.instrument.in_(names)))
+        session.execute(insert(table), [
+            dict(instrument=name, price=float(price), as_of=as_of, run_id=run.id)
+            for name, price in zip(names, prices[start:start + batch_size])
+        ])
+
+def run_revaluation(price_file, as_of=None, dry_run=False, chunk_size=CHUNK_SIZE, session=None, invalidate=None):
+    """Mark every investment to market from a price file.
+
+    current_value becomes units * price and returns the gain over the amount
+    invested. A holding with no units yet buys them with its amount at this
+    price. Only holdings whose value moved are written, each with a
+    RevaluationChange row under the run, and each chunk commits on its own,
+    so repeating a run with the same file changes nothing. Holdings whose
+    instrument is not in the file keep their value and are counted as
+    unpriced. With dry_run nothing is written. invalidate, if given, is
+    called with the owners of the holdings each chunk changed.
+    """
+    session = session or db.session
+    instruments, prices = load_prices(price_file)
+    run = None
+    if not dry_run:
+        run = RevaluationRun(price_file=price_file, as_of=as_of, prices_loaded=len(instruments),
+                             holdings_processed=0, holdings_changed=0, holdings_unpriced=0, value_before=0, value_after=0)
+        session.add(run)
+        session.commit()
+    report = dict(run_id=run.id if run else None, dry_run=dry_run, prices_loaded=len(instruments), processed=0,
+                  changed=0, unpriced=0, value_before=Decimal('0.00'), value_after=Decimal('0.00'))
+    try:
+        last_id = 0
+        while True:
+            chunk = _load(session, last_id, chunk_size)
+            if chunk is None:
+                break
+            last_id = int(chunk['id'][-1])
+            result = _revalue(chunk, instruments, prices)
+            counts = dict(processed=len(chunk['id']), changed=int(result['changed'].sum()),
+                          unpriced=int((~result['priced']).sum()),
+                          value_before=Decimal(int(chunk['value'].sum())).scaleb(-2),
+                          value_after=Decimal(int(result['value'].sum())).scaleb(-2))
+            if not dry_run:
+                _write(session, run, chunk, result)
+                run.holdings_processed += counts['processed']
+                run.holdings_changed += counts['changed']
+                run.holdings_unpriced += counts['unpriced']
+                run.value_before += counts['value_before']
+                run.value_after += counts['value_after']
+                session.commit()
+                if invalidate is not None:
+                    invalidate(*np.unique(chunk['user_id'][result['changed']]).tolist())
+            for key, value in counts.items():
+                report[key] += value
+        if not dry_run:
+            _save_prices(session, run, instruments, prices, as_of)
+            run.status = 'completed'
+            run.completed_at = utcnow()
+            session.commit()
+    except Exception:
+        session.rollback()
+        if run is not None:
+            run.status = 'failed'
+            session.commit()
+        raise
+    return report
+
+def units_for(instrument, amount, session=None):
+    # Units bought for amount at the instrument's last known price; None until
+    # it has one, and the first revaluation that prices it fills them in
+    session = session or db.session
+    price = session.scalar(select(InstrumentPrice.price).where(InstrumentPrice.instrument == instrument))
+    return float(amount) / price if price else None
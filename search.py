@@ -0,0 +1,154 @@
+import re
+from sqlalchemy import DDL, event, func, select, text
+import archive
+from models import db, Account, BillPayment, Cheque, Transaction
+
+KINDS = ('transaction', 'cheque', 'bill', 'account')
+LIMIT = 50
+REBUILD_BATCH = 100000  # Source ids indexed per transaction by rebuild()
+TERM = re.compile(r'(\w+)(\*?)')
+PREFIX_INDEX = 3  # Longest prefix FTS5 keeps its own index for
+
+# One FTS5 table over every searchable row. The rowid is
+# user_id << 36 | source id << 2 | kind, so each user's entries sit in one
+# rowid range that FTS5 seeks straight to; a transfer between two users is
+# indexed once for each
+CREATE_TABLE = "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(body, happened_at UNINDEXED, prefix='2 3')"
+USER_SHIFT = 36
+
+# (kind, source model, owner column, SELECT of rowid, body, happened_at over the row aliased new)
+SOURCES = (
+    ('transaction', Transaction, None,
+     "SELECT (owner.user_id << 36) | (new.id << 2), new.transaction_type || ' ' || printf('%.2f', new.amount / 100.0)"
+     " || ' ' || a.account_number || coalesce(' ' || t.account_number, ''), new.timestamp"
+     " FROM {rows} JOIN account AS a ON a.id = new.account_id LEFT JOIN account AS t ON t.id = new.to_account_id"
+     " JOIN account AS owner ON owner.id IN (new.account_id, new.to_account_id)"
+     " WHERE (owner.id = new.account_id OR owner.user_id != a.user_id)"),
+    ('cheque', Cheque, 'user_id',
+     "SELECT (new.user_id << 36) | (new.id << 2) | 1,"
+     " new.cheque_number || ' ' || new.payee || ' ' || printf('%.2f', new.amount / 100.0), new.created_at"
+     " FROM {rows} WHERE 1"),
+    ('bill', BillPayment, 'user_id',
+     "SELECT (new.user_id << 36) | (new.id << 2) | 2,"
+     " new.bill_type || ' ' || new.bill_number || ' ' || printf('%.2f', new.amount / 100.0), new.due_date"
+     " FROM {rows} WHERE 1"),
+    ('account', Account, 'user_id',
+     "SELECT (new.user_id << 36) | (new.id << 2) | 3, new.account_number, NULL FROM {rows} WHERE 1"),
+)
+
+COLUMNS = 'search_index(rowid, body, happened_at)'
+IN_TRIGGER = '(SELECT 1) AS one'  # new is the inserted row itself; this gives the joins something to hang off
+
+def _triggers():
+    # Kept current by the database itself, so bulk inserts that bypass the
+    # ORM are indexed too. Transactions are never removed: the ledger keeps them
+    statements = []
+    for position, (kind, model, owner, select_sql) in enumerate(SOURCES):
+        table = model.__tablename__
+        statements.append(f"CREATE TRIGGER IF NOT EXISTS search_{kind}_insert AFTER INSERT ON \"{table}\" BEGIN "
+                          f"INSERT INTO {COLUMNS} {select_sql.format(rows=IN_TRIGGER)}; END")
+        if owner is not None:
+            statements.append(f"CREATE TRIGGER IF NOT EXISTS search_{kind}_delete AFTER DELETE ON \"{table}\" BEGIN "
+                              f"DELETE FROM search_index WHERE rowid = (old.{owner} << 36) | (old.id << 2) | {position}; END")
+    # Cheque books are issued blank and filled in when a cheque is written
+    statements.append(f"CREATE TRIGGER IF NOT EXISTS search_cheque_update AFTER UPDATE OF payee, amount ON cheque BEGIN "
+                      f"DELETE FROM search_index WHERE rowid = (old.user_id << 36) | (old.id << 2) | 1; "
+                      f"INSERT INTO {COLUMNS} {SOURCES[1][3].format(rows=IN_TRIGGER)}; END")
+    return statements
+
+# create_all() builds the index with the tables; migrations carry their own copy
+for _statement in [CREATE_TABLE] + _triggers():
+    # DDL %-formats its text, and the triggers use printf('%.2f')
+    event.listen(db.metadata, 'after_create', DDL(_statement.replace('%', '%%')).execute_if(dialect='sqlite'))
+
+def rebuild(session=None, batch_size=REBUILD_BATCH):
+    """Re-index every source row from scratch, batch_size ids per commit; returns rows indexed."""
+    session = session or db.session
+    session.execute(text('DELETE FROM search_index'))
+    session.commit()
+    indexed = 0
+    for _, model, _, select_sql in SOURCES:
+        top = session.scalar(select(func.max(model.id))) or 0
+        rows = f"\"{model.__tablename__}\" AS new"
+        for start in range(0, top, batch_size):
+            indexed += session.execute(
+                text(f"INSERT INTO {COLUMNS} {select_sql.format(rows=rows)} AND new.id > :lo AND new.id <= :hi"),
+                dict(lo=start, hi=start + batch_size),
+            ).rowcount
+            session.commit()
+    # Archived transactions keep their entries; put them back from each partition
+    for path in archive.partitions(session):
+        indexed += _rebuild_archived(session, path, batch_size)
+    # Merge the b-tree segments the batches left behind
+    session.execute(text("INSERT INTO search_index(search_index) VALUES ('optimize')"))
+    session.commit()
+    return indexed
+
+def _rebuild_archived(session, path, batch_size):
+    # Attached on one connection of its own, so the main database's account
+    # numbers join straight onto the partition's rows
+    indexed = 0
+    select_sql = SOURCES[0][3].format(rows='archived."transaction" AS new')
+    with session.get_bind().connect() as conn:
+        conn.execute(text('ATTACH DATABASE :path AS archived'), dict(path=path))
+        try:
+            top = conn.scalar(text('SELECT MAX(id) FROM archived."transaction"')) or 0
+            for start in range(0, top, batch_size):
+                indexed += conn.execute(
+                    text(f"INSERT INTO main.{COLUMNS} {select_sql} AND new.id > :lo AND new.id <= :hi"),
+                    dict(lo=start, hi=start + batch_size),
+                ).rowcount
+                conn.commit()
+        finally:
+            conn.rollback()
+            conn.execute(text('DETACH DATABASE archived'))
+    return indexed
+
+def parse(query):
+    """What a user typed as (FTS5 MATCH expression, [substrings to check]), or None if it has no words.
+
+    Every word must appear as a whole word, except that one ending in *,
+    and the last one (for search as you type), matches as a prefix.
+    Prefixes go through FTS5's index of their first three characters and
+    anything longer is then checked against the text.
+    """
+    terms = TERM.findall((query or '').lower())
+    if not terms:
+        return None
+    phrases, checks = [], []
+    for n, (word, star) in enumerate(terms):
+        if (star or n == len(terms) - 1) and len(word) > 1:
+            phrases.append(f'"{word[:PREFIX_INDEX]}"*')
+            if len(word) > PREFIX_INDEX:
+                checks.append(word)
+        else:
+            phrases.append(f'"{word}"')
+    return ' AND '.join(phrases), checks
+
+def search(user_id, query, kind=None, limit=LIMIT, session=None):
+    """user_id's transactions, cheques, bills and accounts matching query, newest first.
+
+    A transaction is dated by its timestamp, a cheque by when it was
+    issued and a bill by its due date; accounts have no date and come last.
+    """
+    session = session or db.session
+    parsed = parse(query)
+    if parsed is None:
+        return []
+    expression, checks = parsed
+    params = dict(expression=expression, low=int(user_id) << USER_SHIFT, high=((int(user_id) + 1) << USER_SHIFT) - 1,
+                  limit=limit)
+    where = ['search_index MATCH :expression', 'rowid >= :low', 'rowid <= :high']
+    for n, word in enumerate(checks):
+        where.append(f"instr(lower(body), :check{n}) > 0")
+        params[f"check{n}"] = word
+    if kind in KINDS:
+        where.append('rowid & 3 = :kind')
+        params['kind'] = KINDS.index(kind)
+    # Sorts every match in the user's range by date; rowid order is by source id and kind, not time
+    rows = session.execute(
+        text(f"SELECT rowid, body, happened_at FROM search_index WHERE {' AND '.join(where)} ORDER BY happened_at DESC, rowid DESC LIMIT :limit"),
+        params,
+    ).all()
+    return [dict(kind=KINDS[rowid & 3], id=(rowid & ((1 << USER_SHIFT) - 1)) >> 2, text=body, at=happened_at)
+            for rowid, body, happened_at in rows]
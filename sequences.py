@@ -0,0 +1,83 @@
+import os
+import threading
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, NumberSequence
+
+BLOCK_SIZE = 100  # Numbers a process reserves per round trip; unused ones are skipped on restart
+ACCOUNT_PREFIX = '5'  # 12-digit account numbers never collide with the old random 10-digit ones
+CARD_BIN = '652150'  # Issuer prefix; 6 + 9 serial digits + check digit = 16
+
+def reserve(name, count, engine=None):
+    """Reserve count consecutive values of sequence name and return the first.
+
+    Runs in its own transaction so a reservation is never undone by the
+    caller rolling back; call it before the caller's session writes, since
+    SQLite has a single writer. Sequences start at 1 on first use.
+    """
+    engine = engine or db.engine
+    table = NumberSequence.__table__
+    while True:
+        with engine.begin() as conn:
+            if conn.execute(update(table).where(table.c.name == name)
+                            .values(next_value=table.c.next_value + count)).rowcount:
+                return conn.scalar(select(table.c.next_value).where(table.c.name == name)) - count
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(table).values(name=name, next_value=1 + count))
+            return 1
+        except IntegrityError:
+            pass  # Another worker created it first; take the update path
+
+class BlockAllocator:
+    """Hands out sequence values from blocks reserved BLOCK_SIZE at a time (hi/lo)."""
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self._reset()
+        # A forked child would otherwise keep issuing from its parent's block
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    def next(self, name, engine=None):
+        engine = engine or db.engine
+        key = (str(engine.url), name)
+        with self._lock:
+            value, limit = self._blocks.get(key, (0, 0))
+            if value >= limit:
+                value = reserve(name, self.block_size, engine)
+                limit = value + self.block_size
+            self._blocks[key] = (value + 1, limit)
+            return value
+
+allocator = BlockAllocator()
+
+def luhn_digit(payload):
+    # Check digit making payload + digit pass the Luhn test
+    total = 0
+    for i, digit in enumerate(int(d) for d in reversed(payload)):
+        if i % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return str(-total % 10)
+
+def luhn_valid(number):
+    return luhn_digit(number[:-1]) == number[-1]
+
+def account_number(engine=None):
+    payload = f"{ACCOUNT_PREFIX}{allocator.next('account', engine):010d}"
+    return payload + luhn_digit(payload)
+
+def card_number(engine=None):
+    payload = f"{CARD_BIN}{allocator.next('card', engine):09d}"
+    return payload + luhn_digit(payload)
+
+def cheque_numbers(account_id, account_number, count, engine=None):
+    # One reservation per book, numbered per account; '-' keeps them apart from old '_' numbers
+    first = reserve(f"cheque:{account_id}", count, engine)
+    return [f"{account_number}-{serial:06d}" for serial in range(first, first + count)]
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy import func, or_, select, update
+import archive
+from models import db, DailyBalance, Transaction, Watermark
+
+WATERMARK = 'daily_balance'
+BATCH_SIZE = 50000  # Transactions folded into snapshots per commit
+
+# How each transaction type moves the balance of the accounts it touches;
+# transfers debit account_id and credit to_account_id
+CREDIT_TYPES = {'deposit', 'interest'}
+DEBIT_TYPES = {'withdraw', 'bill_payment'}
+
+ZERO = Decimal('0.00')
+
+def legs(transaction_type, account_id, to_account_id, amount):
+    # -> [(account_id, debit, credit)]
+    if transaction_type == 'transfer':
+        return [(account_id, amount, ZERO), (to_account_id, ZERO, amount)]
+    if transaction_type in CREDIT_TYPES:
+        return [(account_id, ZERO, amount)]
+    if transaction_type in DEBIT_TYPES:
+        return [(account_id, amount, ZERO)]
+    return []
+
+def _watermark(session):
+    watermark = session.get(Watermark, WATERMARK)
+    if watermark is None:
+        watermark = Watermark(name=WATERMARK, last_transaction_id=0)
+        session.add(watermark)
+        session.flush()
+    return watermark
+
+def _movements(rows):
+    # {account_id: {date: [debit, credit, count]}}
+    movements = defaultdict(lambda: defaultdict(lambda: [ZERO, ZERO, 0]))
+    for row in rows:
+        for account_id, debit, credit in legs(row.transaction_type, row.account_id, row.to_account_id, row.amount):
+            totals = movements[account_id][row.timestamp.date()]
+            totals[0] += debit
+            totals[1] += credit
+            totals[2] += 1
+    return movements
+
+def _apply(session, movements):
+    account_ids = list(movements)
+    start = min(day for days in movements.values() for day in days)
+    existing = defaultdict(dict)
+    for snapshot in session.scalars(
+        select(DailyBalance).where(DailyBalance.account_id.in_(account_ids), DailyBalance.date >= start)
+    ):
+        existing[snapshot.account_id][snapshot.date] = snapshot
+    # Closing balance of each account's last snapshot before the batch
+    latest = (
+        select(DailyBalance.account_id, func.max(DailyBalance.date).label('date'))
+        .where(DailyBalance.account_id.in_(account_ids), DailyBalance.date < start)
+        .group_by(DailyBalance.account_id)
+        .subquery()
+    )
+    base = dict(session.execute(
+        select(DailyBalance.account_id, DailyBalance.closing_balance)
+        .join(latest, (latest.c.account_id == DailyBalance.account_id) & (latest.c.date == DailyBalance.date))
+    ).all())
+
+    for account_id, days in movements.items():
+        snapshots = existing[account_id]
+        for day, (debit, credit, count) in days.items():
+            snapshot = snapshots.get(day)
+            if snapshot is None:
+                snapshot = DailyBalance(account_id=account_id, date=day, closing_balance=ZERO, debit_total=ZERO, credit_total=ZERO, txn_count=0)
+                session.add(snapshot)
+                snapshots[day] = snapshot
+            snapshot.debit_total += debit
+            snapshot.credit_total += credit
+            snapshot.txn_count += count
+        # Late-arriving activity shifts every later closing balance too
+        closing = base.get(account_id, ZERO)
+        for day in sorted(snapshots):
+            snapshot = snapshots[day]
+            closing = closing + snapshot.credit_total - snapshot.debit_total
+            snapshot.closing_balance = closing
+
+def catch_up(session=None, batch_size=BATCH_SIZE):
+    """Fold transactions newer than the watermark into daily snapshots.
+
+    Returns the number of transactions processed. Each batch commits with
+    its watermark, and the watermark only advances from the value this run
+    read, so two concurrent runs cannot fold the same batch twice.
+    """
+    session = session or db.session
+    processed = 0
+    while True:
+        last_id = _watermark(session).last_transaction_id
+        rows = session.execute(
+            select(Transaction.id, Transaction.transaction_type, Transaction.account_id,
+                   Transaction.to_account_id, Transaction.amount, Transaction.timestamp)
+            .where(Transaction.id > last_id)
+            .order_by(Transaction.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            session.commit()
+            return processed
+        movements = _movements(rows)
+        if movements:
+            _apply(session, movements)
+        advanced = session.execute(
+            update(Watermark)
+            .where(Watermark.name == WATERMARK, Watermark.last_transaction_id == last_id)
+            .values(last_transaction_id=rows[-1].id)
+            .execution_options(synchronize_session=False)
+        )
+        if advanced.rowcount != 1:
+            session.rollback()
+            raise RuntimeError('Snapshot watermark moved during catch-up; another run is active')
+        session.commit()
+        processed += len(rows)
+
+def _pending_net(session, account_id, last_id, until):
+    # Net movement from transactions not folded into snapshots yet
+    rows = session.execute(
+        select(Transaction.transaction_type, Transaction.account_id, Transaction.to_account_id, Transaction.amount)
+        .where(Transaction.id > last_id, Transaction.timestamp < until,
+               or_(Transaction.account_id == account_id, Transaction.to_account_id == account_id))
+    ).all()
+    net = ZERO
+    for row in rows:
+        for leg_account_id, debit, credit in legs(row.transaction_type, row.account_id, row.to_account_id, row.amount):
+            if leg_account_id == account_id:
+                net += credit - debit
+    return net
+
+def balance_as_of(account_id, day, session=None):
+    """Closing balance of account_id at the end of day."""
+    session = session or db.session
+    watermark = session.get(Watermark, WATERMARK)
+    last_id = watermark.last_transaction_id if watermark else 0
+    closing = session.scalar(
+        select(DailyBalance.closing_balance)
+        .where(DailyBalance.account_id == account_id, DailyBalance.date <= day)
+        .order_by(DailyBalance.date.desc())
+        .limit(1)
+    )
+    until = datetime.combine(day + timedelta(days=1), time.min)
+    return (closing if closing is not None else ZERO) + _pending_net(session, account_id, last_id, until)
+
+def period_transactions(account_id, start, end, session=None):
+    # Transactions touching account_id between start and end (inclusive dates), oldest first,
+    # from the archive partitions too when the period reaches back into them
+    session = session or db.session
+    since = datetime.combine(start, time.min)
+    until = datetime.combine(end + timedelta(days=1), time.min)
+
+    def query(source):
+        return (
+            select(source.c.id, source.c.timestamp, source.c.transaction_type,
+                   source.c.account_id, source.c.to_account_id, source.c.amount)
+            .where(or_(source.c.account_id == account_id, source.c.to_account_id == account_id),
+                   source.c.timestamp >= since, source.c.timestamp < until)
+            .order_by(source.c.timestamp, source.c.id)
+        )
+    rows = session.execute(query(Transaction.__table__)).all()
+    paths = archive.partitions(session, since, until)
+    if not paths:
+        return rows
+    merged = {}
+    for path in paths:
+        with archive.engine_for(path).connect() as conn:
+            merged.update((row.id, row) for row in conn.execute(query(archive.table)))
+    merged.update((row.id, row) for row in rows)
+    return sorted(merged.values(), key=lambda row: (row.timestamp, row.id))
+
+def period_summary(account_id, start, end, session=None):
+    """Opening/closing balance and totals for start..end, inclusive.
+
+    Reads one snapshot row for the opening balance plus the period's own
+    transactions, never the account's full history.
+    """
+    session = session or db.session
+    opening = balance_as_of(account_id, start - timedelta(days=1), session=session)
+    debit_total = credit_total = ZERO
+    count = 0
+    for row in period_transactions(account_id, start, end, session=session):
+        for leg_account_id, debit, credit in legs(row.transaction_type, row.account_id, row.to_account_id, row.amount):
+            if leg_account_id == account_id:
+                debit_total += debit
+                credit_total += credit
+                count += 1
+    return dict(opening_balance=opening, closing_balance=opening + credit_total - debit_total,
+                debit_total=debit_total, credit_total=credit_total, txn_count=count)
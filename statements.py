@@ -0,0 +1,196 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from sqlalchemy import create_engine, or_, select, update
+from sqlalchemy.orm import Session
+from database import configure_engine, engine_options
+from models import db, utcnow, Account, AccountStatement
+from snapshots import legs, period_summary, period_transactions
+
+MAX_WORKERS = 2  # Render processes
+MAX_PENDING = 8  # Renders queued or running before new ones wait for a later poll
+LEASE = timedelta(minutes=10)  # A render not finished by then is claimed again
+LINES_PER_PAGE = 45
+ROW_FORMAT = "{:<16}  {:<30} {:>12} {:>12} {:>14}"
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+_engines = {}
+
+def statement_path(folder, statement_id):
+    return os.path.abspath(os.path.join(folder, f"statement_{statement_id}.pdf"))
+
+def _engine(database_url):
+    engine = _engines.get(database_url)
+    if engine is None:
+        engine = _engines[database_url] = configure_engine(create_engine(database_url, **engine_options(database_url)))
+    return engine
+
+def _draw(output_path, statement, account, summary, rows, account_numbers):
+    # Rows are fixed-width Courier lines in one text object per page; one
+    # textLine per row instead of a drawString per cell keeps 50k-line
+    # statements fast. reportlab only loads in the render processes
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    width, height = letter
+    p = canvas.Canvas(output_path, pagesize=letter)
+    page_count = max(1, -(-len(rows) // LINES_PER_PAGE))
+
+    def start_page(page):
+        p.setFont('Helvetica-Bold', 12)
+        p.drawString(40, height - 50, "SBI Account Statement")
+        p.setFont('Helvetica', 9)
+        p.drawString(40, height - 66, f"Account: {account.account_number}")
+        p.drawString(40, height - 78, f"Period: {statement.start_date} to {statement.end_date}")
+        p.drawRightString(width - 40, height - 66, f"Generated: {statement.created_at}")
+        p.drawRightString(width - 40, height - 78, f"Page {page} of {page_count}")
+        text = p.beginText(40, height - 104)
+        text.setFont('Courier', 8)
+        text.setLeading(12)
+        text.textLine(ROW_FORMAT.format("Date", "Description", "Debit", "Credit", "Balance"))
+        return text
+
+    text = start_page(1)
+    text.textLine(ROW_FORMAT.format("", "Opening balance", "", "", f"{summary['opening_balance']:.2f}"))
+    balance = summary['opening_balance']
+    for index, row in enumerate(rows):
+        if index and index % LINES_PER_PAGE == 0:
+            p.drawText(text)
+            p.showPage()
+            text = start_page(index // LINES_PER_PAGE + 1)
+        debit_total = credit_total = 0
+        for leg_account_id, debit, credit in legs(row.transaction_type, row.account_id, row.to_account_id, row.amount):
+            if leg_account_id == account.id:
+                debit_total += debit
+                credit_total += credit
+        balance += credit_total - debit_total
+        if row.transaction_type == 'transfer':
+            other = row.to_account_id if row.account_id == account.id else row.account_id
+            description = f"Transfer {'to' if row.account_id == account.id else 'from'} {account_numbers.get(other, other)}"
+        else:
+            description = row.transaction_type.replace('_', ' ').capitalize()
+        text.textLine(ROW_FORMAT.format(
+            row.timestamp.strftime('%Y-%m-%d %H:%M'), description[:30],
+            f"{debit_total:.2f}" if debit_total else "", f"{credit_total:.2f}" if credit_total else "", f"{balance:.2f}",
+        ))
+    text.textLine(ROW_FORMAT.format("", "Closing balance", f"{summary['debit_total']:.2f}",
+                                    f"{summary['credit_total']:.2f}", f"{summary['closing_balance']:.2f}"))
+    p.drawText(text)
+    p.showPage()
+    p.save()
+
+def render_statement(database_url, statement_id, output_path, claimed_at):
+    """Render one statement to output_path and mark it ready.
+
+    Runs in a worker process with its own engine, so nothing here may rely
+    on the Flask app or its scoped session. claimed_at identifies the claim
+    this render holds, so a failure only marks its own claim failed.
+    """
+    engine = _engine(database_url)
+    try:
+        with Session(engine) as session:
+            statement = session.get(AccountStatement, statement_id)
+            account = session.get(Account, statement.account_id)
+            summary = period_summary(account.id, statement.start_date, statement.end_date, session=session)
+            rows = period_transactions(account.id, statement.start_date, statement.end_date, session=session)
+            others = {row.to_account_id if row.account_id == account.id else row.account_id
+                      for row in rows if row.transaction_type == 'transfer'}
+            account_numbers = dict(session.execute(
+                select(Account.id, Account.account_number).where(Account.id.in_(others))
+            ).all()) if others else {}
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            partial_path = f"{output_path}.{os.getpid()}.tmp"
+            _draw(partial_path, statement, account, summary, rows, account_numbers)
+            os.replace(partial_path, output_path)
+            session.execute(
+                update(AccountStatement)
+                .where(AccountStatement.id == statement_id)
+                .values(status='ready', file_path=output_path)
+            )
+            session.commit()
+    except Exception:
+        _mark_failed(engine, statement_id, claimed_at)
+        raise
+    return output_path
+
+def _mark_failed(engine, statement_id, claimed_at):
+    # Leaves the statement alone if its lease expired and another render claimed it
+    with engine.begin() as conn:
+        conn.execute(
+            update(AccountStatement)
+            .where(AccountStatement.id == statement_id, AccountStatement.status == 'rendering',
+                   AccountStatement.claimed_at == claimed_at)
+            .values(status='failed')
+        )
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+def _discard_executor(executor):
+    # A pool whose worker died refuses every later submit; the next render starts a new one
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+def ensure_rendered(statement, folder):
+    """Queue statement for rendering unless it is ready or already in flight.
+
+    Returns the statement's status afterwards. When the render queue is full
+    the statement stays pending and is picked up again on a later call. A
+    render still unfinished after LEASE is presumed lost with its worker and
+    queued again.
+    """
+    if statement.status == 'ready' and os.path.exists(statement.file_path):
+        return 'ready'
+    now = utcnow()
+    expired = or_(AccountStatement.claimed_at.is_(None), AccountStatement.claimed_at <= now - LEASE)
+    if statement.status == 'rendering' and statement.claimed_at is not None and statement.claimed_at > now - LEASE:
+        return statement.status
+    if not _slots.acquire(blocking=False):
+        return statement.status
+    # Claim the row so concurrent requests don't queue the same render twice
+    claimed = db.session.execute(
+        update(AccountStatement)
+        .where(AccountStatement.id == statement.id, AccountStatement.status == statement.status,
+               or_(AccountStatement.status != 'rendering', expired))
+        .values(status='rendering', claimed_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        _slots.release()
+        db.session.refresh(statement)
+        return statement.status
+    engine = db.engine
+    database_url = engine.url.render_as_string(hide_password=False)
+    executor = _get_executor()
+    try:
+        future = executor.submit(render_statement, database_url, statement.id, statement_path(folder, statement.id), now)
+    except Exception as exc:
+        _slots.release()
+        _mark_failed(engine, statement.id, now)
+        if isinstance(exc, BrokenProcessPool):
+            _discard_executor(executor)
+        raise
+
+    def finished(future):
+        _slots.release()
+        if future.exception() is not None:
+            # Covers a worker dying before it could record the failure itself
+            _mark_failed(engine, statement.id, now)
+            if isinstance(future.exception(), BrokenProcessPool):
+                _discard_executor(executor)
+
+    future.add_done_callback(finished)
+    db.session.refresh(statement)
+    return statement.status
@@ -0,0 +1,50 @@
+import time
+import pytest
+from app import create_app
+from models import db, User, Account, CreditCard
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(dict(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}", WTF_CSRF_ENABLED=False,
+                          PASSWORD_HASH_WORKERS=0, CARD_AUTH_LOG=str(tmp_path / 'card_auth.log'),
+                          STATEMENT_FOLDER=str(tmp_path / 'statements'), ARCHIVE_FOLDER=str(tmp_path / 'archive')))
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        getattr(app.extensions['card_authorizer'], 'stop', lambda: None)()
+
+@pytest.fixture
+def local_time_ahead_of_utc(monkeypatch):
+    # Local time differs from UTC, so a datetime.now() among UTC timestamps shows
+    monkeypatch.setenv('TZ', 'Asia/Kolkata')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def make_user(name, accounts=1, balance=1000):
+    """A user with `accounts` accounts holding `balance` each; returns (user, [account, ...])."""
+    user = User(username=name, email=f"{name}@example.com")
+    user.set_password('secret1')
+    db.session.add(user)
+    db.session.flush()
+    owned = [Account(account_number=f"{user.id:06d}{n:04d}", balance=balance, user_id=user.id) for n in range(accounts)]
+    db.session.add_all(owned)
+    db.session.commit()
+    return user, owned
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['user_id'] = user.id
+
+def make_card(user, account, limit=50000):
+    card = CreditCard(card_number=f"4{CreditCard.query.count() + 1:015d}", expiry_date='12/30', cvv='123', limit=limit,
+                      balance=0, user_id=user.id, account_id=account.id)
+    db.session.add(card)
+    db.session.commit()
+    return card
@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import select, text
+from billpay import account_top, run_bill_payments
+from models import db, utcnow, BillPayment, BillPaymentRun, Transaction
+from tests.conftest import make_user
+
+def test_auto_debit_writes_utc_timestamps_in_the_ledger_format(app, local_time_ahead_of_utc):
+    user, (account,) = make_user('alice', balance=1000)
+    db.session.add_all([
+        BillPayment(bill_type='electricity', bill_number='EB-1', amount=300, due_date=date(2026, 10, 1), user_id=user.id,
+                    account_id=account.id),
+        BillPayment(bill_type='water', bill_number='WB-1', amount=5000, due_date=date(2026, 10, 2), user_id=user.id,
+                    account_id=account.id),
+    ])
+    db.session.commit()
+    report = run_bill_payments(date(2026, 10, 18))
+    assert (report['bills_paid'], report['bills_insufficient']) == (1, 1)
+    stored = db.session.execute(text('SELECT transaction_type, timestamp FROM "transaction"')).all()
+    assert [(kind, len(stamp)) for kind, stamp in stored] == [('bill_payment', len('2026-10-18 12:00:00.000000'))]
+    now = utcnow()
+    paid = db.session.scalars(select(BillPayment).where(BillPayment.status == 'paid')).one()
+    run = db.session.scalars(select(BillPaymentRun)).one()
+    debit = db.session.scalars(select(Transaction)).one()
+    for stamp in (debit.timestamp, paid.paid_at, run.completed_at):
+        assert abs(now - stamp) < timedelta(minutes=1)
+
+def test_shards_given_one_top_pay_every_bill_once_including_accounts_opened_since(app):
+    user, accounts = make_user('alice', accounts=4, balance=1000)
+    top = account_top(db.session)
+    _, (late,) = make_user('bob', balance=1000)  # Opened after the coordinator read top
+    for account in accounts + [late]:
+        db.session.add(BillPayment(bill_type='water', bill_number=f"WB-{account.id}", amount=10, due_date=date(2026, 10, 1),
+                                   user_id=account.user_id, account_id=account.id))
+    db.session.commit()
+
+    paid = [run_bill_payments(date(2026, 10, 18), shard=f"{k}/3", top=top)['bills_paid'] for k in range(3)]
+
+    assert sum(paid) == 5
+    assert db.session.scalar(select(db.func.count()).select_from(Transaction)) == 5
+
+def test_sharded_runs_need_a_top(app):
+    with pytest.raises(ValueError, match='need top'):
+        run_bill_payments(date(2026, 10, 18), shard='0/2')
@@ -0,0 +1,55 @@
+import io
+import time
+from datetime import timedelta
+from sqlalchemy import update
+from bulk_transfers import LEASE, claim_job
+from models import db, utcnow, Account, BulkTransferJob
+from tests.conftest import login, make_user
+
+def job_when_done(job_id, seconds=30):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        db.session.expire_all()
+        job = db.session.get(BulkTransferJob, job_id)
+        if job.status in ('completed', 'failed'):
+            return job
+        time.sleep(0.05)
+    return job
+
+def make_job(user, account, **values):
+    job = BulkTransferJob(file_path='payments.csv', file_format='csv', user_id=user.id, account_id=account.id, **values)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def test_upload_returns_before_the_job_runs_in_the_background(app, client, tmp_path):
+    app.config['BULK_UPLOAD_FOLDER'] = str(tmp_path)
+    alice, (source,) = make_user('alice')
+    bob, (destination,) = make_user('bob')
+    login(client, alice)
+    rows = ''.join(f"{destination.account_number},1.00\n" for _ in range(300))
+
+    response = client.post('/bulk_transfer', data=dict(
+        from_account_id=source.id, file=(io.BytesIO(f"to_account,amount\n{rows}".encode()), 'pay.csv'),
+    ), content_type='multipart/form-data')
+
+    assert response.status_code == 302 and response.headers['Location'].endswith('/bulk_transfer/1')
+    job = job_when_done(1)
+    assert (job.status, job.rows_posted, job.total_amount) == ('completed', 300, 300)
+    assert db.session.get(Account, destination.id).balance == 1300
+
+def test_a_running_job_is_claimed_once_until_its_lease_expires(app):
+    alice, (source,) = make_user('alice')
+    job = make_job(alice, source)
+
+    assert claim_job(job.id)
+    assert not claim_job(job.id)
+    db.session.execute(update(BulkTransferJob).values(updated_at=utcnow() - LEASE - timedelta(seconds=1)))
+    db.session.commit()
+    assert claim_job(job.id)
+
+def test_completed_jobs_are_never_claimed(app):
+    alice, (source,) = make_user('alice')
+    job = make_job(alice, source, status='completed')
+
+    assert not claim_job(job.id)
@@ -0,0 +1,53 @@
+import time
+from datetime import date
+from billpay import run_bill_payments
+from cache import VersionedCache
+from models import db, BillPayment
+from tests.conftest import login, make_user
+
+def counting_loader():
+    loads = []
+    def loader(key):
+        loads.append(key)
+        return dict(key=key, load=len(loads))
+    return loader, loads
+
+def test_local_entries_expire_without_a_shared_backend():
+    loader, loads = counting_loader()
+    cache = VersionedCache('t', loader, local_ttl=0.05)
+    cache.get(1)
+    cache.get(1)
+    time.sleep(0.1)
+    cache.get(1)
+    assert loads == [1, 1]
+
+def test_versions_stay_bounded_and_never_revive_stale_entries():
+    loader, loads = counting_loader()
+    cache = VersionedCache('t', loader, maxsize=4)
+    stale = cache.get('a')
+    cache.invalidate('a')
+    for key in range(10):
+        cache.invalidate(key)
+    assert len(cache._versions) == 4
+    assert 'a' not in cache._versions
+    assert cache.get('a') is not stale
+    assert loads == ['a', 'a']
+
+def test_batch_jobs_invalidate_the_users_they_changed(app):
+    user, (account,) = make_user('alice', balance=1000)
+    other, _ = make_user('bobby')
+    db.session.add(BillPayment(bill_type='electricity', bill_number='EB-1', amount=300, due_date=date(2026, 10, 1),
+                               user_id=user.id, account_id=account.id))
+    db.session.commit()
+    invalidated = []
+    run_bill_payments(date(2026, 10, 18), invalidate=lambda *user_ids: invalidated.extend(user_ids))
+    assert invalidated == [user.id]
+
+def test_cache_stats_is_for_admins_only(app, client):
+    user, _ = make_user('alice')
+    admin, _ = make_user('operator')
+    app.config['ADMIN_USERNAMES'] = {'operator'}
+    login(client, user)
+    assert client.get('/cache_stats').status_code == 404
+    login(client, admin)
+    assert client.get('/cache_stats').get_json()['name'] == 'summary'
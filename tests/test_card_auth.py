@@ -0,0 +1,96 @@
+import threading
+from datetime import timedelta
+import pytest
+from sqlalchemy import event, select
+from card_auth import AuthorizerUnavailable, CardAuthorizer, Declined, RemoteAuthorizer, server
+from models import db, utcnow, CardAuthorization, Transaction
+from tests.conftest import login, make_card, make_user
+
+@pytest.fixture
+def service(app, tmp_path):
+    # The authorizer another process would run under `flask card-authorizer`
+    authorizer = CardAuthorizer(db.engine, app.config['CARD_AUTH_LOG'])
+    address = str(tmp_path / 'card_auth.sock')
+    served = server(authorizer, address, b'test-key')
+
+    def serve():
+        try:
+            served.serve_forever()
+        except SystemExit:  # How serve_forever() returns
+            pass
+    threading.Thread(target=serve, daemon=True).start()
+    yield authorizer, address
+    served.stop_event.set()
+    authorizer.stop()
+
+def test_workers_share_one_authorizer_over_ipc(app, service):
+    authorizer, address = service
+    user, (account,) = make_user('alice')
+    card = make_card(user, account, limit=1000)
+    workers = [RemoteAuthorizer(address, b'test-key') for _ in range(2)]
+    hold_id = workers[0].authorize(card.id, 60000)
+    assert workers[1].open_to_buy(card.id) == 40000
+    assert workers[1].hold(hold_id) == (card.id, 60000, None)
+    with pytest.raises(Declined):
+        workers[1].authorize(card.id, 50000)
+    workers[1].capture(hold_id, 50000)
+    assert authorizer.open_to_buy(card.id) == 50000
+
+def test_unreachable_service_is_reported(tmp_path):
+    with pytest.raises(AuthorizerUnavailable):
+        RemoteAuthorizer(str(tmp_path / 'missing.sock'), b'test-key').open_to_buy(1)
+
+def test_worker_without_the_log_degrades(app, client, service):
+    user, (account,) = make_user('alice')
+    card = make_card(user, account)
+    login(client, user)
+    # The service holds the log, so this worker's in-process authorizer cannot open it
+    service[0].open_to_buy(card.id)
+    response = client.get('/credit_cards')
+    assert response.status_code == 200
+    assert b'50000.00' in response.data
+    response = client.post(f"/credit_cards/{card.id}/authorize", data=dict(amount='10'))
+    assert response.status_code == 503
+
+def count_statements(engine):
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+def test_open_to_buy_many_loads_cards_in_one_query(app, tmp_path):
+    user, (account,) = make_user('alice')
+    card_ids = [make_card(user, account, limit=100 + n).id for n in range(20)]
+    authorizer = CardAuthorizer(db.engine, str(tmp_path / 'many.log'))
+    authorizer.open_to_buy(card_ids[0])
+    statements = count_statements(db.engine)
+    found = authorizer.open_to_buy_many(card_ids)
+    authorizer.stop()
+    assert len(statements) == 1
+    assert found == {card_id: (100 + n) * 100 for n, card_id in enumerate(card_ids)}
+
+def test_recovery_loads_only_cards_with_logged_holds(app, tmp_path):
+    user, (account,) = make_user('alice')
+    cards = [make_card(user, account) for _ in range(20)]
+    log = str(tmp_path / 'recover.log')
+    first = CardAuthorizer(db.engine, log)
+    first.authorize(cards[3].id, 500)
+    first.stop()
+    second = CardAuthorizer(db.engine, log)
+    second._ensure_started()
+    loaded = {card_id for stripe in second._stripes for card_id in stripe.cards}
+    assert loaded == {cards[3].id}
+    assert second.open_to_buy(cards[3].id) == 50000 * 100 - 500
+    second.stop()
+
+def test_settlement_writes_utc_timestamps(app, tmp_path, local_time_ahead_of_utc):
+    user, (account,) = make_user('alice')
+    card_id = make_card(user, account).id
+    authorizer = CardAuthorizer(db.engine, str(tmp_path / 'utc.log'))
+    authorizer.capture(authorizer.authorize(card_id, 1000))
+    assert authorizer.settle() == 1
+    authorizer.stop()
+    now = utcnow()
+    purchase = db.session.scalars(select(Transaction).where(Transaction.transaction_type == 'card_purchase')).one()
+    authorization = db.session.scalars(select(CardAuthorization)).one()
+    for stamp in (purchase.timestamp, authorization.authorized_at, authorization.settled_at):
+        assert abs(now - stamp) < timedelta(minutes=1)
@@ -0,0 +1,10 @@
+from datetime import date, timedelta
+from sqlalchemy import select
+from deposits import run_accruals
+from models import db, utcnow, DepositAccrualRun
+
+def test_accrual_runs_record_completion_in_utc(app, local_time_ahead_of_utc):
+    run_accruals(date(2026, 10, 18))
+    run = db.session.scalars(select(DepositAccrualRun)).one()
+    assert run.status == 'completed'
+    assert abs(utcnow() - run.completed_at) < timedelta(minutes=1)
@@ -0,0 +1,62 @@
+import threading
+import pytest
+from group_commit import GroupCommitter, WriterUnavailable
+from models import db, Account
+from posting import apply_deposit
+from tests.conftest import make_user
+
+def balance(account):
+    db.session.expire_all()
+    return db.session.get(Account, account.id).balance
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_a_dead_writer_fails_its_postings_and_the_next_one_restarts_it(app):
+    _, (account,) = make_user('alice')
+    committer = GroupCommitter(db.engine, timeout=5)
+
+    def crash(session, account_id, amount):
+        apply_deposit(session, account_id, amount)
+        raise SystemExit  # Escapes the writer's error handling and ends the thread
+
+    try:
+        with pytest.raises(WriterUnavailable, match='not committed'):
+            committer.submit(crash, account.id, 50)
+        committer.submit(apply_deposit, account.id, 25)
+    finally:
+        committer.stop()
+
+    assert balance(account) == 1025
+
+def test_a_posting_the_stuck_writer_never_took_times_out_and_is_dropped(app):
+    _, (account,) = make_user('alice')
+    account_id = account.id
+    committer = GroupCommitter(db.engine, timeout=0.5)
+    started, release = threading.Event(), threading.Event()
+
+    def stuck(session, account_id, amount):
+        started.set()
+        release.wait(10)
+        apply_deposit(session, account_id, amount)
+
+    errors = []
+
+    def submit_stuck():
+        try:
+            committer.submit(stuck, account_id, 50)
+        except WriterUnavailable as exc:
+            errors.append(str(exc))
+
+    first = threading.Thread(target=submit_stuck)
+    first.start()
+    started.wait(5)
+    try:
+        with pytest.raises(WriterUnavailable, match='did not take'):
+            committer.submit(apply_deposit, account_id, 25)
+    finally:
+        release.set()
+        first.join()
+        committer.stop()
+
+    # The writer had taken the first, which committed after its caller gave up
+    assert errors == ['Posting not committed within 0.5s; it may still commit']
+    assert balance(account) == 1050
@@ -0,0 +1,47 @@
+import html
+import re
+from datetime import datetime
+from sqlalchemy import text
+from history import decode_cursor, transaction_page
+from models import db, Transaction
+from posting import post_deposit
+from tests.conftest import login, make_user
+
+def walk(account_ids, limit):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = transaction_page(account_ids, cursor=decode_cursor(cursor), limit=limit)
+        pages.append([row.id for row in rows])
+        if cursor is None or len(pages) > 10:
+            return pages
+
+def test_pages_through_rows_from_the_default_timestamp(app):
+    _, (account,) = make_user('alice')
+    for _ in range(7):
+        post_deposit(account.id, 10)
+    assert walk([account.id], 3) == [[7, 6, 5], [4, 3, 2], [1]]
+
+def test_pages_through_rows_in_the_same_second(app):
+    _, (account,) = make_user('alice')
+    db.session.add_all(Transaction(amount=10, transaction_type='deposit', account_id=account.id,
+                                   timestamp=datetime(2026, 10, 18, 12, 0, 0)) for _ in range(7))
+    db.session.commit()
+    assert walk([account.id], 3) == [[7, 6, 5], [4, 3, 2], [1]]
+
+def test_timestamps_share_one_stored_format(app):
+    _, (account,) = make_user('alice')
+    post_deposit(account.id, 10)
+    stored = db.session.scalar(text('SELECT timestamp FROM "transaction"'))
+    assert len(stored) == len('2026-10-18 12:00:00.000000')
+
+def test_history_route_follows_the_cursor(app, client):
+    user, (account,) = make_user('alice')
+    for _ in range(7):
+        post_deposit(account.id, 10)
+    login(client, user)
+    pages, url = 0, '/transactions?per_page=3'
+    while url and pages < 5:
+        older = re.search(r'href="([^"]*before=[^"]*)"', client.get(url).get_data(as_text=True))
+        pages += 1
+        url = older and html.unescape(older.group(1))
+    assert pages == 3
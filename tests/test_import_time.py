@@ -0,0 +1,64 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+RUNS = 3
+BUDGET_MS = 1000  # Median import time of a worker serving the core pages; about 600ms here
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = 'worker boot starts'
+LAZY = ('reportlab', 'twilio', 'smtplib', 'numpy', 'pyarrow', 'alembic', 'flask_migrate', 'redis')
+
+WORKER = f'''
+import json, sys
+sys.stderr.write({MARKER!r} + '\\n')
+import app
+# Hashes inline: spawned pool processes would write their own import times into this stream
+worker = app.create_app(dict(SQLALCHEMY_DATABASE_URI=sys.argv[1], WTF_CSRF_ENABLED=False, CARD_AUTH_LOG=sys.argv[2],
+                             PASSWORD_HASH_WORKERS=0))
+client = worker.test_client()
+statuses = [
+    client.post('/register', data=dict(username='alice', email='alice@example.com', password='secret1')).status_code,
+    client.post('/register', data=dict(username='bobby', email='bobby@example.com', password='secret1')).status_code,
+    client.post('/login', data=dict(username='alice', password='secret1')).status_code,
+    client.get('/dashboard').status_code,
+    client.post('/deposit', data=dict(account_id=1, amount='100.00')).status_code,
+    client.post('/withdraw', data=dict(account_id=1, amount='20.00')).status_code,
+    client.post('/transfer', data=dict(from_account_id=1, to_account_id=2, amount='10.00')).status_code,
+    client.get('/transactions').status_code,
+]
+print(json.dumps(dict(statuses=statuses, loaded=sorted(name for name in {LAZY!r} if name in sys.modules))))
+'''
+
+def boot(scratch, run):
+    from sqlalchemy import create_engine
+    import search  # Registers the full-text index with create_all
+    from models import db
+    path = os.path.join(scratch, f"worker{run}.db")
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    engine.dispose()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', WORKER, f"sqlite:///{path}", os.path.join(scratch, f"card_auth{run}.log")],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    lines = result.stderr.splitlines()
+    by_package = Counter()
+    for line in lines[lines.index(MARKER) + 1:]:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        by_package[name.strip().split('.')[0]] += int(self_us)
+    return json.loads(result.stdout.splitlines()[-1]), by_package
+
+def test_core_pages_boot_within_budget_without_optional_dependencies(tmp_path):
+    totals = []
+    for run in range(RUNS):
+        report, by_package = boot(str(tmp_path), run)
+        assert all(status in (200, 302) for status in report['statuses']), report['statuses']
+        # Only statements, the outbox dispatcher, batch commands, flask db and a
+        # shared summary cache should pull these in
+        assert report['loaded'] == []
+        totals.append(sum(by_package.values()) / 1000)
+    assert statistics.median(totals) <= BUDGET_MS, totals
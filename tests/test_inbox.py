@@ -0,0 +1,36 @@
+from datetime import datetime
+from sqlalchemy import text
+from history import decode_cursor
+from inbox import create_broadcast, inbox_page, notify, run_broadcast
+from models import db, Notification
+from tests.conftest import make_user
+
+def walk(user_id, limit):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = inbox_page(user_id, cursor=decode_cursor(cursor), limit=limit)
+        pages.append([row.id for row in rows])
+        if cursor is None or len(pages) > 10:
+            return pages
+
+def test_pages_through_notifications_from_the_default_timestamp(app):
+    user, _ = make_user('alice')
+    for n in range(7):
+        notify(user.id, f"notice {n}")
+    db.session.commit()
+    assert walk(user.id, 3) == [[7, 6, 5], [4, 3, 2], [1]]
+
+def test_pages_through_notifications_in_the_same_second(app):
+    user, _ = make_user('alice')
+    db.session.add_all(Notification(message='notice', user_id=user.id, created_at=datetime(2026, 10, 18, 12, 0, 0))
+                       for _ in range(7))
+    db.session.commit()
+    assert walk(user.id, 3) == [[7, 6, 5], [4, 3, 2], [1]]
+
+def test_broadcast_and_direct_notices_share_one_stored_format(app):
+    user, _ = make_user('alice')
+    notify(user.id, 'direct')
+    db.session.commit()
+    run_broadcast(create_broadcast('to everyone').id, pause=0)
+    stored = db.session.scalars(text('SELECT created_at FROM notification')).all()
+    assert [len(value) for value in stored] == [len('2026-10-18 12:00:00.000000')] * 2
@@ -0,0 +1,92 @@
+from decimal import Decimal
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import StatementError
+import posting
+from auth import owns_account
+from group_commit import GroupCommitter
+from models import db, Account, Transaction
+from posting import PostingError, post_deposit, post_transfer, post_withdrawal
+from tests.conftest import login, make_user
+
+def reassign(account, user):
+    # As another worker would, leaving this process's ownership cache stale
+    db.session.execute(update(Account).where(Account.id == account.id).values(user_id=user.id))
+    db.session.commit()
+
+def balances(*accounts):
+    db.session.expire_all()
+    return [db.session.get(Account, account.id).balance for account in accounts]
+
+def test_withdraw_refuses_an_account_reassigned_since_it_was_cached(app, client):
+    alice, (account,) = make_user('alice')
+    bob, _ = make_user('bob')
+    login(client, alice)
+    assert owns_account(account.id, alice.id)
+    reassign(account, bob)
+
+    client.post('/withdraw', data=dict(account_id=account.id, amount='100'))
+
+    assert balances(account) == [1000]
+    assert Transaction.query.count() == 0
+
+def test_transfer_refuses_a_source_owned_by_someone_else(app, client):
+    alice, (source,) = make_user('alice')
+    bob, (destination,) = make_user('bob')
+    login(client, alice)
+    assert owns_account(source.id, alice.id)
+    reassign(source, bob)
+
+    client.post('/transfer', data=dict(from_account_id=source.id, to_account_id=destination.id, amount='100'))
+
+    assert balances(source, destination) == [1000, 1000]
+
+def test_postings_check_the_owner_only_when_given_one(app):
+    alice, (account,) = make_user('alice')
+    bob, (other,) = make_user('bob')
+
+    with pytest.raises(PostingError):
+        post_deposit(account.id, 50, user_id=bob.id)
+    with pytest.raises(PostingError):
+        post_withdrawal(account.id, 50, user_id=bob.id)
+    post_transfer(other.id, account.id, 50, user_id=bob.id)
+    post_deposit(account.id, 25)
+
+    assert balances(account, other) == [1075, 950]
+
+def test_group_commit_checks_the_owner(app):
+    alice, (account,) = make_user('alice')
+    bob, _ = make_user('bob')
+    committer = GroupCommitter(db.engine)
+    posting.use_group_commit(committer)
+    try:
+        with pytest.raises(PostingError):
+            post_withdrawal(account.id, 50, user_id=bob.id)
+        post_withdrawal(account.id, 50, user_id=alice.id)
+    finally:
+        posting.use_group_commit(None)
+        committer.stop()
+
+    assert balances(account) == [950]
+
+@pytest.mark.parametrize('amount', ['NaN', 'Infinity', '-Infinity', '-5', '0.001'])
+def test_deposit_form_rejects_amounts_that_are_not_finite_and_positive(app, client, amount):
+    alice, (account,) = make_user('alice')
+    login(client, alice)
+
+    response = client.post('/deposit', data=dict(account_id=account.id, amount=amount))
+
+    assert response.status_code == 200
+    assert balances(account) == [1000]
+
+@pytest.mark.parametrize('amount', [Decimal('NaN'), Decimal('Infinity'), float('nan')])
+def test_postings_and_money_columns_reject_amounts_that_are_not_finite(app, amount):
+    alice, (account,) = make_user('alice')
+
+    with pytest.raises(PostingError):
+        post_deposit(account.id, amount)
+    account.balance = amount
+    with pytest.raises(StatementError, match='must be finite'):
+        db.session.commit()
+    db.session.rollback()
+    assert balances(account) == [1000]
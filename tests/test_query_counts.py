@@ -0,0 +1,93 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import event
+import models
+from models import db, User
+from tests.conftest import login, make_user
+
+PAGES = [
+    '/transactions?per_page=200',
+    '/loans',
+    '/credit_cards',
+    '/cheque_management',
+    '/account_statements',
+    '/insurance',
+    '/investments',
+    '/fixed_deposits',
+    '/recurring_deposits',
+    '/bill_payments',
+]
+
+def seed_rows(user_id, account_id, start, count):
+    now = datetime.now()
+    # Incoming transfers from distinct accounts, so a per-row lazy load of
+    # Transaction.account would show up as one extra statement per row
+    db.session.execute(db.insert(models.Account), [
+        dict(account_number=f"2{i:09d}", user_id=user_id + 1) for i in range(start, start + count)
+    ])
+    senders = db.session.execute(
+        db.select(models.Account.id).where(models.Account.account_number.like('2%')).order_by(models.Account.id.desc()).limit(count)
+    ).scalars().all()
+    db.session.execute(db.insert(models.Transaction), [
+        dict(amount=10.0, transaction_type='transfer', timestamp=now - timedelta(minutes=start + i), account_id=sender, to_account_id=account_id)
+        for i, sender in enumerate(senders)
+    ])
+    owned = dict(user_id=user_id, account_id=account_id)
+    db.session.execute(db.insert(models.Loan), [dict(amount=1000.0, term_months=12, **owned) for _ in range(count)])
+    db.session.execute(db.insert(models.CreditCard), [
+        dict(card_number=f"4{i:015d}", expiry_date='01/30', cvv='123', **owned) for i in range(start, start + count)
+    ])
+    db.session.execute(db.insert(models.Cheque), [
+        dict(cheque_number=f"Q{i}", amount=0.0, payee='', **owned) for i in range(start, start + count)
+    ])
+    db.session.execute(db.insert(models.AccountStatement), [
+        dict(start_date=date(2024, 1, 1), end_date=date(2024, 1, 31), file_path='', created_at=now, **owned) for _ in range(count)
+    ])
+    db.session.execute(db.insert(models.Insurance), [
+        dict(type='life', coverage_amount=1000.0, premium_amount=1.0, term_years=1, **owned) for _ in range(count)
+    ])
+    db.session.execute(db.insert(models.Investment), [
+        dict(type='bond', amount=100.0, current_value=105.0, **owned) for _ in range(count)
+    ])
+    db.session.execute(db.insert(models.FixedDeposit), [
+        dict(amount=100.0, term_months=12, maturity_date=now, **owned) for _ in range(count)
+    ])
+    db.session.execute(db.insert(models.RecurringDeposit), [
+        dict(monthly_amount=100.0, term_months=12, maturity_date=now, **owned) for _ in range(count)
+    ])
+    db.session.execute(db.insert(models.BillPayment), [
+        dict(bill_type='water', bill_number=str(i), amount=10.0, due_date=date.today(), **owned) for i in range(count)
+    ])
+    db.session.commit()
+
+def statements_for(client, path):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Requests share the test's app context, so start each from an empty session as a worker would
+    db.session.remove()
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements)
+
+@pytest.mark.parametrize('path', PAGES)
+def test_page_issues_the_same_statements_for_5_and_100_rows(app, client, path):
+    user, (account,) = make_user('alice')
+    # Owns the counterparty accounts seed_rows creates
+    db.session.add(User(id=user.id + 1, username='alice-peer', email='peer@example.com', password_hash='x'))
+    db.session.commit()
+    user_id, account_id = user.id, account.id
+    login(client, user)
+
+    counts = []
+    for start, rows in ((0, 5), (5, 95)):
+        seed_rows(user_id, account_id, start, rows)
+        statements_for(client, path)  # Loads new rows into the identity cache and the card authorizer
+        counts.append(statements_for(client, path))
+    assert counts[1] == counts[0]
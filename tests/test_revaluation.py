@@ -0,0 +1,58 @@
+from datetime import timedelta
+from decimal import Decimal
+from sqlalchemy import select
+from models import db, utcnow, Investment, RevaluationRun
+from revaluation import run_revaluation
+from tests.conftest import login, make_user
+
+def price_file(tmp_path, name, rows):
+    path = tmp_path / name
+    path.write_text('instrument,price\n' + ''.join(f"{instrument},{price}\n" for instrument, price in rows))
+    return str(path)
+
+def holding(investment_id):
+    db.session.expire_all()
+    return db.session.get(Investment, investment_id)
+
+def test_investment_bought_before_any_price_starts_at_no_gain(app, client, tmp_path):
+    user, (account,) = make_user('alice')
+    login(client, user)
+    client.post('/apply_investment', data=dict(type='stock', instrument='INFY', amount='10000'))
+    investment_id = db.session.scalar(select(Investment.id))
+    assert holding(investment_id).units is None
+
+    run_revaluation(price_file(tmp_path, 'day1.csv', [('INFY', 1500)]))
+    investment = holding(investment_id)
+    assert (investment.current_value, investment.returns) == (Decimal('10000.00'), Decimal('0.00'))
+    assert investment.units == 10000 / 1500
+
+    run_revaluation(price_file(tmp_path, 'day2.csv', [('INFY', 1650)]))
+    investment = holding(investment_id)
+    assert (investment.current_value, investment.returns) == (Decimal('11000.00'), Decimal('1000.00'))
+
+def test_later_investments_buy_units_at_the_last_price(app, client, tmp_path):
+    user, (account,) = make_user('alice')
+    login(client, user)
+    run_revaluation(price_file(tmp_path, 'day1.csv', [('INFY', 1500)]))
+    client.post('/apply_investment', data=dict(type='stock', instrument='INFY', amount='3000'))
+    investment_id = db.session.scalar(select(Investment.id))
+    assert holding(investment_id).units == 2
+
+    run_revaluation(price_file(tmp_path, 'day2.csv', [('INFY', 1650)]))
+    assert holding(investment_id).current_value == Decimal('3300.00')
+
+def test_unpriced_holdings_keep_their_value_and_have_no_units(app, tmp_path):
+    user, (account,) = make_user('alice')
+    legacy = Investment(type='bond', amount=500, current_value=520, returns=20, user_id=user.id, account_id=account.id)
+    db.session.add(legacy)
+    db.session.commit()
+
+    report = run_revaluation(price_file(tmp_path, 'day1.csv', [('INFY', 1500)]))
+    assert report['unpriced'] == 1
+    investment = holding(legacy.id)
+    assert (investment.units, investment.current_value) == (None, Decimal('520.00'))
+
+def test_revaluation_runs_record_completion_in_utc(app, tmp_path, local_time_ahead_of_utc):
+    run_revaluation(price_file(tmp_path, 'day1.csv', [('INFY', 1500)]))
+    run = db.session.scalars(select(RevaluationRun)).one()
+    assert abs(utcnow() - run.completed_at) < timedelta(minutes=1)
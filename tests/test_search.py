@@ -0,0 +1,23 @@
+from datetime import date, datetime
+from models import db, BillPayment, Transaction
+from search import search
+from tests.conftest import make_user
+
+def test_results_are_newest_first_whatever_their_source_id(app):
+    user, (account,) = make_user('alice')
+    db.session.add_all([
+        Transaction(amount=10, transaction_type='deposit', account_id=account.id, timestamp=datetime(2026, 3, 1, 9, 0)),
+        Transaction(amount=10, transaction_type='deposit', account_id=account.id, timestamp=datetime(2024, 1, 1, 9, 0)),
+        Transaction(amount=10, transaction_type='deposit', account_id=account.id, timestamp=datetime(2026, 3, 1, 9, 0)),
+    ])
+    db.session.commit()
+    # A later bill with a lower id than every transaction above
+    db.session.add(BillPayment(bill_type='electricity', bill_number='EB-1', amount=10, due_date=date(2026, 10, 1),
+                               user_id=user.id, account_id=account.id))
+    db.session.commit()
+
+    results = search(user.id, '10.00')
+
+    assert [(result['kind'], result['id']) for result in results] == [
+        ('bill', 1), ('transaction', 3), ('transaction', 1), ('transaction', 2),
+    ]
@@ -0,0 +1,23 @@
+import os
+from sqlalchemy import create_engine
+from models import db
+from sequences import BlockAllocator
+
+def test_a_forked_child_reserves_its_own_block(app):
+    allocator = BlockAllocator(block_size=10)
+    assert allocator.next('account') == 1
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            engine = create_engine(db.engine.url)  # The parent's pooled connections are not the child's to use
+            os.write(write, str(allocator.next('account', engine)).encode())
+        finally:
+            os._exit(0)
+    os.close(write)
+    os.waitpid(pid, 0)
+    with os.fdopen(read) as pipe:
+        child = int(pipe.read())
+
+    assert child == 11
+    assert allocator.next('account') == 2
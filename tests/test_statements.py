@@ -0,0 +1,53 @@
+import time
+from datetime import date, timedelta
+import statements
+from models import db, utcnow, AccountStatement
+from statements import LEASE, _mark_failed, ensure_rendered, statement_path
+from tests.conftest import make_user
+
+def make_statement(app, user, account, **values):
+    statement = AccountStatement(start_date=date(2026, 1, 1), end_date=date(2026, 1, 31), file_path='',
+                                 user_id=user.id, account_id=account.id, **values)
+    db.session.add(statement)
+    db.session.flush()
+    statement.file_path = statement_path(app.config['STATEMENT_FOLDER'], statement.id)
+    db.session.commit()
+    return statement
+
+def wait_until_ready(app, statement, seconds=60):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        db.session.refresh(statement)
+        if ensure_rendered(statement, app.config['STATEMENT_FOLDER']) in ('ready', 'failed'):
+            break
+        time.sleep(0.2)
+    return statement.status
+
+def test_render_inside_its_lease_is_left_alone(app, monkeypatch):
+    user, (account,) = make_user('alice')
+    statement = make_statement(app, user, account, status='rendering', claimed_at=utcnow() - LEASE / 2)
+    monkeypatch.setattr(statements, '_get_executor', lambda: None)  # Fails the test if it tries to submit
+
+    assert ensure_rendered(statement, app.config['STATEMENT_FOLDER']) == 'rendering'
+
+def test_expired_and_unclaimed_renders_are_claimed_again(app):
+    user, (account,) = make_user('alice')
+    expired = make_statement(app, user, account, status='rendering', claimed_at=utcnow() - LEASE - timedelta(minutes=1))
+    unclaimed = make_statement(app, user, account, status='rendering')  # Left by a worker before claims had a time
+
+    assert wait_until_ready(app, expired) == 'ready'
+    assert wait_until_ready(app, unclaimed) == 'ready'
+    assert expired.claimed_at > utcnow() - LEASE
+
+def test_a_lost_render_does_not_fail_the_claim_that_replaced_it(app):
+    user, (account,) = make_user('alice')
+    old_claim, new_claim = utcnow() - LEASE - timedelta(minutes=1), utcnow()
+    statement = make_statement(app, user, account, status='rendering', claimed_at=new_claim)
+
+    _mark_failed(db.engine, statement.id, old_claim)
+    db.session.refresh(statement)
+    assert statement.status == 'rendering'
+
+    _mark_failed(db.engine, statement.id, new_claim)
+    db.session.refresh(statement)
+    assert statement.status == 'failed'
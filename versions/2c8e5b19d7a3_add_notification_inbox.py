@@ -0,0 +1,59 @@
+"""add notification inbox
+
+Revision ID: 2c8e5b19d7a3
+Revises: 9d3a4f71c6b2
+Create Date: 2026-10-18 19:12:48.205531
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c8e5b19d7a3'
+down_revision = '9d3a4f71c6b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_broadcast',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('message', sa.String(length=500), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('last_user_id', sa.Integer(), nullable=True),
+    sa.Column('recipients', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    counter = op.create_table('notification_counter',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('unread', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('archived', sa.Boolean(), nullable=True, server_default=sa.false()))
+        batch_op.add_column(sa.Column('broadcast_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_notification_broadcast_id', 'notification_broadcast', ['broadcast_id'], ['id'])
+        batch_op.create_index('ix_notification_user_id_archived_created_at', ['user_id', 'archived', 'created_at'], unique=False)
+
+    # Every existing user starts with a counter holding their current unread count
+    user = sa.table('user', sa.column('id', sa.Integer()))
+    notification = sa.table('notification', sa.column('user_id', sa.Integer()), sa.column('is_read', sa.Boolean()))
+    unread = (sa.select(sa.func.count()).select_from(notification)
+              .where(notification.c.user_id == user.c.id, notification.c.is_read == sa.false())
+              .scalar_subquery())
+    op.execute(counter.insert().from_select(['user_id', 'unread'], sa.select(user.c.id, unread)))
+
+
+def downgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_user_id_archived_created_at')
+        batch_op.drop_constraint('fk_notification_broadcast_id', type_='foreignkey')
+        batch_op.drop_column('broadcast_id')
+        batch_op.drop_column('archived')
+
+    op.drop_table('notification_counter')
+    op.drop_table('notification_broadcast')
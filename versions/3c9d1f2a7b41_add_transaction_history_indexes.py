@@ -0,0 +1,27 @@
+"""add transaction history indexes
+
+Revision ID: 3c9d1f2a7b41
+Revises: 7e442a34bd4c
+Create Date: 2026-10-18 09:12:04.311207
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9d1f2a7b41'
+down_revision = '7e442a34bd4c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_account_id_timestamp', ['account_id', 'timestamp'], unique=False)
+        batch_op.create_index('ix_transaction_to_account_id_timestamp', ['to_account_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_to_account_id_timestamp')
+        batch_op.drop_index('ix_transaction_account_id_timestamp')
@@ -0,0 +1,33 @@
+"""add transaction archive
+
+Revision ID: 4a6d2c8f1e70
+Revises: e2b94c6a1f37
+Create Date: 2026-10-18 23:48:12.305917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a6d2c8f1e70'
+down_revision = 'e2b94c6a1f37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archive_partition',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(length=500), nullable=False),
+    sa.Column('first_timestamp', sa.DateTime(), nullable=False),
+    sa.Column('last_timestamp', sa.DateTime(), nullable=False),
+    sa.Column('transactions', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('path')
+    )
+
+
+def downgrade():
+    op.drop_table('archive_partition')
@@ -0,0 +1,71 @@
+"""add investment revaluation
+
+Revision ID: 5b7e0c2d9f48
+Revises: f1d26b8c4e93
+Create Date: 2026-10-18 18:05:37.519263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0c2d9f48'
+down_revision = 'f1d26b8c4e93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('revaluation_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('price_file', sa.String(length=255), nullable=False),
+    sa.Column('as_of', sa.Date(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('prices_loaded', sa.Integer(), nullable=True),
+    sa.Column('holdings_processed', sa.Integer(), nullable=True),
+    sa.Column('holdings_changed', sa.Integer(), nullable=True),
+    sa.Column('holdings_unpriced', sa.Integer(), nullable=True),
+    sa.Column('value_before', sa.BigInteger(), nullable=True),
+    sa.Column('value_after', sa.BigInteger(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('instrument_price',
+    sa.Column('instrument', sa.String(length=50), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('as_of', sa.Date(), nullable=True),
+    sa.Column('run_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['revaluation_run.id'], ),
+    sa.PrimaryKeyConstraint('instrument')
+    )
+    op.create_table('revaluation_change',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('investment_id', sa.Integer(), nullable=False),
+    sa.Column('old_value', sa.BigInteger(), nullable=False),
+    sa.Column('new_value', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['investment_id'], ['investment.id'], ),
+    sa.ForeignKeyConstraint(['run_id'], ['revaluation_run.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('revaluation_change', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revaluation_change_run_id'), ['run_id'], unique=False)
+
+    with op.batch_alter_table('investment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('instrument', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('units', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('investment', schema=None) as batch_op:
+        batch_op.drop_column('units')
+        batch_op.drop_column('instrument')
+
+    with op.batch_alter_table('revaluation_change', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revaluation_change_run_id'))
+
+    op.drop_table('revaluation_change')
+    op.drop_table('instrument_price')
+    op.drop_table('revaluation_run')
@@ -0,0 +1,45 @@
+"""add bill auto-debit
+
+Revision ID: 6f1b3d8e2a95
+Revises: 2c8e5b19d7a3
+Create Date: 2026-10-18 21:04:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f1b3d8e2a95'
+down_revision = '2c8e5b19d7a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bill_payment_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_date', sa.Date(), nullable=False),
+    sa.Column('shard', sa.String(length=20), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('bills_due', sa.Integer(), nullable=True),
+    sa.Column('bills_paid', sa.Integer(), nullable=True),
+    sa.Column('bills_insufficient', sa.Integer(), nullable=True),
+    sa.Column('accounts_debited', sa.Integer(), nullable=True),
+    sa.Column('amount_paid', sa.BigInteger(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('run_date', 'shard', name='uq_bill_payment_run_run_date_shard')
+    )
+    with op.batch_alter_table('bill_payment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('paid_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_bill_payment_status_due_date', ['status', 'due_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bill_payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_bill_payment_status_due_date')
+        batch_op.drop_column('paid_at')
+
+    op.drop_table('bill_payment_run')
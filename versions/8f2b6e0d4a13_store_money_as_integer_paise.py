@@ -0,0 +1,54 @@
+"""store money as integer paise
+
+Revision ID: 8f2b6e0d4a13
+Revises: 3c9d1f2a7b41
+Create Date: 2026-10-18 11:40:27.508913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2b6e0d4a13'
+down_revision = '3c9d1f2a7b41'
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = {
+    'account': ['balance'],
+    'transaction': ['amount'],
+    'loan': ['amount'],
+    'credit_card': ['limit', 'balance'],
+    'fixed_deposit': ['amount'],
+    'recurring_deposit': ['monthly_amount'],
+    'bill_payment': ['amount'],
+    'insurance': ['coverage_amount', 'premium_amount'],
+    'investment': ['amount', 'current_value', 'returns'],
+    'cheque': ['amount'],
+}
+
+# The whole migration is one transaction: the table rebuilds and the
+# rescale hold the write lock until it commits, so run it with the app
+# stopped. Committing part way would leave some rows rescaled and make a
+# rerun scale them twice.
+def _rescale(table_name, columns, scale):
+    table = sa.table(table_name, *[sa.column(name) for name in columns])
+    op.execute(table.update().values({name: scale(table.c[name]) for name in columns}))
+
+
+def upgrade():
+    for table_name, columns in MONEY_COLUMNS.items():
+        # Rounded while still REAL; the type change would truncate the fractions first
+        _rescale(table_name, columns, lambda column: sa.cast(sa.func.round(column * 100), sa.BigInteger))
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for name in columns:
+                batch_op.alter_column(name, existing_type=sa.Float(), type_=sa.BigInteger())
+
+
+def downgrade():
+    for table_name, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for name in columns:
+                batch_op.alter_column(name, existing_type=sa.BigInteger(), type_=sa.Float())
+        _rescale(table_name, columns, lambda column: column / 100.0)
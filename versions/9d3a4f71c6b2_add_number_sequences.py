@@ -0,0 +1,34 @@
+"""add number sequences
+
+Revision ID: 9d3a4f71c6b2
+Revises: 5b7e0c2d9f48
+Create Date: 2026-10-18 18:41:09.662814
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3a4f71c6b2'
+down_revision = '5b7e0c2d9f48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    sequence = op.create_table('number_sequence',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('next_value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Start card serials past any old random number that happens to share the issuer prefix
+    highest = op.get_bind().execute(sa.text(
+        "SELECT MAX(card_number) FROM credit_card WHERE card_number LIKE '652150%' AND LENGTH(card_number) = 16"
+    )).scalar()
+    if highest:
+        op.bulk_insert(sequence, [{'name': 'card', 'next_value': int(highest[6:15]) + 1}])
+
+
+def downgrade():
+    op.drop_table('number_sequence')
@@ -0,0 +1,37 @@
+"""add card authorizations
+
+Revision ID: a4c7e2f95b18
+Revises: 6f1b3d8e2a95
+Create Date: 2026-10-18 22:16:09.342871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c7e2f95b18'
+down_revision = '6f1b3d8e2a95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('card_authorization',
+    sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('card_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.BigInteger(), nullable=False),
+    sa.Column('authorized_at', sa.DateTime(), nullable=False),
+    sa.Column('settled_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['card_id'], ['credit_card.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('card_authorization', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_card_authorization_card_id'), ['card_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('card_authorization', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_card_authorization_card_id'))
+
+    op.drop_table('card_authorization')
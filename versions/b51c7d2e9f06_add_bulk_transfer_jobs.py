@@ -0,0 +1,57 @@
+"""add bulk transfer jobs
+
+Revision ID: b51c7d2e9f06
+Revises: 8f2b6e0d4a13
+Create Date: 2026-10-18 13:05:51.227149
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b51c7d2e9f06'
+down_revision = '8f2b6e0d4a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bulk_transfer_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_path', sa.String(length=255), nullable=False),
+    sa.Column('file_format', sa.String(length=10), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('rows_committed', sa.Integer(), nullable=True),
+    sa.Column('rows_posted', sa.Integer(), nullable=True),
+    sa.Column('rows_rejected', sa.Integer(), nullable=True),
+    sa.Column('total_amount', sa.BigInteger(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['account_id'], ['account.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('bulk_transfer_row',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('line', sa.Integer(), nullable=False),
+    sa.Column('to_account_number', sa.String(length=20), nullable=True),
+    sa.Column('amount', sa.BigInteger(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('message', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['bulk_transfer_job.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('bulk_transfer_row', schema=None) as batch_op:
+        batch_op.create_index('ix_bulk_transfer_row_job_id_line', ['job_id', 'line'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bulk_transfer_row', schema=None) as batch_op:
+        batch_op.drop_index('ix_bulk_transfer_row_job_id_line')
+
+    op.drop_table('bulk_transfer_row')
+    op.drop_table('bulk_transfer_job')
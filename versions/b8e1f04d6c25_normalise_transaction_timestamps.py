@@ -0,0 +1,26 @@
+"""normalise transaction timestamps
+
+Revision ID: b8e1f04d6c25
+Revises: 4a6d2c8f1e70
+Create Date: 2026-10-19 10:14:36.208114
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e1f04d6c25'
+down_revision = '4a6d2c8f1e70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows written by the old CURRENT_TIMESTAMP default lack the fraction,
+    # and sort before a cursor bound in the same second
+    op.execute("""UPDATE "transaction" SET timestamp = timestamp || '.000000' WHERE length(timestamp) = 19""")
+
+
+def downgrade():
+    # Both formats read back the same
+    pass
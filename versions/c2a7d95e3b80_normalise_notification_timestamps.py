@@ -0,0 +1,26 @@
+"""normalise notification timestamps
+
+Revision ID: c2a7d95e3b80
+Revises: b8e1f04d6c25
+Create Date: 2026-10-19 10:41:09.517362
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2a7d95e3b80'
+down_revision = 'b8e1f04d6c25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows written by the old CURRENT_TIMESTAMP default lack the fraction,
+    # and sort before an inbox cursor bound in the same second
+    op.execute("UPDATE notification SET created_at = created_at || '.000000' WHERE length(created_at) = 19")
+
+
+def downgrade():
+    # Both formats read back the same
+    pass
@@ -0,0 +1,33 @@
+"""widen password hash
+
+Revision ID: c3f58d9e2a71
+Revises: a92f61c0d7e4
+Create Date: 2026-10-18 16:52:44.208193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f58d9e2a71'
+down_revision = 'a92f61c0d7e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # scrypt hashes run past 128 characters
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=128),
+               existing_nullable=False)
@@ -0,0 +1,40 @@
+"""add daily balance snapshots
+
+Revision ID: d4e8a1f35c20
+Revises: b51c7d2e9f06
+Create Date: 2026-10-18 14:22:09.874310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e8a1f35c20'
+down_revision = 'b51c7d2e9f06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_balance',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('closing_balance', sa.BigInteger(), nullable=False),
+    sa.Column('debit_total', sa.BigInteger(), nullable=False),
+    sa.Column('credit_total', sa.BigInteger(), nullable=False),
+    sa.Column('txn_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['account.id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'date')
+    )
+    op.create_table('watermark',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('watermark')
+    op.drop_table('daily_balance')
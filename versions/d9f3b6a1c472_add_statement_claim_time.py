@@ -0,0 +1,27 @@
+"""add statement claim time
+
+Revision ID: d9f3b6a1c472
+Revises: c2a7d95e3b80
+Create Date: 2026-10-19 11:52:40.218733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f3b6a1c472'
+down_revision = 'c2a7d95e3b80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Statements left 'rendering' get no claim time, so the next request reclaims them
+    with op.batch_alter_table('account_statement', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('account_statement', schema=None) as batch_op:
+        batch_op.drop_column('claimed_at')
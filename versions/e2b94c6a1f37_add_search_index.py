@@ -0,0 +1,69 @@
+"""add search index
+
+Revision ID: e2b94c6a1f37
+Revises: a4c7e2f95b18
+Create Date: 2026-10-18 23:02:51.774613
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b94c6a1f37'
+down_revision = 'a4c7e2f95b18'
+branch_labels = None
+depends_on = None
+
+# Copied from search.py at this revision. A later batch_alter_table on any
+# of these tables rebuilds it without its triggers, so such a migration must
+# recreate them.
+SOURCES = (
+    ('transaction', 'transaction', None, """
+        SELECT (owner.user_id << 36) | (new.id << 2),
+               new.transaction_type || ' ' || printf('%.2f', new.amount / 100.0) || ' ' || a.account_number
+               || coalesce(' ' || t.account_number, ''), new.timestamp
+        FROM {rows} JOIN account AS a ON a.id = new.account_id LEFT JOIN account AS t ON t.id = new.to_account_id
+        JOIN account AS owner ON owner.id IN (new.account_id, new.to_account_id)
+        WHERE (owner.id = new.account_id OR owner.user_id != a.user_id)"""),
+    ('cheque', 'cheque', 1, """
+        SELECT (new.user_id << 36) | (new.id << 2) | 1,
+               new.cheque_number || ' ' || new.payee || ' ' || printf('%.2f', new.amount / 100.0), new.created_at
+        FROM {rows}"""),
+    ('bill', 'bill_payment', 2, """
+        SELECT (new.user_id << 36) | (new.id << 2) | 2,
+               new.bill_type || ' ' || new.bill_number || ' ' || printf('%.2f', new.amount / 100.0), new.due_date
+        FROM {rows}"""),
+    ('account', 'account', 3, """
+        SELECT (new.user_id << 36) | (new.id << 2) | 3, new.account_number, NULL
+        FROM {rows}"""),
+)
+COLUMNS = 'search_index(rowid, body, happened_at)'
+IN_TRIGGER = '(SELECT 1) AS one'
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE search_index USING fts5(body, happened_at UNINDEXED, prefix='2 3')")
+    for kind, table, position, select_sql in SOURCES:
+        source = f'"{table}" AS new'
+        op.execute(f'INSERT INTO {COLUMNS} {select_sql.format(rows=source)}')
+        op.execute(f'CREATE TRIGGER search_{kind}_insert AFTER INSERT ON "{table}" BEGIN '
+                   f'INSERT INTO {COLUMNS} {select_sql.format(rows=IN_TRIGGER)}; END')
+        if position is not None:
+            op.execute(f'CREATE TRIGGER search_{kind}_delete AFTER DELETE ON "{table}" BEGIN '
+                       f'DELETE FROM search_index WHERE rowid = (old.user_id << 36) | (old.id << 2) | {position}; END')
+    op.execute(f'CREATE TRIGGER search_cheque_update AFTER UPDATE OF payee, amount ON cheque BEGIN '
+               f'DELETE FROM search_index WHERE rowid = (old.user_id << 36) | (old.id << 2) | 1; '
+               f'INSERT INTO {COLUMNS} {SOURCES[1][3].format(rows=IN_TRIGGER)}; END')
+    op.execute("INSERT INTO search_index(search_index) VALUES ('optimize')")
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'sqlite':
+        return
+    for kind, _, _, _ in SOURCES:
+        op.execute(f'DROP TRIGGER IF EXISTS search_{kind}_insert')
+        op.execute(f'DROP TRIGGER IF EXISTS search_{kind}_delete')
+    op.execute('DROP TRIGGER IF EXISTS search_cheque_update')
+    op.execute('DROP TABLE search_index')
@@ -0,0 +1,27 @@
+"""add statement status
+
+Revision ID: e7a3c90b1d58
+Revises: d4e8a1f35c20
+Create Date: 2026-10-18 15:48:33.160274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c90b1d58'
+down_revision = 'd4e8a1f35c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Statements created before this revision were never rendered
+    with op.batch_alter_table('account_statement', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=True, server_default='pending'))
+
+
+def downgrade():
+    with op.batch_alter_table('account_statement', schema=None) as batch_op:
+        batch_op.drop_column('status')
@@ -0,0 +1,42 @@
+"""add deposit accruals
+
+Revision ID: f1d26b8c4e93
+Revises: c3f58d9e2a71
+Create Date: 2026-10-18 17:20:11.734902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1d26b8c4e93'
+down_revision = 'c3f58d9e2a71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('deposit_accrual_run',
+    sa.Column('run_date', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('deposits_processed', sa.Integer(), nullable=True),
+    sa.Column('deposits_matured', sa.Integer(), nullable=True),
+    sa.Column('interest_credited', sa.BigInteger(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('run_date')
+    )
+    for table in ('fixed_deposit', 'recurring_deposit'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('accrued_interest', sa.BigInteger(), nullable=True, server_default='0'))
+            batch_op.add_column(sa.Column('maturity_amount', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    for table in ('recurring_deposit', 'fixed_deposit'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('maturity_amount')
+            batch_op.drop_column('accrued_interest')
+
+    op.drop_table('deposit_accrual_run')